@@ -0,0 +1,119 @@
+""" Public interface for managing basic IO via MIDI SysEx, with asyncio coroutines. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import errno as _errno
+import asyncio as _asyncio
+
+import sysex_tones.Metrics as _Metrics
+
+from sysex_tones import BasicIO as _BasicIO
+
+
+class AsyncBasicIO( _BasicIO ):
+	""" Manage basic IO via MIDI SysEx, waking an asyncio event loop when SysEx arrives, instead of polling.
+
+	self.infile must be a device file, FIFO, or pty (something the event loop can wait on), not a regular file.
+	self.readingloop is the event loop watching self.infile, or None when not reading.
+	"""
+
+	loop = None
+	readingloop = None
+	queue = None
+	ended = False
+	maxsize = 4096
+
+
+	def __init__( self, infilename=None, outfilename=None, zerocopy=False, loop=None ):
+		""" The infilename and outfilename arguments should be MIDI device filenames, zerocopy selects memoryview SysEx, loop defaults to the running event loop. """
+		_BasicIO.__init__( self, infilename, outfilename, zerocopy )
+		self.loop = loop
+
+
+	def get_loop( self ):
+		""" Return self.loop, or the running event loop. """
+		retval = self.loop
+		if not retval:
+			retval = _asyncio.get_running_loop()
+		return retval
+
+
+	def start_reading( self ):
+		""" Queue SysEx read from self.infile, whenever the event loop sees it is readable, until the end of the file. """
+		if self.queue is None:
+			self.queue = _asyncio.Queue()
+			self.ended = False
+		if self.readingloop is None and not self.ended:
+			self.readingloop = self.get_loop()
+			self.readingloop.add_reader( self.infile.fileno(), self._read_infile )
+
+
+	def stop_reading( self ):
+		""" Stop watching self.infile, SysEx already queued can still be read. """
+		if self.readingloop is not None:
+			if self.infile:
+				self.readingloop.remove_reader( self.infile.fileno() )
+			self.readingloop = None
+
+
+	def close_infile( self ):
+		""" Stop watching self.infile, close self.infile (if open), and discard any queued SysEx. """
+		self.stop_reading()
+		self.queue = None
+		_BasicIO.close_infile( self )
+
+
+	def _read_infile( self ):
+		""" Event loop callback, frame whatever self.infile has available, and queue the SysEx. """
+		started = None
+		if _Metrics.registry:
+			started = _Metrics.registry.now()
+		try:
+			data = self.infile.read( self.maxsize )
+		except IOError as error:
+			if error.errno not in [_errno.EAGAIN, _errno.EWOULDBLOCK]: # device disconnected
+				self.stop_reading()
+				self.ended = True
+				self.queue.put_nowait( error )
+			return
+		if data:
+			for sysex in self.frame_infile_data( data, started ):
+				self.queue.put_nowait( sysex )
+		elif data is not None: # end of file
+			self.stop_reading()
+			self.ended = True
+			self.queue.put_nowait( None )
+
+
+	async def read_sysex( self, timeout=None ):
+		""" Return the next SysEx read from self.infile, or None after timeout n.n seconds (None waits indefinitely) or at the end of the file, raises IOError if the device disconnected. """
+		self.start_reading()
+		retval = None
+		if not self.ended or not self.queue.empty():
+			try:
+				retval = await _asyncio.wait_for( self.queue.get(), timeout )
+			except _asyncio.TimeoutError:
+				pass
+		if isinstance( retval, Exception ):
+			raise retval
+		return retval
+
+
+	async def frames( self, timeout=None ):
+		""" Asynchronously iterate over SysEx read from self.infile, stopping after timeout n.n seconds without SysEx (if present) or at the end of the file. """
+		while True:
+			sysex = await self.read_sysex( timeout )
+			if sysex is None:
+				break
+			yield sysex
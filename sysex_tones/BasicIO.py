@@ -14,23 +14,105 @@
 
 
 import sysex_tones as _sysex_tones
+import sysex_tones.Metrics as _Metrics
 
 
 class BasicIO( object ):
-	""" Manage basic IO via MIDI SysEx. """
+	""" Manage basic IO via MIDI SysEx.
+
+	Operations open the files they need, and close them again afterwards, unless the files are held open
+	by hold() (or a with statement), which avoids reopening device files for every operation.
+	"""
 
 	infilename = None
 	outfilename = None
 	infile = None
 	outfile = None
+	framer = None
+	zerocopy = False
+	holds = 0
+	heldin = False
+	heldout = False
 
 
-	def __init__( self, infilename=None, outfilename=None ):
-		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data. """
+	def __init__( self, infilename=None, outfilename=None, zerocopy=False ):
+		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data, zerocopy selects memoryview SysEx instead of lists of ints. """
+		self.zerocopy = zerocopy
+		self.framer = _sysex_tones.SysExFramer( zerocopy=zerocopy )
 		self.set_infilename( infilename )
 		self.set_outfilename( outfilename )
 
 
+	def __enter__( self ):
+		""" Hold files open for the operations in a with statement, see hold(). """
+		self.hold()
+		return self
+
+
+	def __exit__( self, exctype, exception, traceback ):
+		""" Release the hold taken when the with statement began, see release(). """
+		self.release()
+
+
+	def hold( self ):
+		""" Keep files opened by operations open across calls, until release() is called as many times as hold(). """
+		self.holds += 1
+
+
+	def release( self ):
+		""" Undo one hold(), after the last one close any files operations opened while they were held. """
+		if self.holds > 0:
+			self.holds -= 1
+			if not self.holds:
+				if self.heldin:
+					self.close_infile()
+				if self.heldout:
+					self.close_outfile()
+
+
+	def acquire_infile( self, infilename=None ):
+		""" Open self.infile for an operation, setting self.infilename if present, unless it is held open, returning True if release_infile() should close it. """
+		retval = False
+		if self.holds and self.infile and self.heldin and infilename in [None, self.infilename]:
+			try:
+				self.infile.seek( 0 ) # the operation reads from the start, as if reopened
+			except (AttributeError, IOError, ValueError): # not seekable, e.g. a device
+				pass
+		elif infilename or not self.infile:
+			self.open_infile( infilename )
+			retval = True
+		return retval
+
+
+	def release_infile( self, opened ):
+		""" Close self.infile after an operation, if acquire_infile() opened it, unless files are held open. """
+		if opened:
+			if self.holds:
+				self.heldin = bool( self.infile )
+			else:
+				self.close_infile()
+
+
+	def acquire_outfile( self, outfilename=None ):
+		""" Open self.outfile for an operation, setting self.outfilename if present, unless it is held open, returning True if release_outfile() should close it. """
+		retval = False
+		if self.holds and self.outfile and self.heldout and outfilename in [None, self.outfilename]:
+			pass
+		elif outfilename or not self.outfile:
+			self.open_outfile( outfilename )
+			retval = True
+		return retval
+
+
+	def release_outfile( self, opened ):
+		""" Close self.outfile after an operation, if acquire_outfile() opened it, unless files are held open. """
+		if opened:
+			if self.holds:
+				self.heldout = bool( self.outfile )
+			else:
+				self.close_outfile()
+
+
 	def set_infilename( self, infilename ):
 		""" Set self.infilename, close self.infile (if open). """
 		self.close_infile()
@@ -68,10 +150,12 @@ class BasicIO( object ):
 
 
 	def close_infile( self ):
-		""" Close self.infile (if open). """
+		""" Close self.infile (if open), discarding any partial SysEx held by self.framer. """
 		if self.infile:
 			self.infile.close()
 			self.infile = None
+			self.framer.clear()
+		self.heldin = False
 
 
 	def close_outfile( self ):
@@ -79,17 +163,37 @@ class BasicIO( object ):
 		if self.outfile:
 			self.outfile.close()
 			self.outfile = None
+		self.heldout = False
 
 
 	def write_data_to_outfile( self, data ):
-		""" Write data to self.outfile. """
-		self.outfile.write( _sysex_tones.convert_to_stream( data ) )
-
-
-	def extract_sysex_from_infile( self ):
-		""" Read sysex from self.infile (if data is available)."""
+		""" Write data (a list of ints, or a buffer written without copying) to self.outfile. """
+		try:
+			self.outfile.write( _sysex_tones.convert_to_stream( data ) )
+		except IOError:
+			if self.holds: # don't keep a failed file open, the next operation reopens it
+				self.close_outfile()
+			raise
+		metrics = _Metrics.registry
+		if metrics:
+			metrics.increment( 'bytes_written', len( data ) )
+
+
+	def extract_sysex_from_infile( self, timeout=0.3 ):
+		""" Read sysex from self.infile (if data is available, waiting at most timeout n.n seconds), partial sysex is kept by self.framer until the rest arrives. """
 		retval = []
-		if _sysex_tones.is_data_available( self.infile ):
-			retval = _sysex_tones.extract_sysex_from_stream( self.infile )
+		if _sysex_tones.is_data_available( self.infile, timeout ):
+			started = None
+			if _Metrics.registry:
+				started = _Metrics.registry.now()
+			retval = self.frame_infile_data( self.infile.read( 4096 ), started )
 		return retval
 
+
+	def frame_infile_data( self, data, started=None ):
+		""" Return the SysEx completed by data (read from self.infile), see SysExFramer.feed(), started is when the read began (a Metrics now() time), if metrics are enabled. """
+		retval = self.framer.feed( data )
+		metrics = _Metrics.registry
+		if metrics and data:
+			metrics.record_read( data, retval, started )
+		return retval
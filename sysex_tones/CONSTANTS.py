@@ -17,3 +17,12 @@
 SYSEX_START = [0xf0]
 SYSEX_STOP = [0xf7]
 
+
+# MIDI SYSEX data demarcation, as bytes, for matching buffers (bytes, bytearray, memoryview)
+SYSEX_START_BYTES = bytes( bytearray( SYSEX_START ) )
+SYSEX_STOP_BYTES = bytes( bytearray( SYSEX_STOP ) )
+
+
+# zerocopy SysEx (see SysExFramer) is memoryview slices of the receive buffer on Python 3,
+# on Python 2, where memoryviews index as characters, it is bytearray copies, so apps only ask for it when it saves copying
+SYSEX_ZEROCOPY = bytes is not str
@@ -0,0 +1,188 @@
+""" Public interface for recording MIDI SysEx, with timestamps, into a memory mapped ring buffer file. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import mmap as _mmap
+import time as _time
+import zlib as _zlib
+import struct as _struct
+
+
+# capture file layout
+#
+# header: magic, version, ring size, then two index slots (written alternately, so one is always intact)
+# index slot: sequence, head, tail, frame count, dropped frame count, crc32 of the preceding fields
+# ring: records, each a length, a monotonic timestamp in nanoseconds, then the SysEx bytes
+#
+# head and tail are byte offsets that only ever grow, the ring position is the offset modulo the ring size
+# a record never wraps, a length of CAPTURE_WRAP marks the rest of the ring as unused
+CAPTURE_MAGIC = b'SXTCAPT1'
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = _struct.Struct( '<8sII' )
+CAPTURE_INDEX = _struct.Struct( '<QQQQQ' )
+CAPTURE_INDEX_CRC = _struct.Struct( '<I' )
+CAPTURE_INDEX_SIZE = CAPTURE_INDEX.size + CAPTURE_INDEX_CRC.size
+CAPTURE_INDEX_OFFSETS = (CAPTURE_HEADER.size, CAPTURE_HEADER.size + CAPTURE_INDEX_SIZE)
+CAPTURE_RING_OFFSET = 128
+CAPTURE_RECORD = _struct.Struct( '<IQ' )
+CAPTURE_WRAP = 0xffffffff
+
+
+def get_timestamp():
+	""" Return a monotonic timestamp in nanoseconds. """
+	if hasattr( _time, 'monotonic_ns' ):
+		retval = _time.monotonic_ns()
+	else:
+		retval = int( _time.monotonic() * 1000000000 )
+	return retval
+
+
+def read_capture_index( data ):
+	""" Return the newest intact index slot in data (a capture file header) as (sequence, head, tail, frames, dropped), or None. """
+	retval = None
+	for offset in CAPTURE_INDEX_OFFSETS:
+		fields = CAPTURE_INDEX.unpack_from( data, offset )
+		(crc,) = CAPTURE_INDEX_CRC.unpack_from( data, offset + CAPTURE_INDEX.size )
+		if crc == _zlib.crc32( data[offset:offset + CAPTURE_INDEX.size] ) & 0xffffffff:
+			if not retval or fields[0] > retval[0]:
+				retval = fields
+	return retval
+
+
+class CaptureRecorder( object ):
+	""" Record SysEx with monotonic timestamps into a bounded ring buffer file, overwriting the oldest records when full.
+
+	Records and indexes are written straight into a shared memory map, so recording costs no system calls,
+	and a crash of the recording process loses nothing already recorded.
+	"""
+
+	filename = None
+	size = 0
+	syncinterval = 0
+	file = None
+	map = None
+	sequence = 0
+	head = 0
+	tail = 0
+	frames = 0
+	dropped = 0
+	unsynced = 0
+
+
+	def __init__( self, filename, size=16 * 1024 * 1024, syncinterval=0 ):
+		""" Open (continuing) or create the capture file filename with a ring of size bytes, syncing it to disk every syncinterval records (0 leaves that to the OS). """
+		self.filename = filename
+		self.syncinterval = syncinterval
+		exists = _os.path.exists( filename ) and _os.path.getsize( filename ) > CAPTURE_RING_OFFSET
+		self.file = open( filename, 'r+b' if exists else 'w+b' )
+		if exists:
+			(magic, version, size) = CAPTURE_HEADER.unpack( self.file.read( CAPTURE_HEADER.size ) )
+			if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+				self.file.close()
+				raise ValueError( '%s is not a capture file' % (filename) )
+		else:
+			self.file.truncate( CAPTURE_RING_OFFSET + size )
+		self.size = size
+		self.map = _mmap.mmap( self.file.fileno(), CAPTURE_RING_OFFSET + size )
+		if exists:
+			index = read_capture_index( self.map )
+			if index:
+				(self.sequence, self.head, self.tail, self.frames, self.dropped) = index
+		else:
+			CAPTURE_HEADER.pack_into( self.map, 0, CAPTURE_MAGIC, CAPTURE_VERSION, size )
+			self._write_index()
+
+
+	def close( self ):
+		""" Write the index, sync, and close the capture file. """
+		if self.map:
+			self._write_index()
+			self.map.flush()
+			self.map.close()
+			self.map = None
+			self.file.close()
+			self.file = None
+
+
+	def get_statistics( self ):
+		""" Return a dictionary of recorded frames, frames overwritten (dropped) to make room, and bytes in use. """
+		return {
+			'frames': self.frames,
+			'dropped': self.dropped,
+			'bytes': self.head - self.tail,
+			'size': self.size,
+		}
+
+
+	def record( self, sysex, timestamp=None ):
+		""" Record sysex (a list of ints, or a buffer), with timestamp (nanoseconds, defaults to now). """
+		if timestamp is None:
+			timestamp = get_timestamp()
+		if not isinstance( sysex, (bytes, bytearray, memoryview) ):
+			sysex = bytearray( sysex )
+		needed = CAPTURE_RECORD.size + len( sysex )
+		if needed > self.size:
+			raise ValueError( 'SysEx of %i bytes is larger than the capture ring' % (len( sysex )) )
+		position = self.head % self.size
+		if position + needed > self.size: # doesn't fit before the end of the ring, skip to the start
+			self._make_room( self.size - position ) # the oldest records may still be at the end of the ring
+			if self.size - position >= CAPTURE_RECORD.size:
+				CAPTURE_RECORD.pack_into( self.map, CAPTURE_RING_OFFSET + position, CAPTURE_WRAP, 0 )
+			self.head += self.size - position
+			position = 0
+		self._make_room( needed ) # the skipped end of the ring is freed too, once the tail passes it
+		offset = CAPTURE_RING_OFFSET + position
+		CAPTURE_RECORD.pack_into( self.map, offset, len( sysex ), timestamp )
+		self.map[offset + CAPTURE_RECORD.size:offset + needed] = sysex
+		self.head += needed
+		self.frames += 1
+		self._write_index()
+		if self.syncinterval:
+			self.unsynced += 1
+			if self.unsynced >= self.syncinterval:
+				self.map.flush()
+				self.unsynced = 0
+
+
+	def record_sysex( self, device, sysex ):
+		""" EventLoop callback, record( sysex ) from any device. """
+		self.record( sysex )
+
+
+	def _make_room( self, needed ):
+		""" Advance self.tail past the oldest records, until needed bytes (at most the ring size) are free, writing the index before they are overwritten. """
+		tail = self.tail
+		while self.head - self.tail + needed > self.size:
+			position = self.tail % self.size
+			length = CAPTURE_WRAP
+			if self.size - position >= CAPTURE_RECORD.size:
+				(length, timestamp) = CAPTURE_RECORD.unpack_from( self.map, CAPTURE_RING_OFFSET + position )
+			if length == CAPTURE_WRAP:
+				self.tail += self.size - position
+			else:
+				self.tail += CAPTURE_RECORD.size + length
+				self.dropped += 1
+				self.frames -= 1
+		if self.tail != tail: # a crash while overwriting must not leave the index pointing at overwritten records
+			self._write_index()
+
+
+	def _write_index( self ):
+		""" Write the index into the older of the two index slots. """
+		self.sequence += 1
+		offset = CAPTURE_INDEX_OFFSETS[self.sequence % 2]
+		CAPTURE_INDEX.pack_into( self.map, offset, self.sequence, self.head, self.tail, self.frames, self.dropped )
+		crc = _zlib.crc32( self.map[offset:offset + CAPTURE_INDEX.size] ) & 0xffffffff
+		CAPTURE_INDEX_CRC.pack_into( self.map, offset + CAPTURE_INDEX.size, crc )
@@ -0,0 +1,102 @@
+""" Public interface for replaying MIDI SysEx recorded by CaptureRecorder. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import mmap as _mmap
+import time as _time
+
+from sysex_tones.CaptureRecorder import CAPTURE_MAGIC as _CAPTURE_MAGIC
+from sysex_tones.CaptureRecorder import CAPTURE_VERSION as _CAPTURE_VERSION
+from sysex_tones.CaptureRecorder import CAPTURE_HEADER as _CAPTURE_HEADER
+from sysex_tones.CaptureRecorder import CAPTURE_RECORD as _CAPTURE_RECORD
+from sysex_tones.CaptureRecorder import CAPTURE_RING_OFFSET as _CAPTURE_RING_OFFSET
+from sysex_tones.CaptureRecorder import CAPTURE_WRAP as _CAPTURE_WRAP
+from sysex_tones.CaptureRecorder import read_capture_index as _read_capture_index
+
+
+class CaptureReplayer( object ):
+	""" Read SysEx, with timestamps, from a capture file written by CaptureRecorder. """
+
+	filename = None
+	file = None
+	map = None
+	size = 0
+
+
+	def __init__( self, filename ):
+		""" The filename argument is a capture file. """
+		self.filename = filename
+		self.file = open( filename, 'rb' )
+		self.map = _mmap.mmap( self.file.fileno(), 0, access=_mmap.ACCESS_READ )
+		(magic, version, self.size) = _CAPTURE_HEADER.unpack_from( self.map, 0 )
+		if magic != _CAPTURE_MAGIC or version != _CAPTURE_VERSION:
+			self.close()
+			raise ValueError( '%s is not a capture file' % (filename) )
+
+
+	def close( self ):
+		""" Close the capture file. """
+		if self.map:
+			self.map.close()
+			self.map = None
+			self.file.close()
+			self.file = None
+
+
+	def get_statistics( self ):
+		""" Return a dictionary of recorded frames, frames overwritten (dropped) by the recorder, and bytes in use. """
+		retval = {}
+		index = _read_capture_index( self.map )
+		if index:
+			(sequence, head, tail, frames, dropped) = index
+			retval = {
+				'frames': frames,
+				'dropped': dropped,
+				'bytes': head - tail,
+				'size': self.size,
+			}
+		return retval
+
+
+	def frames( self ):
+		""" Iterate over the recorded (timestamp, sysex) pairs, oldest first, timestamps in nanoseconds, sysex as bytes. """
+		index = _read_capture_index( self.map )
+		if index:
+			(sequence, head, tail, frames, dropped) = index
+			offset = tail
+			while offset < head:
+				position = offset % self.size
+				length = _CAPTURE_WRAP
+				if self.size - position >= _CAPTURE_RECORD.size:
+					(length, timestamp) = _CAPTURE_RECORD.unpack_from( self.map, _CAPTURE_RING_OFFSET + position )
+				if length == _CAPTURE_WRAP:
+					offset += self.size - position
+				else:
+					start = _CAPTURE_RING_OFFSET + position + _CAPTURE_RECORD.size
+					yield (timestamp, self.map[start:start + length])
+					offset += _CAPTURE_RECORD.size + length
+
+
+	def replay( self, callback, realtime=False, speed=1.0 ):
+		""" Call callback( timestamp, sysex ) for each recorded frame, as fast as possible, or (if realtime) with the recorded timing divided by speed. """
+		first = None
+		started = _time.time()
+		for (timestamp, sysex) in self.frames():
+			if realtime:
+				if first is None:
+					first = timestamp
+				delay = started + (timestamp - first) / (speed * 1000000000.0) - _time.time()
+				if delay > 0:
+					_time.sleep( delay )
+			callback( timestamp, sysex )
@@ -0,0 +1,171 @@
+""" Public interface for dispatching MIDI SysEx from many devices, as soon as it arrives. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import time as _time
+import errno as _errno
+import select as _select
+
+import sysex_tones.Metrics as _Metrics
+
+try:
+	import selectors as _selectors
+except ImportError: # Python 2, see _SelectSelector
+	_selectors = None
+
+
+_EVENT_READ = 1 # selectors.EVENT_READ
+
+
+class _SelectorKey( object ):
+	""" A registered file, as a selectors.SelectorKey. """
+
+	__slots__ = ('fileobj', 'events', 'data')
+
+
+	def __init__( self, fileobj, events, data ):
+		""" See selectors.SelectorKey. """
+		self.fileobj = fileobj
+		self.events = events
+		self.data = data
+
+
+class _SelectSelector( object ):
+	""" The part of selectors.DefaultSelector the EventLoop uses, with select.select(), where there is no selectors module. """
+
+	keys = None
+
+
+	def __init__( self ):
+		""" Start with no files registered. """
+		self.keys = {}
+
+
+	def register( self, fileobj, events, data=None ):
+		""" Wait on fileobj, for reading. """
+		self.keys[fileobj] = _SelectorKey( fileobj, events, data )
+		return self.keys[fileobj]
+
+
+	def unregister( self, fileobj ):
+		""" Stop waiting on fileobj. """
+		return self.keys.pop( fileobj )
+
+
+	def get_map( self ):
+		""" Return a dictionary of the registered files, mapped to their keys. """
+		return self.keys
+
+
+	def select( self, timeout=None ):
+		""" Wait at most timeout n.n seconds (None waits indefinitely), returning a list of (key, events) of the readable files. """
+		if not self.keys:
+			if timeout:
+				_time.sleep( timeout )
+			return []
+		(readable, writable, errors) = _select.select( list( self.keys ), [], [], timeout )
+		return [(self.keys[fileobj], _EVENT_READ) for fileobj in readable]
+
+
+	def close( self ):
+		""" Unregister all files. """
+		self.keys = {}
+
+
+class EventLoop( object ):
+	""" Wait on the input files of many BasicIO devices at once (epoll, kqueue, etc. via selectors, or select.select() without it), calling back with each SysEx command read. """
+
+	selector = None
+	maxsize = 4096
+	running = False
+
+
+	def __init__( self, selector=None, maxsize=4096 ):
+		""" The selector argument defaults to the best selectors implementation for the platform, maxsize limits each read. """
+		if not selector and _selectors:
+			selector = _selectors.DefaultSelector()
+		elif not selector:
+			selector = _SelectSelector()
+		self.selector = selector
+		self.maxsize = maxsize
+
+
+	def register( self, device, callback, errorcallback=None ):
+		""" Call callback( device, sysex ) for each SysEx command read from device.infile, and errorcallback( device, error ) (if present) when device.infile fails or ends. """
+		self.selector.register( device.infile, _EVENT_READ, (device, callback, errorcallback) )
+
+
+	def unregister( self, device ):
+		""" Stop waiting on device.infile (if registered). """
+		for key in list( self.selector.get_map().values() ):
+			if key.data[0] is device:
+				self.selector.unregister( key.fileobj )
+
+
+	def get_devices( self ):
+		""" Return a list of the registered devices. """
+		return [key.data[0] for key in self.selector.get_map().values()]
+
+
+	def stop( self ):
+		""" Make run() return, after the current dispatch. """
+		self.running = False
+
+
+	def close( self ):
+		""" Unregister all devices, and release the selector. """
+		self.selector.close()
+
+
+	def run_once( self, timeout=None ):
+		""" Wait at most timeout n.n seconds (None waits indefinitely) for data, dispatching any SysEx read, returning the number of SysEx commands dispatched. """
+		retval = 0
+		for (key, events) in self.selector.select( timeout ):
+			(device, callback, errorcallback) = key.data
+			data = None
+			error = None
+			started = None
+			if _Metrics.registry:
+				started = _Metrics.registry.now()
+			try:
+				data = key.fileobj.read( self.maxsize )
+			except IOError as ioerror:
+				if ioerror.errno in [_errno.EAGAIN, _errno.EWOULDBLOCK]:
+					continue
+				error = ioerror
+			if data:
+				# the device framer keeps partial SysEx until the rest arrives
+				for sysex in device.frame_infile_data( data, started ):
+					callback( device, sysex )
+					retval += 1
+			elif error or data is not None: # device disconnected, or the end of a regular file
+				self.selector.unregister( key.fileobj )
+				if errorcallback:
+					errorcallback( device, error )
+		return retval
+
+
+	def run( self, timeout=None ):
+		""" Dispatch SysEx until stop() is called, no devices are registered, or (if present) timeout n.n seconds pass without any SysEx. """
+		self.running = True
+		last = _time.time()
+		while self.running and self.selector.get_map():
+			wait = None
+			if timeout is not None:
+				wait = max( 0, last + timeout - _time.time() )
+			if self.run_once( wait ):
+				last = _time.time()
+			elif timeout is not None and _time.time() - last >= timeout:
+				break
+		self.running = False
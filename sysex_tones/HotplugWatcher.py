@@ -0,0 +1,198 @@
+""" Public interface for noticing MIDI device files being connected and disconnected. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import time as _time
+import errno as _errno
+import select as _select
+import struct as _struct
+
+
+# inotify(7) values, from <sys/inotify.h>
+_IN_ATTRIB = 0x00000004
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000 # the watch was removed, e.g. after its directory was deleted
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_WATCH_MASK = _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_IN_GONE_MASK = _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED # the watched directory itself is gone
+_IN_EVENT_FORMAT = 'iIII' # struct inotify_event: wd, mask, cookie, len, then len bytes of name
+_IN_EVENT_SIZE = _struct.calcsize( _IN_EVENT_FORMAT )
+
+
+def _load_inotify():
+	""" Return libc, if it provides inotify (Linux), otherwise None. """
+	retval = None
+	try:
+		import ctypes
+		import ctypes.util
+		libc = ctypes.CDLL( ctypes.util.find_library( 'c' ), use_errno=True )
+		if hasattr( libc, 'inotify_init1' ) and hasattr( libc, 'inotify_add_watch' ):
+			retval = libc
+	except (ImportError, OSError):
+		pass
+	return retval
+
+
+def is_available( filename ):
+	""" Check if filename exists and is readable. """
+	return _os.path.exists( filename ) and _os.access( filename, _os.R_OK )
+
+
+class HotplugWatcher( object ):
+	""" Watch MIDI device filenames, reopening BasicIO devices when their files appear, and closing them when their files disappear.
+
+	The directories holding the files are watched with inotify where available (Linux), otherwise they are polled every delay n.n seconds.
+	"""
+
+	delay = 0.3
+	libc = None
+	inotify = None
+	watches = None
+	filenames = None
+	devices = None
+
+
+	def __init__( self, delay=0.3, useinotify=True ):
+		""" The delay argument is the polling interval, used when inotify is unavailable (or useinotify is False). """
+		self.delay = delay
+		self.watches = {}
+		self.filenames = {}
+		self.devices = []
+		if useinotify:
+			self.libc = _load_inotify()
+		if self.libc:
+			fd = self.libc.inotify_init1( _IN_NONBLOCK | _IN_CLOEXEC )
+			if fd >= 0:
+				self.inotify = fd
+
+
+	def fileno( self ):
+		""" Return the inotify file descriptor (readable when a watched directory changes), or None when polling. """
+		return self.inotify
+
+
+	def close( self ):
+		""" Stop watching, the devices are left as they are. """
+		if self.inotify is not None:
+			_os.close( self.inotify )
+			self.inotify = None
+		self.watches = {}
+
+
+	def add_filename( self, filename ):
+		""" Watch filename, returning True if it is available now. """
+		retval = is_available( filename )
+		self.filenames[filename] = retval
+		self._update_watches()
+		return retval
+
+
+	def add_device( self, device, callback=None ):
+		""" Watch device.infilename, calling callback( device, connected ) (if present) after device.infile is reopened or closed. """
+		self.devices.append( (device, callback) )
+		self.add_filename( device.infilename )
+
+
+	def remove_device( self, device ):
+		""" Stop watching device. """
+		self.devices = [(watched, callback) for (watched, callback) in self.devices if watched is not device]
+
+
+	def _update_watches( self ):
+		""" Watch the directory of each filename, or its nearest existing parent until the directory is created. """
+		if self.inotify is not None:
+			for filename in self.filenames:
+				directory = _os.path.dirname( _os.path.abspath( filename ) )
+				while directory not in self.watches:
+					wd = self.libc.inotify_add_watch( self.inotify, directory.encode(), _IN_WATCH_MASK )
+					if wd >= 0:
+						self.watches[directory] = wd
+					elif directory == _os.path.dirname( directory ):
+						break
+					else: # not created yet (e.g. /dev/snd before the first USB audio device), watch the parent
+						directory = _os.path.dirname( directory )
+
+
+	def _remove_gone_watches( self, data ):
+		""" Forget the watches of directories that data (inotify events) says were deleted or moved, so _update_watches() watches their parents until they come back. """
+		gone = set()
+		offset = 0
+		while offset + _IN_EVENT_SIZE <= len( data ):
+			(wd, mask, cookie, size) = _struct.unpack_from( _IN_EVENT_FORMAT, data, offset )
+			if mask & _IN_GONE_MASK:
+				gone.add( wd )
+			offset += _IN_EVENT_SIZE + size
+		for (directory, wd) in list( self.watches.items() ):
+			if wd in gone:
+				if self.inotify is not None:
+					self.libc.inotify_rm_watch( self.inotify, wd ) # moved directories are still watched, under their new name
+				del self.watches[directory]
+
+
+	def check( self ):
+		""" Reopen or close devices whose files appeared or disappeared, returning a list of (device, connected) events. """
+		retval = []
+		for filename in self.filenames:
+			self.filenames[filename] = is_available( filename )
+		for (device, callback) in self.devices:
+			connected = self.filenames.get( device.infilename, False )
+			if connected and not device.infile:
+				device.open_infile()
+				if device.infile:
+					retval.append( (device, True) )
+					if callback:
+						callback( device, True )
+			elif not connected and device.infile:
+				device.close_infile()
+				device.close_outfile()
+				retval.append( (device, False) )
+				if callback:
+					callback( device, False )
+		return retval
+
+
+	def wait( self, timeout=None ):
+		""" Wait at most timeout n.n seconds (None waits indefinitely) for a watched directory to change, then check(), returning a list of (device, connected) events. """
+		if self.inotify is not None:
+			try:
+				(readable, writable, exceptional) = _select.select( [self.inotify], [], [], timeout )
+			except _select.error as error:
+				if error.args[0] != _errno.EINTR:
+					raise
+				readable = []
+			if readable:
+				events = []
+				try:
+					while True:
+						data = _os.read( self.inotify, 4096 )
+						if not data:
+							break
+						events.append( data )
+				except OSError as error:
+					if error.errno not in [_errno.EAGAIN, _errno.EWOULDBLOCK]:
+						raise
+				self._remove_gone_watches( b''.join( events ) )
+				self._update_watches()
+		else:
+			if timeout is None or timeout > self.delay:
+				timeout = self.delay
+			_time.sleep( timeout )
+		return self.check()
@@ -0,0 +1,252 @@
+""" Public interface for opt-in metrics (counters and latency histograms) of MIDI SysEx IO and decoding. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import time as _time
+import bisect as _bisect
+import collections as _collections
+
+
+# the registry instrumented code records into, None (the default) disables metrics
+#
+# instrumented code tests it before doing anything else, e.g.
+#
+#	metrics = _Metrics.registry
+#	if metrics:
+#		metrics.increment( 'dumps' )
+#
+# so disabled metrics cost one attribute lookup
+registry = None
+
+
+# metrics recorded by sysex_tones, and their descriptions, in export order
+METRICS_HELP = (
+	('bytes_read', 'Bytes read from MIDI devices.'),
+	('bytes_written', 'Bytes written to MIDI devices.'),
+	('frames_read', 'SysEx frames read from MIDI devices.'),
+	('heartbeats', 'THR heartbeats recognized.'),
+	('dumps', 'THR settings dumps recognized.'),
+	('checksum_failures', 'THR settings dumps with a bad checksum.'),
+	('commands_decoded', 'THR commands decoded.'),
+	('unrecognized_frames', 'SysEx frames that were not a THR command.'),
+	('read_seconds', 'Seconds spent reading and framing each read from a MIDI device.'),
+	('decode_seconds', 'Seconds spent decoding each THR dump or command.'),
+)
+
+# histogram bucket upper bounds (seconds), 1 microsecond to 1 second
+LATENCY_BUCKETS = (
+	0.000001, 0.0000025, 0.000005,
+	0.00001, 0.000025, 0.00005,
+	0.0001, 0.00025, 0.0005,
+	0.001, 0.0025, 0.005,
+	0.01, 0.025, 0.05,
+	0.1, 0.25, 0.5,
+	1.0,
+)
+
+
+if hasattr( _time, 'perf_counter' ):
+	_now = _time.perf_counter
+else:
+	_now = _time.time
+
+
+def enable( metrics=None ):
+	""" Start recording metrics into metrics (defaults to a new MetricsRegistry), returning the registry. """
+	global registry
+	if metrics is None:
+		metrics = MetricsRegistry()
+	registry = metrics
+	return registry
+
+
+def disable():
+	""" Stop recording metrics, returning the registry that was recording them (or None). """
+	global registry
+	retval = registry
+	registry = None
+	return retval
+
+
+def get_registry():
+	""" Return the registry recording metrics, or None when metrics are disabled. """
+	return registry
+
+
+class Histogram( object ):
+	""" Count observed values into buckets, keeping their sum and count, as a Prometheus histogram does. """
+
+	buckets = LATENCY_BUCKETS
+	counts = None
+	sum = 0.0
+	count = 0
+
+
+	def __init__( self, buckets=LATENCY_BUCKETS ):
+		""" The buckets argument is a sorted sequence of bucket upper bounds, values above the last go in the +Inf bucket. """
+		self.buckets = tuple( buckets )
+		self.counts = [0] * (len( self.buckets ) + 1)
+
+
+	def observe( self, value ):
+		""" Count value into its bucket. """
+		self.counts[_bisect.bisect_left( self.buckets, value )] += 1
+		self.sum += value
+		self.count += 1
+
+
+	def get_dict( self ):
+		""" Return a dictionary of cumulative bucket counts (keyed by upper bound, the last by 'inf'), sum, and count. """
+		buckets = _collections.OrderedDict()
+		total = 0
+		for (bound, count) in zip( list( self.buckets ) + ['inf'], self.counts ):
+			total += count
+			buckets[bound] = total
+		return {
+			'buckets': buckets,
+			'sum': self.sum,
+			'count': self.count,
+		}
+
+
+class MetricsRegistry( object ):
+	""" Hold counters and latency histograms, exportable as a dictionary or as Prometheus text. """
+
+	counters = None
+	histograms = None
+
+
+	def __init__( self ):
+		""" Start with every sysex_tones counter at zero, and empty histograms. """
+		self.reset()
+
+
+	def reset( self ):
+		""" Zero every counter, and empty every histogram. """
+		self.counters = _collections.OrderedDict()
+		self.histograms = _collections.OrderedDict()
+		for (name, description) in METRICS_HELP:
+			if name.endswith( '_seconds' ):
+				self.histograms[name] = Histogram()
+			else:
+				self.counters[name] = 0
+
+
+	@staticmethod
+	def now():
+		""" Return a high resolution time, in n.n seconds, for measuring latency. """
+		return _now()
+
+
+	def increment( self, name, value=1 ):
+		""" Add value to the counter name. """
+		self.counters[name] = self.counters.get( name, 0 ) + value
+
+
+	def observe( self, name, value ):
+		""" Count value into the histogram name. """
+		histogram = self.histograms.get( name )
+		if histogram is None:
+			histogram = self.histograms[name] = Histogram()
+		histogram.observe( value )
+
+
+	def observe_since( self, name, started ):
+		""" Count the n.n seconds since started (a now() time) into the histogram name. """
+		self.observe( name, _now() - started )
+
+
+	def record_read( self, data, frames, started=None ):
+		""" Count a read of data from a device, framed into frames, which began at started (a now() time, if present). """
+		self.counters['bytes_read'] += len( data )
+		self.counters['frames_read'] += len( frames )
+		if started is not None:
+			self.observe_since( 'read_seconds', started )
+
+
+	def get_dict( self ):
+		""" Return a dictionary of ['counters'] and ['histograms'] (see Histogram.get_dict()). """
+		return {
+			'counters': dict( self.counters ),
+			'histograms': dict( [(name, histogram.get_dict()) for (name, histogram) in self.histograms.items()] ),
+		}
+
+
+	def get_prometheus_text( self, prefix='sysex_tones_' ):
+		""" Return the metrics in the Prometheus text exposition format, each name beginning with prefix. """
+		lines = []
+		descriptions = dict( METRICS_HELP )
+		for (name, value) in self.counters.items():
+			metric = '%s%s_total' % (prefix, name)
+			lines.append( '# HELP %s %s' % (metric, descriptions.get( name, name )) )
+			lines.append( '# TYPE %s counter' % (metric) )
+			lines.append( '%s %s' % (metric, value) )
+		for (name, histogram) in self.histograms.items():
+			metric = '%s%s' % (prefix, name)
+			lines.append( '# HELP %s %s' % (metric, descriptions.get( name, name )) )
+			lines.append( '# TYPE %s histogram' % (metric) )
+			values = histogram.get_dict()
+			for (bound, count) in values['buckets'].items():
+				if bound == 'inf':
+					bound = '+Inf'
+				lines.append( '%s_bucket{le="%s"} %i' % (metric, bound, count) )
+			lines.append( '%s_sum %r' % (metric, values['sum']) )
+			lines.append( '%s_count %i' % (metric, values['count']) )
+		return '\n'.join( lines ) + '\n'
+
+
+	def write_prometheus_file( self, filename, prefix='sysex_tones_' ):
+		""" Write the Prometheus text to filename (e.g. for the node exporter textfile collector), replacing it atomically. """
+		temporary = '%s.%i.tmp' % (filename, _os.getpid())
+		with open( temporary, 'w' ) as outfile:
+			outfile.write( self.get_prometheus_text( prefix ) )
+		_os.rename( temporary, filename )
+
+
+	def write_prometheus_socket( self, connection, prefix='sysex_tones_' ):
+		""" Send the Prometheus text to connection (a connected socket, e.g. accepted from a scraper, or a Unix domain socket). """
+		connection.sendall( self.get_prometheus_text( prefix ).encode( 'utf-8' ) )
+
+
+	def serve_prometheus( self, port, address='127.0.0.1', prefix='sysex_tones_' ):
+		""" Serve the Prometheus text over HTTP on address:port, from a background thread, returning the server (call .shutdown() to stop it). """
+		import threading
+		try:
+			from http.server import BaseHTTPRequestHandler, HTTPServer
+		except ImportError: # Python 2
+			from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+		metrics = self
+
+		class Handler( BaseHTTPRequestHandler ):
+			""" Answer any GET with the metrics. """
+
+			def do_GET( self ):
+				""" Send the Prometheus text. """
+				body = metrics.get_prometheus_text( prefix ).encode( 'utf-8' )
+				self.send_response( 200 )
+				self.send_header( 'Content-Type', 'text/plain; version=0.0.4' )
+				self.send_header( 'Content-Length', str( len( body ) ) )
+				self.end_headers()
+				self.wfile.write( body )
+
+			def log_message( self, *args ):
+				""" Don't log every scrape. """
+				pass
+
+		retval = HTTPServer( (address, port), Handler )
+		thread = threading.Thread( target=retval.serve_forever )
+		thread.daemon = True
+		thread.start()
+		return retval
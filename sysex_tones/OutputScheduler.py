@@ -0,0 +1,150 @@
+""" Public interface for pacing MIDI SysEx output to what the MIDI link and device can absorb. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import time as _time
+import collections as _collections
+
+import sysex_tones as _sysex_tones
+import sysex_tones.Metrics as _Metrics
+
+
+# 31250 baud, 10 bits (start, 8 data, stop) per MIDI byte
+MIDI_BYTE_RATE = 3125
+
+
+class OutputScheduler( object ):
+	""" Queue SysEx commands, and write them no faster than byterate bytes a second, with at least gap n.n seconds between commands.
+
+	Up to burst bytes may be written ahead of the paced schedule (to fill the device's input buffer),
+	commands written together are batched into one writev() call.
+	"""
+
+	outfile = None
+	byterate = MIDI_BYTE_RATE
+	gap = 0.0
+	burst = 64
+	queue = None
+	queuedbytes = 0
+	clock = 0.0
+	started = None
+	finished = None
+	sentframes = 0
+	sentbytes = 0
+	writes = 0
+
+
+	def __init__( self, outfile=None, byterate=MIDI_BYTE_RATE, gap=0.0, burst=64 ):
+		""" The outfile argument is an open file (e.g. BasicIO.outfile), byterate, gap and burst set the pacing. """
+		self.outfile = outfile
+		self.byterate = byterate
+		self.gap = gap
+		self.burst = burst
+		self.queue = _collections.deque()
+
+
+	def queue_data( self, data ):
+		""" Queue data (a list of ints, or a buffer) as individual SysEx commands, returning the number of commands queued. """
+		commands = _sysex_tones.SysExFramer( len( data ), zerocopy=True ).feed( _sysex_tones.convert_to_bytes( data ) )
+		for sysex in commands:
+			self.queue.append( sysex )
+			self.queuedbytes += len( sysex )
+		return len( commands )
+
+
+	def get_queue_depth( self ):
+		""" Return the number of SysEx commands, and bytes, waiting to be written. """
+		return (len( self.queue ), self.queuedbytes)
+
+
+	def get_statistics( self ):
+		""" Return a dictionary of queue depth, and written commands, bytes, writes, and achieved throughput (bytes per second). """
+		throughput = 0.0
+		if self.started is not None:
+			# the paced schedule (self.clock) says when the last written byte leaves the link
+			elapsed = max( self.finished, self.clock ) - self.started
+			if elapsed > 0:
+				throughput = self.sentbytes / elapsed
+		return {
+			'queued_frames': len( self.queue ),
+			'queued_bytes': self.queuedbytes,
+			'sent_frames': self.sentframes,
+			'sent_bytes': self.sentbytes,
+			'writes': self.writes,
+			'throughput': throughput,
+		}
+
+
+	def pump( self ):
+		""" Write whatever the schedule allows now, without waiting, returning n.n seconds until the next command is due (0.0 when the queue is empty). """
+		retval = 0.0
+		now = _time.time()
+		if self.clock < now:
+			self.clock = now # the link has been idle
+		lead = float( self.burst ) / self.byterate
+		batch = []
+		while self.queue and self.clock - now <= lead:
+			sysex = self.queue.popleft()
+			self.queuedbytes -= len( sysex )
+			batch.append( sysex )
+			self.clock += float( len( sysex ) ) / self.byterate + self.gap
+			if self.gap: # keep the gap between commands, rather than batching them back to back
+				break
+		if batch:
+			self._write( batch )
+		if self.queue: # wake when half the burst has drained, so the next write can batch several commands
+			retval = max( 0.0, self.clock - lead / 2 - _time.time() )
+		return retval
+
+
+	def flush( self ):
+		""" Write all queued SysEx commands, sleeping as the schedule requires. """
+		while self.queue:
+			delay = self.pump()
+			if delay:
+				_time.sleep( delay )
+
+
+	def write_data( self, data ):
+		""" Queue data, and write it all, see queue_data() and flush(). """
+		self.queue_data( data )
+		self.flush()
+
+
+	def _write( self, batch ):
+		""" Write batch (a list of SysEx commands) in one system call, if the file supports it. """
+		if self.started is None:
+			self.started = _time.time()
+		size = sum( [len( sysex ) for sysex in batch] )
+		try:
+			fileno = self.outfile.fileno()
+		except (AttributeError, IOError, ValueError): # not a real file, e.g. io.BytesIO
+			fileno = None
+		if fileno is not None and hasattr( _os, 'writev' ):
+			written = _os.writev( fileno, batch )
+			if written < size: # finish a partial write
+				remainder = memoryview( b''.join( [bytes( sysex ) for sysex in batch] ) )[written:]
+				while remainder:
+					remainder = remainder[_os.write( fileno, remainder ):]
+		else:
+			for sysex in batch:
+				self.outfile.write( sysex )
+		self.writes += 1
+		self.sentframes += len( batch )
+		self.sentbytes += size
+		self.finished = _time.time()
+		metrics = _Metrics.registry
+		if metrics:
+			metrics.increment( 'bytes_written', size )
@@ -0,0 +1,139 @@
+""" Public interface for incrementally framing MIDI SysEx from a byte stream. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+from sysex_tones import CONSTANTS as _CONSTANTS
+
+
+_SYSEX_START = _CONSTANTS.SYSEX_START_BYTES
+_SYSEX_STOP = _CONSTANTS.SYSEX_STOP_BYTES
+
+_ZEROCOPY_TYPE = memoryview if _CONSTANTS.SYSEX_ZEROCOPY else bytearray # zerocopy frames are slices of one of these
+
+
+class SysExFramer( object ):
+	""" Split a MIDI byte stream into SysEx frames, carrying partial frames over between reads.
+
+	Bytes found outside of a frame are skipped (counted in self.garbage).
+	A frame interrupted by a new SysEx start is abandoned (counted in self.truncated).
+	A partial frame growing beyond maxsize bytes is abandoned (counted in self.dropped).
+
+	By default frames are returned as lists of ints.  When zerocopy is set, frames are returned as
+	memoryview slices of the receive buffer passed to feed(), without copying, or on Python 2
+	(where memoryviews index as characters, not ints) as bytearray slices, see CONSTANTS.SYSEX_ZEROCOPY.
+	"""
+
+	maxsize = 0
+	zerocopy = False
+	buffer = None
+	frames = 0
+	garbage = 0
+	truncated = 0
+	dropped = 0
+
+
+	def __init__( self, maxsize=65536, zerocopy=False ):
+		""" The maxsize argument limits the size of a partial frame waiting for its SysEx stop byte, zerocopy selects memoryview frames. """
+		self.maxsize = maxsize
+		self.zerocopy = zerocopy
+		self.reset()
+
+
+	def reset( self ):
+		""" Discard any partial frame, and zero the statistics. """
+		self.buffer = bytearray()
+		self.frames = 0
+		self.garbage = 0
+		self.truncated = 0
+		self.dropped = 0
+
+
+	def clear( self ):
+		""" Discard any partial frame (e.g. after the stream was reopened), counting it as truncated. """
+		if self.buffer:
+			if self.buffer.startswith( _SYSEX_START ):
+				self.truncated += 1
+			else:
+				self.garbage += len( self.buffer )
+			self.buffer = bytearray()
+
+
+	def pending( self ):
+		""" Return the number of bytes held over, waiting for the rest of a frame. """
+		return len( self.buffer )
+
+
+	def get_statistics( self ):
+		""" Return a dictionary of framing statistics. """
+		return {
+			'frames': self.frames,
+			'garbage': self.garbage,
+			'truncated': self.truncated,
+			'dropped': self.dropped,
+			'pending': len( self.buffer ),
+		}
+
+
+	def feed( self, data ):
+		""" Append data (a string, bytes, bytearray, or list of ints) to the stream, returning a list of complete SysEx commands. """
+		retval = []
+		if self.zerocopy:
+			# scan the receive buffer itself, only joining it to a held over partial frame
+			if self.buffer:
+				self.buffer.extend( data or b'' )
+				buf = bytes( self.buffer )
+			elif isinstance( data, bytes ):
+				buf = data
+			else:
+				buf = bytes( bytearray( data or b'' ) )
+			view = _ZEROCOPY_TYPE( buf )
+		else:
+			buf = self.buffer
+			if data:
+				buf.extend( data )
+		size = len( buf )
+		index = 0
+		while index < size:
+			start = buf.find( _SYSEX_START, index )
+			if start < 0:
+				self.garbage += size - index
+				index = size
+				break
+			self.garbage += start - index
+			stop = buf.find( _SYSEX_STOP, start + 1 )
+			end = stop
+			if end < 0:
+				end = size
+			restart = buf.find( _SYSEX_START, start + 1, end )
+			if restart >= 0: # a new frame began before this one ended, resync on the new frame
+				self.truncated += 1
+				index = restart
+			elif stop < 0: # incomplete, keep it for the next read
+				index = start
+				if size - start > self.maxsize:
+					self.dropped += 1
+					index = size
+				break
+			elif self.zerocopy:
+				retval.append( view[start:stop + 1] )
+				index = stop + 1
+			else:
+				retval.append( list( buf[start:stop + 1] ) )
+				index = stop + 1
+		if self.zerocopy:
+			self.buffer = bytearray( buf[index:] )
+		elif index:
+			del buf[:index]
+		self.frames += len( retval )
+		return retval
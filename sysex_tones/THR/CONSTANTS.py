@@ -71,6 +71,20 @@ THR10X_HEARTBEAT = THR_HEARTBEAT_PREFIX + YAMAHA_THR10X + THR_SYSEX_STOP
 THR10C_HEARTBEAT = THR_HEARTBEAT_PREFIX + YAMAHA_THR10C + THR_SYSEX_STOP
 THR5A_HEARTBEAT = THR_HEARTBEAT_PREFIX + YAMAHA_THR5A + THR_SYSEX_STOP
 
+# Yamaha THR MIDI stream commands and heartbeats, as bytes, for matching buffers (bytes, bytearray, memoryview)
+THR_UNKNOWN_PREFIX_BYTES = bytes( bytearray( THR_UNKNOWN_PREFIX ) )
+THR_DUMP_HEADER_BYTES = bytes( bytearray( THR_DUMP_HEADER ) )
+THR_COMMAND_PREFIX_BYTES = bytes( bytearray( THR_COMMAND_PREFIX ) )
+THR_SYSTEM_COMMAND_PREFIX_BYTES = bytes( bytearray( THR_SYSTEM_COMMAND_PREFIX ) )
+THR_SETTINGS_REQUEST_PREFIX_BYTES = bytes( bytearray( THR_SETTINGS_REQUEST_PREFIX ) )
+THR_HEARTBEAT_PREFIX_BYTES = bytes( bytearray( THR_HEARTBEAT_PREFIX ) )
+THR_UNKNOWN_POSTFIX_BYTES = bytes( bytearray( THR_UNKNOWN_POSTFIX ) )
+THR5_HEARTBEAT_BYTES = bytes( bytearray( THR5_HEARTBEAT ) )
+THR10_HEARTBEAT_BYTES = bytes( bytearray( THR10_HEARTBEAT ) )
+THR10X_HEARTBEAT_BYTES = bytes( bytearray( THR10X_HEARTBEAT ) )
+THR10C_HEARTBEAT_BYTES = bytes( bytearray( THR10C_HEARTBEAT ) )
+THR5A_HEARTBEAT_BYTES = bytes( bytearray( THR5A_HEARTBEAT ) )
+
 
 # Yamaha MIDI values for system settings
 # list length indicates size of MIDI variable values: 3=none, 2=byte, 1=int
@@ -85,3 +99,13 @@ THR_STREAM_SYSTEM_COMMANDS = {
 	},
 }
 
+
+# Yamaha THR frame kinds, see THRFrame.classify()
+THR_FRAME_UNKNOWN = 'unknown'
+THR_FRAME_HEARTBEAT = 'heartbeat'
+THR_FRAME_DUMP = 'dump'
+THR_FRAME_BAD_DUMP = 'bad dump' # a dump with a bad checksum
+THR_FRAME_YDL = 'ydl'
+THR_FRAME_COMMAND = 'command'
+THR_FRAME_SYSTEM_COMMAND = 'system command'
+THR_FRAME_SETTINGS_REQUEST = 'settings request'
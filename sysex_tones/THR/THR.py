@@ -14,26 +14,28 @@
 
 
 import sysex_tones as _sysex_tones
+import sysex_tones.Metrics as _Metrics
 
 from sysex_tones import CONSTANTS as _CONSTANTS
 from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 
 from sysex_tones import BasicIO as _BasicIO
+from sysex_tones.THR.THRFrame import THRFrame as _THRFrame
 
 
 class THR( _BasicIO ):
 	""" Manage THR settings via MIDI SysEx. """
 
 
-	def __init__( self, infilename=None, outfilename=None ):
-		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data. """
-		_BasicIO.__init__( self, infilename, outfilename )
+	def __init__( self, infilename=None, outfilename=None, zerocopy=False ):
+		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data, zerocopy selects memoryview SysEx instead of lists of ints. """
+		_BasicIO.__init__( self, infilename, outfilename, zerocopy )
 
 
-	def extract_dump( self ):
-		""" Extract a settings dump from self.infile, returning a dictionary containing ['sysex'] and ['dump'] if found. """
+	def extract_dump( self, timeout=0.3 ):
+		""" Extract a settings dump from self.infile (waiting at most timeout n.n seconds for data), returning a dictionary containing ['sysex'] and ['dump'] if found. """
 		retval = {}
-		for sysex in self.extract_sysex_from_infile():
+		for sysex in self.extract_sysex_from_infile( timeout ):
 			detected = self.detect_midi_dump( sysex )
 			# skip device heartbeats, only process a settings dump
 			if detected:
@@ -43,13 +45,23 @@ class THR( _BasicIO ):
 		return retval
 
 
+	@staticmethod
+	def classify_frame( data ):
+		""" Classify data (a list of ints, or a buffer) as a heartbeat, dump, command, etc. in one lookup, returning a THRFrame. """
+		return _THRFrame.classify( data )
+
+
 	@classmethod
 	def detect_midi_dump( cls, data ):
-		""" Check data for known types of THR MIDI data. """
+		""" Check data (a list of ints, or a buffer) for known types of THR MIDI data, the detected ['data'] is a slice of data. """
 		retval= []
+		metrics = _Metrics.registry
+		if metrics:
+			started = metrics.now()
+		isbuffer = _sysex_tones.is_buffer( data )
 		if len( data ) == _THR_CONSTANTS.THR_FILE_SIZE:
-			unknownprefix = data[:len( _THR_CONSTANTS.THR_UNKNOWN_PREFIX )]
-			if unknownprefix == _THR_CONSTANTS.THR_UNKNOWN_PREFIX:
+			unknownprefix = _sysex_tones.ternary_operator( isbuffer, _THR_CONSTANTS.THR_UNKNOWN_PREFIX_BYTES, _THR_CONSTANTS.THR_UNKNOWN_PREFIX )
+			if _sysex_tones.startswith( data, unknownprefix ):
 				retval = {
 					'type': 'ydl',
 					'data': data[_THR_CONSTANTS.THR_FILE_OFFSET:],
@@ -59,20 +71,37 @@ class THR( _BasicIO ):
 				# -2 is the list offset for the checksum byte
 				payload = data[len( _THR_CONSTANTS.THR_DUMP_HEADER_PREFIX ):-2]
 				if _sysex_tones.THR.is_valid_checksum( payload, data[-2] ):
-					header = data[:len( _THR_CONSTANTS.THR_DUMP_HEADER )]
-					if header == _THR_CONSTANTS.THR_DUMP_HEADER:
+					header = _sysex_tones.ternary_operator( isbuffer, _THR_CONSTANTS.THR_DUMP_HEADER_BYTES, _THR_CONSTANTS.THR_DUMP_HEADER )
+					if _sysex_tones.startswith( data, header ):
 						retval = {
 							'type': 'dump',
 							'data': data[_THR_CONSTANTS.THR_DUMP_OFFSET:-2],
 						}
+				elif metrics:
+					metrics.increment( 'checksum_failures' )
+		if metrics:
+			if retval:
+				metrics.increment( 'dumps' )
+			metrics.observe_since( 'decode_seconds', started )
 		return retval
 
 	@staticmethod
 	def find_thr_heartbeat_model( data ):
-		""" Returns a THR model name, if data is a device heartbeat. """
+		""" Returns a THR model name, if data (a list of ints, or a buffer) is a device heartbeat. """
 		retval = ''
 		heartbeat = data[:len( _THR_CONSTANTS.THR10_HEARTBEAT )]
-		if heartbeat == _THR_CONSTANTS.THR5_HEARTBEAT:
+		if _sysex_tones.is_buffer( heartbeat ):
+			if heartbeat == _THR_CONSTANTS.THR5_HEARTBEAT_BYTES:
+				retval = _THR_CONSTANTS.THR5_MODEL_NAME
+			elif heartbeat == _THR_CONSTANTS.THR10_HEARTBEAT_BYTES:
+				retval = _THR_CONSTANTS.THR10_MODEL_NAME
+			elif heartbeat == _THR_CONSTANTS.THR10X_HEARTBEAT_BYTES:
+				retval = _THR_CONSTANTS.THR10X_MODEL_NAME
+			elif heartbeat == _THR_CONSTANTS.THR10C_HEARTBEAT_BYTES:
+				retval = _THR_CONSTANTS.THR10C_MODEL_NAME
+			elif heartbeat == _THR_CONSTANTS.THR5A_HEARTBEAT_BYTES:
+				retval = _THR_CONSTANTS.THR5A_MODEL_NAME
+		elif heartbeat == _THR_CONSTANTS.THR5_HEARTBEAT:
 			retval = _THR_CONSTANTS.THR5_MODEL_NAME
 		elif heartbeat == _THR_CONSTANTS.THR10_HEARTBEAT:
 			retval = _THR_CONSTANTS.THR10_MODEL_NAME
@@ -82,5 +111,6 @@ class THR( _BasicIO ):
 			retval = _THR_CONSTANTS.THR10C_MODEL_NAME
 		elif heartbeat == _THR_CONSTANTS.THR5A_HEARTBEAT:
 			retval = _THR_CONSTANTS.THR5A_MODEL_NAME
+		if retval and _Metrics.registry:
+			_Metrics.registry.increment( 'heartbeats' )
 		return retval
-
@@ -0,0 +1,132 @@
+""" Public interface for classifying THR MIDI SysEx frames. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sysex_tones as _sysex_tones
+import sysex_tones.Metrics as _Metrics
+
+from sysex_tones import CONSTANTS as _CONSTANTS
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+
+# THR frames begin F0 43 7D, then a byte saying what kind of frame it is
+_KIND_INDEX = len( _THR_CONSTANTS.THR_SYSEX_START )
+
+_SYSEX_STOP = _CONSTANTS.SYSEX_STOP[0]
+
+_MODELS = {
+	_THR_CONSTANTS.YAMAHA_THR5[0]: _THR_CONSTANTS.THR5_MODEL_NAME,
+	_THR_CONSTANTS.YAMAHA_THR10[0]: _THR_CONSTANTS.THR10_MODEL_NAME,
+	_THR_CONSTANTS.YAMAHA_THR10X[0]: _THR_CONSTANTS.THR10X_MODEL_NAME,
+	_THR_CONSTANTS.YAMAHA_THR10C[0]: _THR_CONSTANTS.THR10C_MODEL_NAME,
+	_THR_CONSTANTS.YAMAHA_THR5A[0]: _THR_CONSTANTS.THR5A_MODEL_NAME,
+}
+
+# (frame length, kind byte) mapped to the frame kind, and the prefix (as a list of ints, and as bytes) the rest of the frame follows
+_FRAMES = {
+	(len( _THR_CONSTANTS.THR_HEARTBEAT_PREFIX ) + 2, _THR_CONSTANTS.THR_HEARTBEAT_PREFIX[_KIND_INDEX]): ( # model, stop
+		_THR_CONSTANTS.THR_FRAME_HEARTBEAT,
+		_THR_CONSTANTS.THR_HEARTBEAT_PREFIX,
+		_THR_CONSTANTS.THR_HEARTBEAT_PREFIX_BYTES,
+	),
+	(len( _THR_CONSTANTS.THR_COMMAND_PREFIX ) + 4, _THR_CONSTANTS.THR_COMMAND_PREFIX[_KIND_INDEX]): ( # 3 byte payload, stop
+		_THR_CONSTANTS.THR_FRAME_COMMAND,
+		_THR_CONSTANTS.THR_COMMAND_PREFIX,
+		_THR_CONSTANTS.THR_COMMAND_PREFIX_BYTES,
+	),
+	(len( _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX ) + 3, _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX[_KIND_INDEX]): ( # 2 byte payload, stop
+		_THR_CONSTANTS.THR_FRAME_SYSTEM_COMMAND,
+		_THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX,
+		_THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX_BYTES,
+	),
+	(len( _THR_CONSTANTS.THR_SETTINGS_REQUEST_PREFIX ) + 2 + len( _THR_CONSTANTS.THR_UNKNOWN_POSTFIX ), _THR_CONSTANTS.THR_SETTINGS_REQUEST_PREFIX[_KIND_INDEX]): ( # model, postfix, stop
+		_THR_CONSTANTS.THR_FRAME_SETTINGS_REQUEST,
+		_THR_CONSTANTS.THR_SETTINGS_REQUEST_PREFIX,
+		_THR_CONSTANTS.THR_SETTINGS_REQUEST_PREFIX_BYTES,
+	),
+	(_THR_CONSTANTS.THR_DUMP_SIZE, _THR_CONSTANTS.THR_DUMP_HEADER[_KIND_INDEX]): ( # settings block, checksum, stop
+		_THR_CONSTANTS.THR_FRAME_DUMP,
+		_THR_CONSTANTS.THR_DUMP_HEADER,
+		_THR_CONSTANTS.THR_DUMP_HEADER_BYTES,
+	),
+}
+
+
+class THRFrame( object ):
+	""" A classified THR frame, self.kind is one of the THR_CONSTANTS.THR_FRAME_* kinds.
+
+	self.sysex is the whole frame, self.data is what follows the kind's prefix: the command payload (commands and system commands),
+	the settings block (dumps, and ydl files), or None.  self.model is the model name (heartbeats and settings requests), or ''.
+	"""
+
+	__slots__ = ('kind', 'sysex', 'data', 'model')
+
+
+	def __init__( self, kind, sysex, data=None, model='' ):
+		""" The kind argument is a THR_CONSTANTS.THR_FRAME_* kind, see the class description for the rest. """
+		self.kind = kind
+		self.sysex = sysex
+		self.data = data
+		self.model = model
+
+
+	def __repr__( self ):
+		""" Describe the frame, without its data. """
+		return '<THRFrame %s%s, %i bytes>' % (self.kind, _sysex_tones.ternary_operator( self.model, ' ' + self.model, '' ), len( self.sysex ))
+
+
+	@classmethod
+	def classify( cls, data ):
+		""" Classify data (a list of ints, or a buffer) with one lookup on its length and kind byte, returning a THRFrame.
+
+		Only frames that can be dumps are checksummed, data slices (self.data) are lists or buffers, as data is.
+		"""
+		kind = _THR_CONSTANTS.THR_FRAME_UNKNOWN
+		payload = None
+		model = ''
+		size = len( data )
+		if size == _THR_CONSTANTS.THR_FILE_SIZE: # a ydl file, not SysEx
+			prefix = _sysex_tones.ternary_operator( _sysex_tones.is_buffer( data ), _THR_CONSTANTS.THR_UNKNOWN_PREFIX_BYTES, _THR_CONSTANTS.THR_UNKNOWN_PREFIX )
+			if data[:len( prefix )] == prefix:
+				kind = _THR_CONSTANTS.THR_FRAME_YDL
+				payload = data[_THR_CONSTANTS.THR_FILE_OFFSET:]
+		elif size > _KIND_INDEX and data[-1] == _SYSEX_STOP:
+			found = _FRAMES.get( (size, data[_KIND_INDEX]) )
+			if found:
+				(candidate, prefix, prefixbytes) = found
+				if _sysex_tones.is_buffer( data ):
+					prefix = prefixbytes
+				if data[:len( prefix )] == prefix:
+					payload = data[len( prefix ):-1]
+					kind = candidate
+					if kind == _THR_CONSTANTS.THR_FRAME_DUMP:
+						payload = payload[:-1] # the settings block, without the checksum
+						# the checksum covers everything after the dump header prefix, to the checksum
+						if not _sysex_tones.THR.is_valid_checksum( data[len( _THR_CONSTANTS.THR_DUMP_HEADER_PREFIX ):-2], data[-2] ):
+							kind = _THR_CONSTANTS.THR_FRAME_BAD_DUMP
+					elif kind in [_THR_CONSTANTS.THR_FRAME_HEARTBEAT, _THR_CONSTANTS.THR_FRAME_SETTINGS_REQUEST]:
+						model = _MODELS.get( payload[0], '' )
+						if not model or (kind == _THR_CONSTANTS.THR_FRAME_SETTINGS_REQUEST and list( payload[1:] ) != _THR_CONSTANTS.THR_UNKNOWN_POSTFIX):
+							(kind, payload, model) = (_THR_CONSTANTS.THR_FRAME_UNKNOWN, None, '')
+						else:
+							payload = None
+		metrics = _Metrics.registry
+		if metrics:
+			if kind == _THR_CONSTANTS.THR_FRAME_HEARTBEAT:
+				metrics.increment( 'heartbeats' )
+			elif kind == _THR_CONSTANTS.THR_FRAME_DUMP:
+				metrics.increment( 'dumps' )
+			elif kind == _THR_CONSTANTS.THR_FRAME_BAD_DUMP:
+				metrics.increment( 'checksum_failures' )
+		return cls( kind, data, payload, model )
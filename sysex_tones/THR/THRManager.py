@@ -0,0 +1,211 @@
+""" Public interface for managing many THR devices from one process. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import time as _time
+import collections as _collections
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+
+class THRManager( object ):
+	""" Manage many THR (or THR10) devices, reading all of them in one EventLoop, and routing requests and writes by device name.
+
+	Each device is identified by the model in its heartbeat, device heartbeats are not passed on to callback.
+	Devices that disconnect (e.g. power cycled amps) are watched with a HotplugWatcher, then reopened and read again when they reconnect,
+	devices reading regular files (e.g. captures) are not, they have ended.
+	"""
+
+	loop = None
+	watcher = None
+	callback = None
+	errorcallback = None
+	reconnectcallback = None
+	devices = None
+	names = None
+	models = None
+	lastseen = None
+	disconnected = None
+	running = False
+
+
+	def __init__( self, callback=None, errorcallback=None, loop=None, watcher=None, reconnectcallback=None ):
+		""" Call callback( name, device, sysex ) for each SysEx (other than heartbeats) from any device, errorcallback( name, device, error ) (if present) after a device disconnects,
+		and reconnectcallback( name, device ) (if present) after it reconnects.
+
+		The watcher argument is a HotplugWatcher to watch disconnected devices with, one is created when a device first disconnects if None.
+		"""
+		self.callback = callback
+		self.errorcallback = errorcallback
+		self.reconnectcallback = reconnectcallback
+		self.loop = loop or _sysex_tones.EventLoop()
+		self.watcher = watcher
+		self.devices = _collections.OrderedDict()
+		self.names = {}
+		self.models = {}
+		self.lastseen = {}
+		self.disconnected = {}
+
+
+	def add_device( self, device, name=None ):
+		""" Manage device (opening device.infile if needed) as name, which defaults to device.infilename, returning the name. """
+		if not name:
+			name = device.infilename
+		if name in self.devices:
+			self.remove_device( name )
+		if not device.infile:
+			device.open_infile()
+		self.devices[name] = device
+		self.names[device] = name
+		self.loop.register( device, self._dispatch, self._disconnected )
+		return name
+
+
+	def remove_device( self, name ):
+		""" Stop managing the device known as name, returning the device, which is left open. """
+		device = self.devices.pop( name )
+		self.loop.unregister( device )
+		if device in self.disconnected:
+			del self.disconnected[device]
+			self.watcher.remove_device( device )
+		del self.names[device]
+		self.models.pop( name, None )
+		self.lastseen.pop( name, None )
+		return device
+
+
+	def close( self ):
+		""" Close all devices, and stop managing them. """
+		for name in list( self.devices ):
+			device = self.remove_device( name )
+			device.close_infile()
+			device.close_outfile()
+		self.loop.close()
+		if self.watcher:
+			self.watcher.close()
+
+
+	def get_device( self, name ):
+		""" Return the device known as name. """
+		return self.devices[name]
+
+
+	def get_names( self, model=None ):
+		""" Return the names of all devices, or only those whose heartbeat identified them as model (e.g. THR_CONSTANTS.THR10_MODEL_NAME). """
+		retval = list( self.devices )
+		if model:
+			retval = [name for name in retval if self.models.get( name ) == model]
+		return retval
+
+
+	def get_model( self, name ):
+		""" Return the model name from the heartbeat of the device known as name, or '' if it hasn't sent one yet. """
+		return self.models.get( name, '' )
+
+
+	def write_data( self, name, data ):
+		""" Write data to the device known as name. """
+		self.devices[name].write_data_to_outfile( data )
+
+
+	def request_current_settings( self, name=None, model=None ):
+		""" Ask the device known as name, or all devices (of model, if present), for a settings dump, which arrives via callback.
+
+		Only THR10 devices can be asked, other devices, and devices that are disconnected, are skipped.
+		"""
+		names = [name]
+		if not name:
+			names = self.get_names( model )
+		for name in names:
+			device = self.devices[name]
+			if hasattr( device, 'request_current_settings' ) and device not in self.disconnected:
+				device.request_current_settings()
+
+
+	def get_disconnected_names( self ):
+		""" Return the names of the devices that disconnected, and haven't reconnected yet. """
+		return [self.names[device] for device in self.disconnected]
+
+
+	def stop( self ):
+		""" Make run() return, after the current dispatch. """
+		self.running = False
+
+
+	def run_once( self, timeout=None ):
+		""" Dispatch SysEx from any device, see EventLoop.run_once(), while devices are disconnected reconnect any that are back, waiting at most the watcher's delay. """
+		if self.disconnected:
+			self.watcher.wait( 0 ) # reconnected devices are registered again by _reconnected()
+			if timeout is None or timeout > self.watcher.delay:
+				timeout = self.watcher.delay
+		return self.loop.run_once( timeout )
+
+
+	def run( self, timeout=None ):
+		""" Dispatch SysEx from all devices until stop() is called, all of them are gone (disconnected devices count until removed), or (if present) timeout n.n seconds pass without any SysEx. """
+		self.running = True
+		last = _time.time()
+		while self.running and self.devices:
+			wait = None
+			if timeout is not None:
+				wait = max( 0, last + timeout - _time.time() )
+			if self.run_once( wait ):
+				last = _time.time()
+			elif timeout is not None and _time.time() - last >= timeout:
+				break
+			if not self.disconnected and not self.loop.get_devices(): # every device ended
+				break
+		self.running = False
+
+
+	def _dispatch( self, device, sysex ):
+		""" EventLoop callback, identify devices from their heartbeats, pass anything else on to self.callback. """
+		name = self.names[device]
+		frame = device.classify_frame( sysex )
+		if frame.kind == _THR_CONSTANTS.THR_FRAME_HEARTBEAT:
+			self.models[name] = frame.model
+			self.lastseen[name] = _time.time()
+		elif self.callback:
+			self.callback( name, device, sysex )
+
+
+	def _disconnected( self, device, error ):
+		""" EventLoop error callback, close the device and forget its model, watch it so it is reopened (and identified again) after it reconnects. """
+		name = self.names[device]
+		self.disconnected[device] = bool( device.outfile ) # reopen the output too, if it was open
+		device.close_infile()
+		device.close_outfile()
+		self.models.pop( name, None )
+		if _os.path.isfile( device.infilename ): # a regular file ended, it won't reconnect
+			del self.disconnected[device]
+		else:
+			if not self.watcher:
+				self.watcher = _sysex_tones.HotplugWatcher()
+			self.watcher.add_device( device, self._reconnected )
+		if self.errorcallback:
+			self.errorcallback( name, device, error )
+
+
+	def _reconnected( self, device, connected ):
+		""" HotplugWatcher callback, read the reopened device again. """
+		if connected and device in self.disconnected:
+			self.watcher.remove_device( device )
+			if self.disconnected.pop( device ):
+				device.open_outfile()
+			self.loop.register( device, self._dispatch, self._disconnected )
+			if self.reconnectcallback:
+				self.reconnectcallback( self.names[device], device )
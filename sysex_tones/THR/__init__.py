@@ -14,11 +14,22 @@
 
 
 from sysex_tones.THR.THR import THR
+from sysex_tones.THR.THRFrame import THRFrame
 
 import os as _os
 
+import sysex_tones as _sysex_tones
+
 from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 
+from sysex_tones.lazy_exports import make_lazy as _make_lazy
+
+
+# classes only some apps need, loaded on first use
+_make_lazy( __name__, {
+	'THRManager': 'sysex_tones.THR.THRManager',
+} )
+
 
 def calculate_checksum( data ):
 	""" Calculate the Yamaha checksum. """
@@ -30,6 +41,65 @@ def is_valid_checksum( data, checksum ):
 	return checksum == calculate_checksum( data )
 
 
+def convert_block_to_dump( block ):
+	""" Convert block (a 256 byte settings block, a list of ints or a buffer) into a complete THR settings dump, a list of ints with a valid checksum. """
+	retval = _THR_CONSTANTS.THR_DUMP_HEADER + list( bytearray( block ) )
+	# the checksum covers everything after the dump header prefix
+	retval.append( calculate_checksum( retval[len( _THR_CONSTANTS.THR_DUMP_HEADER_PREFIX ):] ) )
+	retval += _THR_CONSTANTS.THR_SYSEX_STOP
+	return retval
+
+
+def build_command_index( commands ):
+	""" Build a reverse index of commands (a dictionary of controls, each a dictionary of names mapped to command prefixes, e.g. THR_STREAM_SYSTEM_COMMANDS) for find_command_in_index().
+
+	Returns a tuple of (the command prefix lengths, longest first, and a dictionary of command prefix tuples mapped to (position, control, name, prefix length)),
+	the position keeps the table order, so when prefixes overlap the first in the table is found, as a scan of the table would find it.
+	"""
+	index = {}
+	position = 0
+	for control in commands:
+		for name in commands[control]:
+			key = tuple( commands[control][name] )
+			if key not in index: # a later duplicate could never be found by a scan
+				index[key] = (position, control, name, len( key ))
+			position += 1
+	lengths = tuple( sorted( set( [len( key ) for key in index] ), reverse=True ) )
+	return (lengths, index)
+
+
+def find_command_in_index( commandindex, payload, maxvaluesize=2 ):
+	""" Find the first command (by table order) in commandindex (from build_command_index()) that payload (a list of ints) begins with, followed by at most maxvaluesize value bytes.
+
+	Returns a tuple of (control, name, value size), or None, with one dictionary lookup per command prefix length.
+	"""
+	retval = None
+	(lengths, index) = commandindex
+	best = None
+	size = len( payload )
+	for length in lengths:
+		if size - maxvaluesize <= length <= size:
+			found = index.get( tuple( payload[:length] ) )
+			if found and (best is None or found[0] < best[0]):
+				best = found
+	if best:
+		retval = (best[1], best[2], size - best[3])
+	return retval
+
+
+def get_settings_block( data ):
+	""" Return the 256 byte settings block (a slice of data) of data, a settings dump, ydl file contents, or a settings block, or None if data is none of them. """
+	retval = None
+	size = len( data )
+	if size == _THR_CONSTANTS.THR_DUMP_SIZE:
+		retval = data[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+	elif size == _THR_CONSTANTS.THR_FILE_SIZE:
+		retval = data[_THR_CONSTANTS.THR_FILE_OFFSET:]
+	elif size == _THR_CONSTANTS.THR_SYSEX_SIZE:
+		retval = data
+	return retval
+
+
 def is_known_size( size ):
 	""" Check if size is a typical THR dump or settings file size, return the size if valid, otherwise return 0. """
 	retval = 0
@@ -44,8 +114,11 @@ def get_known_file_size( filename ):
 
 
 def change_name_of_settings( name, data ):
-	""" Replace the old name with a new name in the THR MIDI data, returns an altered copy of data. """
-	retval = data[:] # make a copy of the data
+	""" Replace the old name with a new name in the THR MIDI data, returns an altered copy of data (a bytearray, if data is a buffer). """
+	if _sysex_tones.is_buffer( data ):
+		retval = bytearray( data ) # make a writable copy of the data, bytes and memoryview are read only
+	else:
+		retval = data[:] # make a copy of the data
 	offset = _THR_CONSTANTS.THR_DUMP_OFFSET
 	low = ord( ' ' )
 	high = ord( '~' )
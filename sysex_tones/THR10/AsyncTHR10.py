@@ -0,0 +1,56 @@
+""" Public interface for managing THR10 settings via MIDI SysEx, with asyncio coroutines. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import time as _time
+
+from sysex_tones.AsyncBasicIO import AsyncBasicIO as _AsyncBasicIO
+from sysex_tones.THR10 import THR10 as _THR10
+
+
+class AsyncTHR10( _AsyncBasicIO, _THR10 ):
+	""" Manage THR10 settings via MIDI SysEx, with asyncio coroutines, so one event loop can drive many devices. """
+
+
+	def __init__( self, infilename=None, outfilename=None, zerocopy=False, loop=None ):
+		""" The infilename and outfilename arguments should be MIDI device filenames, zerocopy selects memoryview SysEx, loop defaults to the running event loop. """
+		_AsyncBasicIO.__init__( self, infilename, outfilename, zerocopy, loop )
+
+
+	async def extract_dump( self, timeout=None ):
+		""" Wait at most timeout n.n seconds (None waits indefinitely) for a settings dump, returning a dictionary containing ['sysex'] and ['dump'] if found. """
+		retval = {}
+		deadline = None
+		if timeout is not None:
+			deadline = _time.time() + timeout
+		while not retval:
+			wait = None
+			if deadline is not None:
+				wait = max( 0, deadline - _time.time() )
+			sysex = await self.read_sysex( wait )
+			if sysex is None: # timed out, or the end of the file
+				break
+			detected = self.detect_midi_dump( sysex )
+			# skip device heartbeats, only process a settings dump
+			if detected:
+				retval['sysex'] = sysex
+				retval['dump'] = detected['data']
+		return retval
+
+
+	async def request_current_settings( self, outfilename=None, timeout=None ):
+		""" Ask the device for a settings dump, setting self.outfilename if present, and wait at most timeout n.n seconds for it, see extract_dump(). """
+		self.start_reading() # listen before asking, so the dump can't be missed
+		_THR10.request_current_settings( self, outfilename )
+		return await self.extract_dump( timeout )
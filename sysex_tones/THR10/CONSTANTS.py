@@ -18,6 +18,24 @@ from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 
 # Yamaha THR MIDI stream commands
 THR10_SETTINGS_REQUEST = _THR_CONSTANTS.THR_SETTINGS_REQUEST_PREFIX + _THR_CONSTANTS.YAMAHA_THR10 + _THR_CONSTANTS.THR_UNKNOWN_POSTFIX + _THR_CONSTANTS.THR_SYSEX_STOP # is this specific to the THR10 or does 0x31 just happen to be part of the UNKNOWN MIDI?
+THR10_SETTINGS_REQUEST_BYTES = bytes( bytearray( THR10_SETTINGS_REQUEST ) )
+
+
+# Yamaha THR10 settings block layout, a command sets the block at THR10_BLOCK_OFFSET + its first byte
+THR10_BLOCK_OFFSET = 128
+
+# command first bytes that set a MIDI int (two block bytes), mapped to None, or to the block offset and values of the type that makes them a MIDI int
+THR10_BLOCK_MIDI_INTS = {
+	0x11: [144, [1]], # Rack threshold, Stomp sustain is a byte
+	0x17: [144, [1]], # Rack output
+	0x31: None, # delay time
+	0x34: None, # delay high cut
+	0x36: None, # delay low cut
+	0x41: [192, [0, 1, 2]], # Hall, Room, Plate time, Spring reverb is a byte
+	0x43: None, # reverb pre
+	0x45: None, # reverb low cut
+	0x47: None, # reverb high cut
+}
 
 
 # Yamaha THR10 settings labels, in lists, to retain index order
@@ -147,6 +165,17 @@ THR10_STREAM_SUBCOMMANDS = {
 }
 
 
+# settings command addresses used by some types only, that aren't subcommands, by type select address and type value
+THR10_STREAM_TYPE_ADDRESSES = {
+	0x40: { # reverb
+		0: [0x41, 0x43, 0x45, 0x47, 0x49, 0x4a], # Hall time, pre, low cut, high cut, high ratio, low ratio
+		1: [0x41, 0x43, 0x45, 0x47, 0x49, 0x4a], # Room
+		2: [0x41, 0x43, 0x45, 0x47, 0x49, 0x4a], # Plate
+		3: [0x41, 0x42], # Spring reverb, filter
+	},
+}
+
+
 # Yamaha THR10 lower/upper limits for MIDI variable values
 
 THR10_STREAM_LIMITS = {
@@ -219,3 +248,135 @@ THR10_STREAM_SUBLIMITS = {
 	},
 }
 
+
+
+# Yamaha THR10 settings block layout, for decoding dumps into settings text and values, see convert_data.decode_block()
+#
+# each section has a 'label', and one of
+#	'size': text of that size, at 'offset'
+#	'names': a type at 'offset', indexing names, with 'types' mapping types to fields, if the type has settings
+#	'fields': settings
+# and an on/off 'state' offset, if it can be switched off
+#
+# each field is [setting, offset, size: 1 for a byte or 2 for a MIDI int, [minimum, maximum], or None and a list of value names]
+THR10_REVERB_FIELDS = [
+	['Time', 193, 2, THR10_STREAM_LIMITS['reverb']['time']],
+	['Pre', 195, 2, THR10_STREAM_LIMITS['reverb']['pre']],
+	['Low Cut', 197, 2, THR10_STREAM_LIMITS['reverb']['low cut']],
+	['High Cut', 199, 2, THR10_STREAM_LIMITS['reverb']['high cut']],
+	['High Ratio', 201, 1, THR10_STREAM_LIMITS['reverb']['high ratio']],
+	['Low Ratio', 202, 1, THR10_STREAM_LIMITS['reverb']['low ratio']],
+	['Level', 203, 1, THR10_STREAM_LIMITS['reverb']['level']],
+]
+
+THR10_BLOCK_LAYOUT = [
+	{
+		'label': 'Name',
+		'offset': 0,
+		'size': _THR_CONSTANTS.THR_SETTINGS_NAME_SIZE,
+	},
+	{
+		'label': 'Amp',
+		'offset': 128,
+		'names': THR10_AMP_NAMES,
+	},
+	{
+		'label': 'Control',
+		'fields': [
+			['Gain', 129, 1, THR10_STREAM_LIMITS['control']['gain']],
+			['Master', 130, 1, THR10_STREAM_LIMITS['control']['master']],
+			['Bass', 131, 1, THR10_STREAM_LIMITS['control']['bass']],
+			['Middle', 132, 1, THR10_STREAM_LIMITS['control']['middle']],
+			['Treble', 133, 1, THR10_STREAM_LIMITS['control']['treble']],
+		],
+	},
+	{
+		'label': 'Cab',
+		'offset': 134,
+		'names': THR10_CAB_NAMES,
+	},
+	{
+		'label': 'Compressor',
+		'state': 159,
+		'offset': 144,
+		'names': THR10_COMPRESSOR_NAMES,
+		'types': {
+			0: [ # Stomp
+				['Sustain', 145, 1, THR10_STREAM_SUBLIMITS['stomp']['sustain']],
+				['Output', 146, 1, THR10_STREAM_SUBLIMITS['stomp']['output']],
+			],
+			1: [ # Rack
+				['Threshold', 146, 1, THR10_STREAM_SUBLIMITS['rack']['threshold']], # the low byte of the MIDI int at 145, as dumps have always been decoded
+				['Attack', 147, 1, THR10_STREAM_SUBLIMITS['rack']['attack']],
+				['Release', 148, 1, THR10_STREAM_SUBLIMITS['rack']['release']],
+				['Ratio', 149, 1, None, THR10_RATIO_NAMES],
+				['Knee', 150, 1, None, THR10_KNEE_NAMES],
+				['Output', 151, 2, THR10_STREAM_SUBLIMITS['rack']['output']],
+			],
+		},
+	},
+	{
+		'label': 'Modulation',
+		'state': 175,
+		'offset': 160,
+		'names': THR10_MODULATION_NAMES,
+		'types': {
+			0: [ # Chorus
+				['Speed', 161, 1, THR10_STREAM_SUBLIMITS['chorus']['speed']],
+				['Depth', 162, 1, THR10_STREAM_SUBLIMITS['chorus']['depth']],
+				['Mix', 163, 1, THR10_STREAM_SUBLIMITS['chorus']['mix']],
+			],
+			1: [ # Flanger
+				['Speed', 161, 1, THR10_STREAM_SUBLIMITS['flanger']['speed']],
+				['Manual', 162, 1, THR10_STREAM_SUBLIMITS['flanger']['manual']],
+				['Depth', 163, 1, THR10_STREAM_SUBLIMITS['flanger']['depth']],
+				['Feedback', 164, 1, THR10_STREAM_SUBLIMITS['flanger']['feedback']],
+				['Spread', 165, 1, THR10_STREAM_SUBLIMITS['flanger']['spread']],
+			],
+			2: [ # Tremelo
+				['Freq', 161, 1, THR10_STREAM_SUBLIMITS['tremelo']['freq']],
+				['Depth', 162, 1, THR10_STREAM_SUBLIMITS['tremelo']['depth']],
+			],
+			3: [ # Phaser
+				['Speed', 161, 1, THR10_STREAM_SUBLIMITS['phaser']['speed']],
+				['Manual', 162, 1, THR10_STREAM_SUBLIMITS['phaser']['manual']],
+				['Depth', 163, 1, THR10_STREAM_SUBLIMITS['phaser']['depth']],
+				['Feedback', 164, 1, THR10_STREAM_SUBLIMITS['phaser']['feedback']],
+			],
+		},
+	},
+	{
+		'label': 'Delay',
+		'state': 191,
+		'fields': [
+			['Time', 177, 2, THR10_STREAM_LIMITS['delay']['time']],
+			['Feedback', 179, 1, THR10_STREAM_LIMITS['delay']['feedback']],
+			['High Cut', 180, 2, THR10_STREAM_LIMITS['delay']['high cut']],
+			['Low Cut', 182, 2, THR10_STREAM_LIMITS['delay']['low cut']],
+			['Level', 184, 1, THR10_STREAM_LIMITS['delay']['level']],
+		],
+	},
+	{
+		'label': 'Reverb',
+		'state': 207,
+		'offset': 192,
+		'names': THR10_REVERB_NAMES,
+		'types': {
+			0: THR10_REVERB_FIELDS, # Hall
+			1: THR10_REVERB_FIELDS, # Room
+			2: THR10_REVERB_FIELDS, # Plate
+			3: [ # Spring
+				['Reverb', 193, 1, THR10_STREAM_LIMITS['reverb']['reverb']],
+				['Filter', 194, 1, THR10_STREAM_LIMITS['reverb']['filter']],
+			],
+		},
+	},
+	{
+		'label': 'Gate',
+		'state': 223,
+		'fields': [
+			['Threshold', 209, 1, THR10_STREAM_LIMITS['gate']['threshold']],
+			['Release', 210, 1, THR10_STREAM_LIMITS['gate']['release']],
+		],
+	},
+]
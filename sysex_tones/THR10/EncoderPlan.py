@@ -0,0 +1,150 @@
+""" Public interface for compiling THR10 settings text into MIDI templates, re-encoded with new values by patching their value slots. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import fnmatch as _fnmatch
+import collections as _collections
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+
+class EncoderPlan( object ):
+	""" THR10 settings text compiled once into MIDI commands (self.template, bytes) and the value slots in them (self.slots, a tuple).
+
+	Each slot is a tuple of (offset into self.template, size: 1 for a byte or 2 for a MIDI int, minimum, maximum,
+	a list of lowercase value names or None, setting, value name), see convert_text_to_midi_slots().
+	self.names maps each (setting, value name) tuple, e.g. ('delay', 'time'), to the indexes of its slots.
+
+	A plan is not changed after compiling, encode() copies the template, so a plan can be shared, and re-encoded with any values.
+	"""
+
+	__slots__ = ('template', 'slots', 'names')
+
+
+	def __init__( self, template, slots ):
+		""" The template argument is the MIDI commands (a list of ints, or a buffer), slots is a list of its value slots. """
+		self.template = bytes( bytearray( template ) )
+		self.slots = tuple( slots )
+		names = _collections.OrderedDict()
+		for (index, slot) in enumerate( self.slots ):
+			names[slot[5:7]] = names.get( slot[5:7], () ) + (index,)
+		self.names = names
+
+
+	def __repr__( self ):
+		""" Describe the plan, without its data. """
+		return '<EncoderPlan %i bytes, %i slots>' % (len( self.template ), len( self.slots ))
+
+
+	@classmethod
+	def compile( cls, text ):
+		""" Compile text (settings text, a string or a list of lines) into an EncoderPlan. """
+		if isinstance( text, str ):
+			text = text.splitlines()
+		template = []
+		slots = []
+		for line in text:
+			(midi, lineslots) = _sysex_tones.THR10.convert_text_to_midi_slots( line )
+			for slot in lineslots:
+				slots.append( (slot[0] + len( template ),) + slot[1:] )
+			template += midi
+		return cls( template, slots )
+
+
+	@classmethod
+	def compile_file( cls, filename ):
+		""" Compile the settings text file filename into an EncoderPlan. """
+		with open( filename ) as infile:
+			return cls.compile( infile.readlines() )
+
+
+	@classmethod
+	def compile_directory( cls, directory, pattern='*.txt' ):
+		""" Compile every settings text file matching pattern in directory (and its subdirectories), returning an OrderedDict of filenames mapped to EncoderPlans. """
+		retval = _collections.OrderedDict()
+		for (path, directories, filenames) in sorted( _os.walk( directory ) ):
+			directories.sort()
+			for filename in sorted( _fnmatch.filter( filenames, pattern ) ):
+				filename = _os.path.join( path, filename )
+				retval[filename] = cls.compile_file( filename )
+		return retval
+
+
+	def get_names( self ):
+		""" Return a list of the (setting, value name) tuples that have slots, in the order they appear. """
+		return list( self.names )
+
+
+	def get_values( self, data=None ):
+		""" Return an OrderedDict of (setting, value name) tuples mapped to their values, in data (from encode()), or in the template. """
+		if data is None:
+			data = self.template
+		data = bytearray( data )
+		retval = _collections.OrderedDict()
+		for (name, indexes) in self.names.items():
+			(offset, size, low, high, labels) = self.slots[indexes[-1]][:5] # the last slot is the value the device ends up with
+			if size == 2:
+				value = _sysex_tones.convert_from_midi_int_ints( data[offset:offset + 2] )
+			else:
+				value = data[offset]
+			if labels:
+				value = labels[value]
+			retval[name] = value
+		return retval
+
+
+	def encode( self, values=None ):
+		""" Return the MIDI commands (bytes), with the slots of values (a dictionary of (setting, value name) tuples or slot indexes, mapped to values) patched in.
+
+		Values are limited to their slot's minimum and maximum, slots with value names take the name (in any case) or its index.
+		"""
+		if not values:
+			return self.template
+		retval = bytearray( self.template )
+		for (name, value) in values.items():
+			if isinstance( name, int ):
+				indexes = (name,)
+			else:
+				indexes = self.names[name]
+			for index in indexes:
+				(offset, size, low, high, labels) = self.slots[index][:5]
+				if labels and not isinstance( value, int ):
+					value = labels.index( value.lower() )
+				value = _sysex_tones.get_minmax( int( value ), low, high )
+				if size == 2:
+					retval[offset] = (value >> 7) & 0x7f
+					retval[offset + 1] = value & 0x7f
+				else:
+					retval[offset] = value
+		return bytes( retval )
+
+
+	def encode_dump( self, values=None, block=None ):
+		""" Return a complete settings dump (a list of ints), of block (a settings block or dump, defaulting to create_default_block()) with the encoded commands applied, see encode().
+
+		Settings names are not part of a plan, the name is kept from block.
+		"""
+		if block is None:
+			block = _sysex_tones.THR10.create_default_block()
+		elif len( block ) == _THR_CONSTANTS.THR_DUMP_SIZE:
+			block = block[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+		block = bytearray( block )
+		for sysex in _sysex_tones.extract_midi_sysex( self.encode( values ) ):
+			payload = _sysex_tones.extract_command_payload( sysex, _THR_CONSTANTS.THR_COMMAND_PREFIX )
+			if payload:
+				_sysex_tones.THR10.apply_command_to_block( block, payload )
+		return _sysex_tones.THR.convert_block_to_dump( block )
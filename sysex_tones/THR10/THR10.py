@@ -13,7 +13,10 @@
 # GNU Affero General Public License for more details.
 
 
+import time as _time
+
 import sysex_tones as _sysex_tones
+import sysex_tones.Metrics as _Metrics
 
 from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
@@ -21,81 +24,107 @@ from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
 from sysex_tones.THR import THR as _THR
 
 
+# reverse indexes of the command tables, so decoding a command takes a lookup per command prefix length, instead of a scan of the tables
+_COMMAND_INDEX = _sysex_tones.THR.build_command_index( _THR10_CONSTANTS.THR10_STREAM_COMMANDS )
+_SYSTEM_COMMAND_INDEX = _sysex_tones.THR.build_command_index( _THR_CONSTANTS.THR_STREAM_SYSTEM_COMMANDS )
+_SUBCOMMAND_INDEXES = dict( [(context, _sysex_tones.THR.build_command_index( {context: _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS[context]} )) for context in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS] )
+
+
 class THR10( _THR ):
 	""" Manage THR10 settings via MIDI SysEx. """
 
 
-	def __init__( self, infilename=None, outfilename=None ):
-		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data. """
-		_THR.__init__( self, infilename, outfilename )
+	def __init__( self, infilename=None, outfilename=None, zerocopy=False ):
+		""" The infilename and outfilename arguments should be MIDI device filenames, or contain MIDI SysEx data, zerocopy selects memoryview SysEx instead of lists of ints. """
+		_THR.__init__( self, infilename, outfilename, zerocopy )
 
 
 	def request_current_settings( self, outfilename=None ):
 		""" Return a list of text strings describing THR10 settings, setting self.outfilename if present. """
 		retval = []
-		opened = False
-		if outfilename:
-			self.open_outfile( outfilename )
-			opened = True
-		elif not self.outfile:
-			self.open_outfile()
-			opened = True
+		opened = self.acquire_outfile( outfilename )
 		if self.outfile:
-			request = _sysex_tones.convert_to_stream( _sysex_tones.THR10.CONSTANTS.THR10_SETTINGS_REQUEST )
-			self.outfile.write( request )
-		if opened:
-			self.close_outfile()
+			_THR.write_data_to_outfile( self, _THR10_CONSTANTS.THR10_SETTINGS_REQUEST_BYTES )
+		self.release_outfile( opened )
+		return retval
+
+
+	def request_current_block( self, timeout=1.0 ):
+		""" Request the current settings, returning the settings block the device dumps from self.infile, or None if no dump arrives within timeout n.n seconds. """
+		retval = None
+		self.request_current_settings()
+		deadline = _time.time() + timeout
+		remaining = timeout
+		while remaining > 0 and self.infile:
+			dump = self.extract_dump( remaining )
+			if dump:
+				retval = dump['dump']
+				break
+			remaining = deadline - _time.time()
 		return retval
 
 
 	def convert_infile_to_text( self, infilename=None ):
 		""" Convert the THR device data read from self.infilename into text settings, setting self.infilename if present. """
 		retval = []
-		opened = False
-		if infilename:
-			self.open_infile( infilename )
-			opened = True
-		elif not self.infile:
-			self.open_infile()
-			opened = True
+		opened = self.acquire_infile( infilename )
 		if self.infile:
 			data = _sysex_tones.read_from_stream( self.infile )
 			retval = _sysex_tones.THR10.convert_to_text( data )
-		if opened:
-			self.close_infile()
+		self.release_infile( opened )
 		return retval
 
 
 	def convert_infile_to_midi( self, infilename=None ):
 		""" Convert self.infilename text into MIDI data, setting self.infilename if present. """
 		retval = []
-		opened = False
-		if infilename:
-			self.open_infile( infilename )
-			opened = True
-		elif not self.infile:
-			self.open_infile()
-			opened = True
+		opened = self.acquire_infile( infilename )
 		if self.infile:
 			for line in self.infile.readlines():
+				if not isinstance( line, str ): # Python 3 reads bytes from the binary infile
+					line = line.decode( 'ascii', 'ignore' )
 				command = _sysex_tones.THR10.convert_text_to_midi( line )
 				if command:
 					retval += command
-		if opened:
-			self.close_infile()
+		self.release_infile( opened )
+		return retval
+
+
+	def convert_infile_to_midi_diff( self, block, infilename=None ):
+		""" Convert self.infilename text into MIDI data changing only the settings that differ from block (the device settings block, e.g. from request_current_block(), or the block returned last time), setting self.infilename if present.
+
+		Returns a tuple of (MIDI data, the changed settings block), see convert_text_to_midi_diff().
+		"""
+		return _sysex_tones.THR10.convert_text_to_midi_diff( self._read_text_lines( infilename ), block )
+
+
+	def convert_infile_to_dump( self, block=None, infilename=None ):
+		""" Convert self.infilename text into one settings dump, settings it doesn't set kept from block (see convert_text_to_dump()), setting self.infilename if present.
+
+		Returns a tuple of (the dump, a list of the MIDI commands that are not part of a dump, e.g. lamp and wide).
+		"""
+		return _sysex_tones.THR10.convert_text_to_dump( self._read_text_lines( infilename ), block )
+
+
+	def _read_text_lines( self, infilename=None ):
+		""" Return the lines of self.infilename text, setting self.infilename if present. """
+		retval = []
+		opened = self.acquire_infile( infilename )
+		if self.infile:
+			for line in self.infile.readlines():
+				if not isinstance( line, str ): # Python 3 reads bytes from the binary infile
+					line = line.decode( 'ascii', 'ignore' )
+				retval.append( line )
+		self.release_infile( opened )
 		return retval
 
 
 	def write_data_to_outfile( self, data ):
 		""" Write data to self.outfile. """
-		opened = False
-		if not self.outfile:
-			self.open_outfile()
-			opened = True
+		opened = self.acquire_outfile()
 		if self.outfile:
-			_THR.write_data_to_outfile( self, _sysex_tones.convert_to_stream( data ) )
-		if opened:
-			self.close_outfile()
+			_THR.write_data_to_outfile( self, data )
+		self.release_outfile( opened )
 
 
 	def write_text_to_midi( self, infilename=None ):
@@ -103,6 +132,12 @@ class THR10( _THR ):
 		self.write_data_to_outfile( self.convert_infile_to_midi( infilename ) )
 
 
+	def write_text_to_dump( self, infilename=None, block=None ):
+		""" Read from infilename or self.infile, convert to one settings dump (settings it doesn't set kept from block), write the dump, and any system commands, to self.outfile. """
+		(dump, midi) = self.convert_infile_to_dump( block, infilename )
+		self.write_data_to_outfile( dump + midi )
+
+
 	@staticmethod
 	def print_sysex_data( sysex=None, data=None ):
 		""" Print the sysex and data, sysex in hexadecimal and data converted, to config statements. """
@@ -113,82 +148,67 @@ class THR10( _THR ):
 				print( line )
 
 
+	@staticmethod
+	def _get_command_value( payload, size, minmax ):
+		""" Return the value in the last size (1 for a byte, 2 for a MIDI int) bytes of payload, limited to minmax. """
+		if size == 1:
+			value = payload[-1]
+		else:
+			value = _sysex_tones.convert_from_midi_int_ints( payload[-size:] )
+		return _sysex_tones.get_minmax( value, minmax[0], minmax[1] )
+
+
 	@staticmethod
 	def find_thr_command( data, context=None ):
 		""" Search data for known THR commands, with an option context for subcommands, and return a dictionary of search results. """
 		retval = {}
-		found = _sysex_tones.extract_command_payload( data, _THR_CONSTANTS.THR_COMMAND_PREFIX )
+		metrics = _Metrics.registry
+		if metrics:
+			started = metrics.now()
+		isbuffer = _sysex_tones.is_buffer( data )
+		prefix = _sysex_tones.ternary_operator( isbuffer, _THR_CONSTANTS.THR_COMMAND_PREFIX_BYTES, _THR_CONSTANTS.THR_COMMAND_PREFIX )
+		found = _sysex_tones.extract_command_payload( data, prefix )
+		if found and isbuffer:
+			found = list( found ) # the payload is a few bytes, a list compares against the command tables
 		if found:
-			# FIX: this reverse lookup is verbose, and comprehension+lambda obtuse
-			for control in _THR10_CONSTANTS.THR10_STREAM_COMMANDS:
-				for name in _THR10_CONSTANTS.THR10_STREAM_COMMANDS[control]:
-					command = _THR10_CONSTANTS.THR10_STREAM_COMMANDS[control][name]
-					if found[:len( command )] == command:
-						retval['control'] = control
-						retval['name'] = name
-						size = len( found ) - len( command )
-						if size == 0:
-							if name in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS:
-								retval['context'] = name
-						elif size == 1:
-							minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
-							retval['value'] = _sysex_tones.get_minmax( found[-1], minmax[0], minmax[1] )
-						elif size == 2:
-							minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
-							retval['value'] = _sysex_tones.get_minmax( _sysex_tones.convert_from_midi_int_ints( found[-size:] ), minmax[0], minmax[1] )
-						else:
-							retval = {}
-					if retval:
-						break
-				if retval:
-					break
+			command = _sysex_tones.THR.find_command_in_index( _COMMAND_INDEX, found )
+			if command:
+				(control, name, size) = command
+				retval['control'] = control
+				retval['name'] = name
+				if size == 0:
+					if name in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS:
+						retval['context'] = name
+				else:
+					minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
+					retval['value'] = THR10._get_command_value( found, size, minmax )
 		else:
-			found = _sysex_tones.extract_command_payload( data, _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX )
+			prefix = _sysex_tones.ternary_operator( isbuffer, _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX_BYTES, _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX )
+			found = _sysex_tones.extract_command_payload( data, prefix )
+			if found and isbuffer:
+				found = list( found )
 			if found:
-				# FIX: this reverse lookup is verbose, and comprehension+lambda obtuse
-				for control in _THR_CONSTANTS.THR_STREAM_SYSTEM_COMMANDS:
-					for name in _THR_CONSTANTS.THR_STREAM_SYSTEM_COMMANDS[control]:
-						command = _THR_CONSTANTS.THR_STREAM_SYSTEM_COMMANDS[control][name]
-						if found[:len( command )] == command:
-							retval['control'] = control
-							retval['name'] = name
-							size = len( found ) - len( command )
-							if size == 0:
-								pass
-							elif size == 1:
-								minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
-								retval['value'] = _sysex_tones.get_minmax( found[-1], minmax[0], minmax[1] )
-							elif size == 2:
-								minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
-								retval['value'] = _sysex_tones.get_minmax( _sysex_tones.convert_from_midi_int_ints( found[-size:] ), minmax[0], minmax[1] )
-							else:
-								retval = {}
-						if retval:
-							break
-					if retval:
-						break
-		if not retval and context:
-			if context in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS:
-				control = context
-				# FIX: this reverse lookup is verbose, and comprehensions+lambda obtuse
-				for name in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS[control]:
-					command = _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS[control][name]
-					if found[:len( command )] == command:
-						retval['control'] = control
-						retval['name'] = name
-						retval['context'] = context
-						size = len( found ) - len( command )
-						if size == 0:
-							pass
-						elif size == 1:
-							minmax = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[control][name]
-							retval['value'] = _sysex_tones.get_minmax( found[-size], minmax[0], minmax[1] )
-						elif size == 2:
-							minmax = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[control][name]
-							retval['value'] = _sysex_tones.get_minmax( _sysex_tones.convert_from_midi_int_ints( found[-size:] ), minmax[0], minmax[1] )
-						else:
-							retval = {}
-					if retval:
-						break
+				command = _sysex_tones.THR.find_command_in_index( _SYSTEM_COMMAND_INDEX, found )
+				if command:
+					(control, name, size) = command
+					retval['control'] = control
+					retval['name'] = name
+					if size:
+						minmax = _THR10_CONSTANTS.THR10_STREAM_LIMITS[control][name]
+						retval['value'] = THR10._get_command_value( found, size, minmax )
+		if not retval and context and found:
+			if context in _SUBCOMMAND_INDEXES:
+				command = _sysex_tones.THR.find_command_in_index( _SUBCOMMAND_INDEXES[context], found )
+				if command:
+					(control, name, size) = command
+					retval['control'] = control
+					retval['name'] = name
+					retval['context'] = context
+					if size:
+						minmax = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[control][name]
+						retval['value'] = THR10._get_command_value( found, size, minmax )
+		if metrics:
+			metrics.increment( _sysex_tones.ternary_operator( retval, 'commands_decoded', 'unrecognized_frames' ) )
+			metrics.observe_since( 'decode_seconds', started )
 		return retval
 
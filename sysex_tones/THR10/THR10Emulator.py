@@ -0,0 +1,291 @@
+""" Public interface for emulating a THR10 device, for use without the hardware. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import tty as _tty
+import fcntl as _fcntl
+import time as _time
+import errno as _errno
+import random as _random
+import select as _select
+import threading as _threading
+import collections as _collections
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
+
+
+def create_default_block( name='THR10 Emulator' ):
+	""" Return a settings block (a bytearray) named name, see sysex_tones.THR10.create_default_block(). """
+	return _sysex_tones.THR10.create_default_block( name )
+
+
+class THR10Emulator( object ):
+	""" Emulate a THR10 on a pseudo-terminal, or a pair of FIFOs, that BasicIO (or THR10) can open as its infilename and outfilename.
+
+	The emulator sends a heartbeat every heartbeat n.n seconds, answers settings requests with a dump of its settings block,
+	applies commands (and dumps) written to it, and sends change commands for settings changed "on the amp" (see change_settings()).
+
+	Everything it sends is delayed latency n.n seconds, plus up to jitter n.n seconds (keeping the order),
+	and each SysEx is corrupted (one byte changed) with a probability of corruption (0.0 to 1.0).
+	"""
+
+	block = None
+	system = None
+	heartbeat = 0.5
+	latency = 0.0
+	jitter = 0.0
+	corruption = 0.0
+	maxpending = 65536
+	random = None
+	framer = None
+	infd = None
+	outfd = None
+	slavefd = None
+	infilename = None
+	outfilename = None
+	fifodirectory = None
+	queue = None
+	pending = None
+	lastdue = 0.0
+	nextheartbeat = 0.0
+	thread = None
+	running = False
+	statistics = None
+
+
+	def __init__( self, block=None, heartbeat=0.5, latency=0.0, jitter=0.0, corruption=0.0, seed=None ):
+		""" The block argument is the initial settings block (or dump), defaulting to create_default_block(), seed makes jitter and corruption repeatable. """
+		if block is None:
+			block = create_default_block()
+		elif len( block ) == _THR_CONSTANTS.THR_DUMP_SIZE:
+			block = block[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+		self.block = bytearray( block )
+		self.system = {}
+		self.heartbeat = heartbeat
+		self.latency = latency
+		self.jitter = jitter
+		self.corruption = corruption
+		self.random = _random.Random( seed )
+		self.framer = _sysex_tones.SysExFramer( zerocopy=True )
+		self.queue = _collections.deque()
+		self.pending = bytearray()
+		self.statistics = _collections.OrderedDict( [
+			('received', 0),
+			('requests', 0),
+			('commands', 0),
+			('dumps', 0),
+			('unrecognized', 0),
+			('sent', 0),
+			('heartbeats', 0),
+			('corrupted', 0),
+			('dropped', 0),
+		] )
+
+
+	def open_pty( self ):
+		""" Open a pseudo-terminal, returning its filename, for use as both the infilename and outfilename of a BasicIO. """
+		(master, self.slavefd) = _os.openpty() # keep the slave open, so the master never sees a hang up between BasicIO opens
+		_tty.setraw( self.slavefd ) # no echo, and no line editing of the SysEx bytes
+		self.infilename = _os.ttyname( self.slavefd )
+		self.outfilename = self.infilename
+		self._set_fds( master, master )
+		return self.infilename
+
+
+	def open_fifos( self, directory ):
+		""" Create two FIFOs in directory, returning their filenames, for use as (infilename, outfilename) of a BasicIO. """
+		self.infilename = _os.path.join( directory, 'thr10_midi_in' )
+		self.outfilename = _os.path.join( directory, 'thr10_midi_out' )
+		for filename in [self.infilename, self.outfilename]:
+			_os.mkfifo( filename )
+		self.fifodirectory = directory
+		# open read/write, so neither open waits for the other end, and the emulator never sees an end of file
+		self._set_fds( _os.open( self.outfilename, _os.O_RDWR | _os.O_NONBLOCK ), _os.open( self.infilename, _os.O_RDWR | _os.O_NONBLOCK ) )
+		return (self.infilename, self.outfilename)
+
+
+	def close( self ):
+		""" Stop the emulator, close its files, and remove any FIFOs it created. """
+		self.stop()
+		for fd in set( [self.infd, self.outfd, self.slavefd] ):
+			if fd is not None:
+				_os.close( fd )
+		self.infd = None
+		self.outfd = None
+		self.slavefd = None
+		if self.fifodirectory:
+			for filename in [self.infilename, self.outfilename]:
+				_os.remove( filename )
+			self.fifodirectory = None
+
+
+	def get_statistics( self ):
+		""" Return a dictionary of SysEx received, and sent, by type. """
+		retval = dict( self.statistics )
+		retval['queued'] = len( self.queue )
+		return retval
+
+
+	def get_dump( self ):
+		""" Return a settings dump (a list of ints) of the current settings block. """
+		return _sysex_tones.THR.convert_block_to_dump( self.block )
+
+
+	def change_settings( self, text ):
+		""" Change settings as if done on the amp, text is a settings file line (e.g. 'Control: Gain 50'), the device sends the change commands. """
+		for sysex in _sysex_tones.extract_midi_sysex( _sysex_tones.THR10.convert_text_to_midi( text ) ):
+			self._process_sysex( _sysex_tones.convert_to_bytes( sysex ) )
+			self.send_sysex( sysex )
+
+
+	def send_sysex( self, sysex ):
+		""" Queue sysex (a list of ints, or a buffer) to be sent, after the latency and jitter. """
+		due = _time.time() + self.latency
+		if self.jitter:
+			due += self.random.uniform( 0.0, self.jitter )
+		due = max( due, self.lastdue ) # MIDI doesn't reorder SysEx
+		self.lastdue = due
+		sysex = bytearray( sysex )
+		if self.corruption and self.random.random() < self.corruption:
+			index = self.random.randrange( len( sysex ) )
+			sysex[index] ^= self.random.randrange( 1, 0x100 )
+			self.statistics['corrupted'] += 1
+		self.queue.append( (due, sysex) )
+
+
+	def run_once( self, timeout=None ):
+		""" Read and answer SysEx, and send whatever is due, waiting at most timeout n.n seconds (None waits until something is due). """
+		now = _time.time()
+		if now >= self.nextheartbeat:
+			self.send_sysex( _THR_CONSTANTS.THR10_HEARTBEAT_BYTES )
+			self.statistics['heartbeats'] += 1
+			self.nextheartbeat = now + self.heartbeat
+		wake = self.nextheartbeat
+		if self.queue:
+			wake = min( wake, self.queue[0][0] )
+		delay = max( 0.0, wake - now )
+		if timeout is not None:
+			delay = min( delay, timeout )
+		writers = []
+		if self.pending:
+			writers = [self.outfd]
+		try:
+			(readable, writable, exceptional) = _select.select( [self.infd], writers, [], delay )
+		except _select.error as error:
+			if error.args[0] != _errno.EINTR:
+				raise
+			readable = []
+		if readable:
+			self._read()
+		self._write()
+
+
+	def run( self, duration=None ):
+		""" Run the emulator for duration n.n seconds, or until stop() is called. """
+		self.running = True
+		stop = None
+		if duration is not None:
+			stop = _time.time() + duration
+		while self.running and (stop is None or _time.time() < stop):
+			timeout = 0.1 # notice stop() promptly
+			if stop is not None:
+				timeout = min( timeout, max( 0.0, stop - _time.time() ) )
+			self.run_once( timeout )
+		self.running = False
+
+
+	def start( self ):
+		""" Run the emulator in a background thread, until stop() is called. """
+		if not self.thread:
+			self.running = True
+			self.thread = _threading.Thread( target=self.run )
+			self.thread.daemon = True
+			self.thread.start()
+
+
+	def stop( self ):
+		""" Stop the emulator, waiting for its background thread (if any) to finish. """
+		self.running = False
+		if self.thread:
+			self.thread.join()
+			self.thread = None
+
+
+	def _set_fds( self, infd, outfd ):
+		""" Use infd to receive SysEx, and outfd to send it, both non-blocking. """
+		for fd in set( [infd, outfd] ):
+			_fcntl.fcntl( fd, _fcntl.F_SETFL, _fcntl.fcntl( fd, _fcntl.F_GETFL ) | _os.O_NONBLOCK )
+		self.infd = infd
+		self.outfd = outfd
+		self.nextheartbeat = 0.0
+
+
+	def _read( self ):
+		""" Read whatever has been written to the emulator, and process each SysEx. """
+		try:
+			data = _os.read( self.infd, 4096 )
+		except OSError as error:
+			if error.errno not in [_errno.EAGAIN, _errno.EWOULDBLOCK]:
+				raise
+			data = b''
+		for sysex in self.framer.feed( data ):
+			self._process_sysex( sysex )
+
+
+	def _process_sysex( self, sysex ):
+		""" Answer, or apply, sysex (a buffer) as the device would. """
+		self.statistics['received'] += 1
+		if sysex == _THR10_CONSTANTS.THR10_SETTINGS_REQUEST_BYTES:
+			self.statistics['requests'] += 1
+			self.send_sysex( self.get_dump() )
+		elif _sysex_tones.startswith( sysex, _THR_CONSTANTS.THR_COMMAND_PREFIX_BYTES ):
+			self.statistics['commands'] += 1
+			payload = _sysex_tones.extract_command_payload( sysex, _THR_CONSTANTS.THR_COMMAND_PREFIX_BYTES )
+			_sysex_tones.THR10.apply_command_to_block( self.block, bytearray( payload ) )
+		elif _sysex_tones.startswith( sysex, _THR_CONSTANTS.THR_SYSTEM_COMMAND_PREFIX_BYTES ):
+			self.statistics['commands'] += 1
+			command = _sysex_tones.THR10.THR10.find_thr_command( sysex )
+			if command:
+				self.system[command['control']] = command['name']
+		else:
+			detected = _sysex_tones.THR.THR.detect_midi_dump( sysex )
+			if detected:
+				self.statistics['dumps'] += 1
+				self.block[:] = detected['data']
+			else:
+				self.statistics['unrecognized'] += 1
+
+
+	def _write( self ):
+		""" Send the SysEx that are due, keeping whatever the other end hasn't read yet for later. """
+		now = _time.time()
+		while self.queue and self.queue[0][0] <= now:
+			(due, sysex) = self.queue.popleft()
+			if len( self.pending ) + len( sysex ) > self.maxpending: # nobody is reading, as a device would, lose it
+				self.statistics['dropped'] += 1
+			else:
+				self.pending += sysex
+				self.statistics['sent'] += 1
+		if self.pending:
+			try:
+				written = _os.write( self.outfd, self.pending )
+			except OSError as error:
+				if error.errno not in [_errno.EAGAIN, _errno.EWOULDBLOCK]:
+					raise
+				written = 0
+			del self.pending[:written]
@@ -0,0 +1,122 @@
+""" Public interface for mirroring the settings of a THR10 device, from the SysEx it sends. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import time as _time
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+from sysex_tones.THR.THRFrame import THRFrame as _THRFrame
+
+
+class THR10Mirror( object ):
+	""" Keep a copy of a THR10 device's settings block, from one dump and every command the device sends after it, so the current settings are known without requesting another dump.
+
+	Feed it every SysEx the device sends (see process_sysex()), self.block is None until the first dump arrives,
+	self.version counts the changes to self.block, so readers can tell when the settings have changed since they last looked.
+	"""
+
+	block = None
+	system = None
+	context = None
+	model = ''
+	version = 0
+	updated = 0.0
+	lastseen = 0.0
+
+
+	def __init__( self, dump=None ):
+		""" The dump argument is a settings dump (or settings block) to start from, if already known. """
+		self.system = {}
+		if dump is not None:
+			self.set_dump( dump )
+
+
+	def is_synced( self ):
+		""" Check if a dump has been seen, so self.block holds the device settings. """
+		return self.block is not None
+
+
+	def set_dump( self, dump ):
+		""" Replace the mirrored settings with dump (a settings dump, or settings block, a list of ints or a buffer). """
+		if len( dump ) == _THR_CONSTANTS.THR_DUMP_SIZE:
+			dump = dump[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+		block = bytearray( dump )
+		if block != self.block:
+			self.block = block
+			self._changed()
+
+
+	def process_sysex( self, sysex ):
+		""" Update the mirror from sysex (a list of ints, or a buffer) sent by the device, returning the decoded command (see THR10.find_thr_command()), or an empty dictionary. """
+		return self.process_frame( _THRFrame.classify( sysex ) )
+
+
+	def process_frame( self, frame ):
+		""" Update the mirror from frame (a THRFrame of SysEx sent by the device), returning the decoded command (see THR10.find_thr_command()), or an empty dictionary. """
+		retval = {}
+		if frame.kind == _THR_CONSTANTS.THR_FRAME_HEARTBEAT:
+			self.model = frame.model
+			self.lastseen = _time.time()
+		elif frame.kind == _THR_CONSTANTS.THR_FRAME_DUMP:
+			self.set_dump( frame.data )
+		elif frame.kind == _THR_CONSTANTS.THR_FRAME_SYSTEM_COMMAND:
+			retval = _sysex_tones.THR10.THR10.find_thr_command( frame.sysex )
+			if retval and self.system.get( retval['control'] ) != retval['name']:
+				self.system[retval['control']] = retval['name']
+				self._changed()
+		elif frame.kind == _THR_CONSTANTS.THR_FRAME_COMMAND:
+			payload = list( frame.data )
+			context = self.context
+			if self.block is not None: # the selected types say what subcommands mean, better than the last type command seen
+				context = _sysex_tones.THR10.get_block_context( self.block, payload[0] ) or context
+			retval = _sysex_tones.THR10.THR10.find_thr_command( frame.sysex, context )
+			if retval:
+				if 'context' in retval:
+					self.context = retval['context']
+				if self.block is not None and _sysex_tones.THR10.apply_command_to_block( self.block, payload ):
+					self._changed()
+		return retval
+
+
+	def get_block( self ):
+		""" Return a copy of the mirrored settings block (bytes), or None until a dump has been seen. """
+		retval = None
+		if self.block is not None:
+			retval = bytes( self.block )
+		return retval
+
+
+	def get_dump( self ):
+		""" Return a settings dump (a list of ints) of the mirrored settings, or None until a dump has been seen. """
+		retval = None
+		if self.block is not None:
+			retval = _sysex_tones.THR.convert_block_to_dump( self.block )
+		return retval
+
+
+	def get_text( self ):
+		""" Return a list of text strings describing the mirrored settings, empty until a dump has been seen. """
+		retval = []
+		if self.block is not None:
+			retval = _sysex_tones.THR10.convert_midi_dump_to_text( self.block )
+		return retval
+
+
+	def _changed( self ):
+		""" Count a change to the mirrored settings. """
+		self.version += 1
+		self.updated = _time.time()
@@ -0,0 +1,242 @@
+""" Public interface for THR10 tones, settings blocks whose settings are read and written as attributes. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
+
+
+# layout fields whose block layout differs from how dumps are decoded as text, (section label, setting) mapped to (offset, size)
+_FIELD_OVERRIDES = {
+	('Compressor', 'Threshold'): (145, 2), # a MIDI int, see THR10_BLOCK_MIDI_INTS, the text decodes its low byte
+}
+
+_STATE_ON = 0x00
+_STATE_OFF = 0x7f
+
+
+if bytes is str: # Python 2, where bytes index as characters, not ints
+	class _ReadOnlyBlock( bytearray ):
+		""" The settings block of a read only tone, as bytes are on Python 3. """
+
+		def __setitem__( self, index, value ):
+			""" Refuse to change the block. """
+			raise TypeError( "a read only tone's block can't be changed" )
+else:
+	_ReadOnlyBlock = bytes
+
+
+class _Field( object ):
+	""" A Tone attribute, decoded from (and encoded into) the tone's settings block when used. """
+
+	__slots__ = ('offset', 'size', 'low', 'high', 'names', 'state', 'typeoffset', 'types')
+
+
+	def __init__( self, offset, size=1, low=None, high=None, names=None, state=False, typeoffset=None, types=None ):
+		""" A text field has a size greater than 2, a field with names is an index of them, a state field is on or off, typeoffset and types restrict the field to some types. """
+		self.offset = offset
+		self.size = size
+		self.low = low
+		self.high = high
+		self.names = names
+		self.state = state
+		self.typeoffset = typeoffset
+		self.types = types
+
+
+	def __get__( self, tone, owner ):
+		""" Decode the field from tone.block, or None if the field belongs to a type that isn't selected (or a names index is bad). """
+		if tone is None:
+			return self
+		block = tone.block
+		if self.types is not None and block[self.typeoffset] not in self.types:
+			return None
+		offset = self.offset
+		if self.state:
+			retval = block[offset] == _STATE_ON
+		elif self.size > 2:
+			retval = _sysex_tones.convert_from_midi_to_string( block[offset:offset + self.size] )
+		else:
+			if self.size == 2:
+				retval = ((block[offset] & 0x7f) << 7) | (block[offset + 1] & 0x7f)
+			else:
+				retval = block[offset]
+			if self.names is not None:
+				retval = self.names[retval] if retval < len( self.names ) else None
+			elif retval < self.low:
+				retval = self.low
+			elif retval > self.high:
+				retval = self.high
+		return retval
+
+
+	def __set__( self, tone, value ):
+		""" Encode value into tone.block, names may be given by name (in any case) or index, numbers are limited to the field's minimum and maximum.
+
+		Fields of types that aren't selected share their bytes with the selected type's fields, setting one raises AttributeError, select its type first.
+		"""
+		block = tone.block
+		if self.types is not None and block[self.typeoffset] not in self.types:
+			raise AttributeError( 'the setting is not used by the selected type, select its type first' )
+		offset = self.offset
+		if self.state:
+			block[offset] = _sysex_tones.ternary_operator( value, _STATE_ON, _STATE_OFF )
+		elif self.size > 2:
+			name = bytearray( value.encode( 'ascii', 'ignore' ) )[:self.size]
+			name = bytearray( [byte for byte in name if byte >= 0x20 and byte <= 0x7e] )
+			block[offset:offset + self.size] = name + bytearray( self.size - len( name ) )
+		else:
+			if self.names is not None:
+				if not isinstance( value, int ):
+					value = [name.lower() for name in self.names].index( value.lower() )
+				elif not 0 <= value < len( self.names ):
+					raise IndexError( 'index %i out of range 0-%i' % (value, len( self.names ) - 1) )
+			else:
+				value = _sysex_tones.get_minmax( int( value ), self.low, self.high )
+			if self.size == 2:
+				block[offset] = (value >> 7) & 0x7f
+				block[offset + 1] = value & 0x7f
+			else:
+				block[offset] = value
+		tone.hashed = None
+
+
+class Tone( object ):
+	""" A THR10 tone, a 256 byte settings block (self.block, a bytearray, or bytes for a read only tone), with its settings as attributes.
+
+	Attributes are decoded from the block when read, and encoded into it when set, e.g. tone.amp ('Lead'), tone.gain (60),
+	tone.reverb_on (True), tone.reverb ('Spring'), tone.spring_reverb (40).  Settings of effect types that are not selected read as None, and can't be set.
+	See Tone.FIELDS for every attribute name, tones are equal (and hash equally) when their blocks are.
+	"""
+
+	__slots__ = ('block', 'hashed')
+
+	FIELDS = ()
+
+
+	def __init__( self, data=None, writable=True ):
+		""" The data argument is a settings block, dump, or ydl file contents (defaulting to create_default_block()), writable selects a bytearray block instead of bytes. """
+		if data is None:
+			data = _sysex_tones.THR10.create_default_block()
+		block = _sysex_tones.THR.get_settings_block( data )
+		if block is None:
+			raise ValueError( 'not a THR settings block, dump, or ydl file, %i bytes' % (len( data )) )
+		if writable:
+			self.block = bytearray( block )
+		else:
+			self.block = _ReadOnlyBlock( bytearray( block ) )
+		self.hashed = None
+
+
+	@classmethod
+	def from_text( cls, text, data=None ):
+		""" Return a Tone of text (settings text, a string or a list of lines), applied to data (see __init__()). """
+		retval = cls( data )
+		(name, midi) = _sysex_tones.THR10.apply_text_to_block( retval.block, text )
+		if name is not None:
+			retval.name = name
+		return retval
+
+
+	def __repr__( self ):
+		""" Describe the tone by name, and amp. """
+		return '<Tone %r, %s>' % (self.name, self.amp)
+
+
+	def __eq__( self, other ):
+		""" Tones are equal when their settings blocks are. """
+		return isinstance( other, Tone ) and self.block == other.block
+
+
+	def __ne__( self, other ):
+		""" Tones are equal when their settings blocks are. """
+		return not self.__eq__( other )
+
+
+	def __hash__( self ):
+		""" Hash the settings block, cached until the block is changed through an attribute. """
+		if self.hashed is None:
+			self.hashed = hash( bytes( self.block ) )
+		return self.hashed
+
+
+	def copy( self, writable=True ):
+		""" Return a copy of the tone. """
+		return Tone( self.block, writable )
+
+
+	def get_dump( self ):
+		""" Return a settings dump (a list of ints) of the tone. """
+		return _sysex_tones.THR.convert_block_to_dump( self.block )
+
+
+	def get_text( self ):
+		""" Return a list of text strings describing the tone. """
+		return _sysex_tones.THR10.convert_midi_dump_to_text( self.block )
+
+
+	def get_values( self ):
+		""" Return a dictionary of the attributes of the selected types, and their values. """
+		retval = {}
+		for name in self.FIELDS:
+			value = getattr( self, name )
+			if value is not None:
+				retval[name] = value
+		return retval
+
+
+def _build_fields( layout=_THR10_CONSTANTS.THR10_BLOCK_LAYOUT ):
+	""" Return a list of (attribute name, _Field) tuples for every section and field of layout.
+
+	Sections that can be switched off prefix their settings with the section label (e.g. delay_time), and have a state (e.g. delay_on),
+	settings of one type are prefixed with the type name (e.g. rack_threshold), settings shared by several types with the section label (e.g. reverb_time).
+	"""
+	retval = []
+	for section in layout:
+		label = section['label']
+		key = label.lower().replace( ' ', '_' )
+		if 'size' in section:
+			retval.append( (key, _Field( section['offset'], section['size'] )) )
+		elif 'names' in section:
+			retval.append( (key, _Field( section['offset'], names=tuple( section['names'] ) )) )
+		if 'state' in section:
+			retval.append( (key + '_on', _Field( section['state'], state=True )) )
+		groups = [(None, section.get( 'fields', [] ))]
+		if 'types' in section:
+			groups = []
+			for (index, fields) in sorted( section['types'].items() ):
+				shared = tuple( sorted( [other for (other, otherfields) in section['types'].items() if otherfields is fields] ) )
+				if index == shared[0]: # once for each list of fields
+					groups.append( (shared, fields) )
+		for (types, fields) in groups:
+			prefix = ''
+			if types and len( types ) == 1:
+				prefix = section['names'][types[0]].lower() + '_'
+			elif types or 'state' in section:
+				prefix = key + '_'
+			for field in fields:
+				(offset, size) = _FIELD_OVERRIDES.get( (label, field[0]), (field[1], field[2]) )
+				name = prefix + field[0].lower().replace( ' ', '_' )
+				if field[3] is None:
+					retval.append( (name, _Field( offset, size, names=tuple( field[4] ), typeoffset=section.get( 'offset' ), types=types )) )
+				else:
+					retval.append( (name, _Field( offset, size, field[3][0], field[3][1], typeoffset=section.get( 'offset' ), types=types )) )
+	return retval
+
+
+_FIELDS = _build_fields()
+for (_name, _field) in _FIELDS:
+	setattr( Tone, _name, _field )
+Tone.FIELDS = tuple( [_name for (_name, _field) in _FIELDS] )
@@ -0,0 +1,327 @@
+""" Public interface for archives of many THR10 settings blocks, stored contiguously in one memory mapped file. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import mmap as _mmap
+import struct as _struct
+
+import sysex_tones as _sysex_tones
+import sysex_tones.convert_midi_ints as _convert_midi_ints
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+from sysex_tones.THR.THRFrame import THRFrame as _THRFrame
+from sysex_tones.THR10.Tone import Tone as _Tone
+
+
+# the archive file begins with a header, then settings blocks, one after another
+#
+#	magic, version, header size, block size, block count
+ARCHIVE_MAGIC = b'THRTONES'
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER_FORMAT = '<8sIIII'
+ARCHIVE_HEADER_SIZE = 64
+ARCHIVE_GROWTH = 1024 # blocks, at least, added to the file each time it grows
+
+
+def get_dtype():
+	""" Return a NumPy structured dtype of a settings block, with a field for each Tone attribute (see Tone.FIELDS), at its block offset.
+
+	Fields overlap where the block is shared between effect types, MIDI ints are two bytes (use ToneArchive.get_column() to decode them),
+	names are indexes of the names (e.g. THR10_AMP_NAMES), states are 0 for on, the name is bytes.
+	"""
+	import numpy
+	names = []
+	formats = []
+	offsets = []
+	for name in _Tone.FIELDS:
+		field = getattr( _Tone, name )
+		names.append( name )
+		offsets.append( field.offset )
+		if field.size > 2:
+			formats.append( 'S%i' % (field.size) )
+		elif field.size == 2:
+			formats.append( ('u1', (2,)) )
+		else:
+			formats.append( 'u1' )
+	return numpy.dtype( {
+		'names': names,
+		'formats': formats,
+		'offsets': offsets,
+		'itemsize': _THR_CONSTANTS.THR_SYSEX_SIZE,
+	} )
+
+
+def decode_column( array, name, rows=None ):
+	""" Return a NumPy array of the values of the Tone attribute name (e.g. 'gain', 'delay_time', 'amp') in array (a get_dtype() array), or in rows (an array of indexes) of it, decoded as Tone attributes are.
+
+	Numbers are limited to their minimum and maximum, MIDI ints combined, states are booleans (True is on), names are indexes (not limited).
+	Settings of effect types that aren't selected are decoded anyway, see Tone.
+	"""
+	import numpy
+	field = getattr( _Tone, name )
+	retval = array[name]
+	if rows is not None:
+		retval = retval[rows] # only the setting is copied, not the whole blocks
+	if field.state:
+		retval = retval == 0
+	elif field.size == 2:
+		retval = _convert_midi_ints.convert_from_midi_int_ints_array( retval.reshape( -1 ) )
+	if field.low is not None and not field.state:
+		retval = numpy.clip( retval, field.low, field.high )
+	return retval
+
+
+class ToneArchive( object ):
+	""" Many THR10 settings blocks, stored one after another in a memory mapped file, appended to, and read by index or as a NumPy array.
+
+	An archive is opened by one writer at a time, readers see the blocks appended up to when they opened it (or called refresh()).
+	"""
+
+	filename = None
+	writable = False
+	file = None
+	map = None
+	count = 0
+	capacity = 0
+	indexes = None
+
+
+	def __init__( self, filename, writable=True ):
+		""" Open the archive filename, creating it if writable and it doesn't exist, read only unless writable. """
+		self.filename = filename
+		self.writable = writable
+		self.indexes = {}
+		if writable:
+			if not _os.path.exists( filename ):
+				with open( filename, 'wb' ) as outfile:
+					outfile.write( self._pack_header( 0 ) )
+			self.file = open( filename, 'r+b' )
+		else:
+			self.file = open( filename, 'rb' )
+		self.refresh()
+
+
+	def __enter__( self ):
+		""" Use the archive in a with statement, closing it after. """
+		return self
+
+
+	def __exit__( self, exctype, exception, traceback ):
+		""" Close the archive, at the end of a with statement. """
+		self.close()
+
+
+	def __len__( self ):
+		""" Return the number of blocks in the archive. """
+		return self.count
+
+
+	def __getitem__( self, index ):
+		""" Return the block at index (negative indexes count from the end) as a read only Tone. """
+		return _Tone( self.get_block( index ), False )
+
+
+	def __iter__( self ):
+		""" Iterate over the blocks, as read only Tones. """
+		for index in range( self.count ):
+			yield self[index]
+
+
+	def refresh( self ):
+		""" Map the archive file again, for blocks appended since it was opened. """
+		self.file.seek( 0 )
+		header = self.file.read( ARCHIVE_HEADER_SIZE )
+		if len( header ) < ARCHIVE_HEADER_SIZE:
+			raise ValueError( '%s is not a THR tone archive' % (self.filename) )
+		(magic, version, headersize, blocksize, count) = _struct.unpack( ARCHIVE_HEADER_FORMAT, header[:_struct.calcsize( ARCHIVE_HEADER_FORMAT )] )
+		if magic != ARCHIVE_MAGIC or headersize != ARCHIVE_HEADER_SIZE or blocksize != _THR_CONSTANTS.THR_SYSEX_SIZE:
+			raise ValueError( '%s is not a THR tone archive' % (self.filename) )
+		if version > ARCHIVE_VERSION:
+			raise ValueError( '%s is a newer THR tone archive (version %i)' % (self.filename, version) )
+		self.count = count
+		self._map()
+
+
+	def close( self ):
+		""" Flush and close the archive. """
+		if self.map is not None:
+			self.flush()
+			self._unmap()
+		if self.file:
+			self.file.close()
+			self.file = None
+
+
+	def flush( self ):
+		""" Write appended blocks to the file. """
+		if self.writable and self.map is not None:
+			self.map.flush()
+
+
+	def get_block( self, index ):
+		""" Return the block at index (negative indexes count from the end), as bytes. """
+		if index < 0:
+			index += self.count
+		if not 0 <= index < self.count:
+			raise IndexError( 'archive index out of range' )
+		offset = ARCHIVE_HEADER_SIZE + index * _THR_CONSTANTS.THR_SYSEX_SIZE
+		return self.map[offset:offset + _THR_CONSTANTS.THR_SYSEX_SIZE]
+
+
+	def append( self, data ):
+		""" Append data (a Tone, or a settings block, dump, or ydl file contents), returning its index. """
+		return self.extend( [data] )[0]
+
+
+	def extend( self, datas ):
+		""" Append every data in datas (see append()), growing the file at most once, returning a list of their indexes. """
+		blocks = []
+		for data in datas:
+			if isinstance( data, _Tone ):
+				block = data.block
+			else:
+				block = _sysex_tones.THR.get_settings_block( data )
+				if block is None:
+					raise ValueError( 'not a THR settings block, dump, or ydl file, %i bytes' % (len( data )) )
+			blocks.append( bytes( bytearray( block ) ) )
+		if not self.writable:
+			raise IOError( '%s is open read only' % (self.filename) )
+		if self.count + len( blocks ) > self.capacity:
+			self._grow( self.count + len( blocks ) )
+		retval = list( range( self.count, self.count + len( blocks ) ) )
+		offset = ARCHIVE_HEADER_SIZE + self.count * _THR_CONSTANTS.THR_SYSEX_SIZE
+		self.map[offset:offset + len( blocks ) * _THR_CONSTANTS.THR_SYSEX_SIZE] = b''.join( blocks )
+		self.count += len( blocks )
+		self.map[:ARCHIVE_HEADER_SIZE] = self._pack_header( self.count ) # the count last, so readers never see an unwritten block
+		return retval
+
+
+	def import_files( self, filenames ):
+		""" Append the settings in filenames (settings dumps, ydl files, or saved settings blocks), returning a list of the filenames that aren't any of them. """
+		retval = []
+		datas = []
+		for filename in filenames:
+			with open( filename, 'rb' ) as infile:
+				data = infile.read( _THR_CONSTANTS.THR_DUMP_SIZE + 1 ) # one byte more than any known size, to spot bigger files
+			if len( data ) == _THR_CONSTANTS.THR_SYSEX_SIZE: # a saved settings block, there's nothing to check
+				datas.append( data )
+			elif _THRFrame.classify( data ).kind in [_THR_CONSTANTS.THR_FRAME_DUMP, _THR_CONSTANTS.THR_FRAME_YDL]:
+				datas.append( data )
+			else:
+				retval.append( filename )
+		self.extend( datas )
+		return retval
+
+
+	def get_array( self ):
+		""" Return a NumPy array (a view of the memory mapped file, read only, see get_dtype()) of every block, for scans and queries at memory speed.
+
+		Requires NumPy, the array is only valid until the archive grows or closes, get it again after appending.
+		"""
+		import numpy
+		return numpy.frombuffer( self.map, get_dtype(), self.count, ARCHIVE_HEADER_SIZE )
+
+
+	def get_blocks( self ):
+		""" Return a NumPy array (count x 256 bytes, a read only view of the memory mapped file) of every block, see get_array(). """
+		import numpy
+		return numpy.frombuffer( self.map, numpy.uint8, self.count * _THR_CONSTANTS.THR_SYSEX_SIZE, ARCHIVE_HEADER_SIZE ).reshape( self.count, _THR_CONSTANTS.THR_SYSEX_SIZE )
+
+
+	def get_column( self, name, array=None ):
+		""" Return a NumPy array of the values of the Tone attribute name (e.g. 'gain', 'delay_time', 'amp') of every block, see decode_column().
+
+		The array argument is a get_array() array to reuse.
+		"""
+		if array is None:
+			array = self.get_array()
+		return decode_column( array, name )
+
+
+	def find( self, query=None, **predicates ):
+		""" Return a NumPy array of the indexes of the blocks matching query (a ToneQuery), or predicates (see ToneQuery), using any saved indexes (see build_index()).
+
+		e.g. archive.find( amp='Lead', gain=(61, None), reverb='Spring', reverb_on=True ), then archive[index] for each Tone.
+		"""
+		from sysex_tones.THR10.ToneQuery import ToneQuery
+		if query is None:
+			query = ToneQuery( **predicates )
+		indexes = {}
+		for name in query.get_names():
+			index = self.get_index( name )
+			if index is not None:
+				indexes[name] = index
+		return query.evaluate( self, indexes )
+
+
+	def get_index_filename( self, name ):
+		""" Return the file name of the saved index of Tone attribute name. """
+		return '%s.%s.index' % (self.filename, name)
+
+
+	def build_index( self, name ):
+		""" Index the blocks by Tone attribute name (a one byte setting, e.g. 'amp' or 'cab'), saving the index if writable, so find() uses it, returning the ToneIndex. """
+		from sysex_tones.THR10.ToneQuery import ToneIndex
+		retval = ToneIndex.build( self, name )
+		if self.writable:
+			retval.save( self.get_index_filename( name ) )
+		self.indexes[name] = retval
+		return retval
+
+
+	def get_index( self, name ):
+		""" Return the ToneIndex of Tone attribute name, loaded from its saved index, and rebuilt if blocks were appended since, or None if it was never built. """
+		from sysex_tones.THR10.ToneQuery import ToneIndex
+		retval = self.indexes.get( name )
+		if retval is None and _os.path.exists( self.get_index_filename( name ) ):
+			retval = ToneIndex.load( self.get_index_filename( name ) )
+			self.indexes[name] = retval
+		if retval is not None and retval.count != self.count:
+			retval = self.build_index( name )
+		return retval
+
+
+	def _pack_header( self, count ):
+		""" Return the archive header, for count blocks. """
+		header = _struct.pack( ARCHIVE_HEADER_FORMAT, ARCHIVE_MAGIC, ARCHIVE_VERSION, ARCHIVE_HEADER_SIZE, _THR_CONSTANTS.THR_SYSEX_SIZE, count )
+		return header + b'\0' * (ARCHIVE_HEADER_SIZE - len( header ))
+
+
+	def _grow( self, count ):
+		""" Grow the file to hold at least count blocks, doubling it, so appending one at a time stays cheap. """
+		capacity = max( count, self.capacity * 2, ARCHIVE_GROWTH )
+		self._unmap()
+		self.file.truncate( ARCHIVE_HEADER_SIZE + capacity * _THR_CONSTANTS.THR_SYSEX_SIZE )
+		self._map()
+
+
+	def _map( self ):
+		""" Map the archive file into memory. """
+		self._unmap()
+		size = _os.fstat( self.file.fileno() ).st_size
+		self.capacity = (size - ARCHIVE_HEADER_SIZE) // _THR_CONSTANTS.THR_SYSEX_SIZE
+		access = _sysex_tones.ternary_operator( self.writable, _mmap.ACCESS_WRITE, _mmap.ACCESS_READ )
+		self.map = _mmap.mmap( self.file.fileno(), size, access=access )
+
+
+	def _unmap( self ):
+		""" Unmap the archive file, NumPy arrays of it keep their mapping until they are freed. """
+		if self.map is not None:
+			try:
+				self.map.close()
+			except BufferError: # exported to a NumPy array, closed when the array is freed
+				pass
+			self.map = None
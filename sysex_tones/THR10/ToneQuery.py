@@ -0,0 +1,289 @@
+""" Public interface for querying THR10 tone archives by their settings, and for indexing archives by a setting. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+
+from sysex_tones.THR10.Tone import Tone as _Tone
+from sysex_tones.THR10.ToneArchive import decode_column as _decode_column
+
+
+# predicate kinds
+_EQUAL = 'equal'
+_IN = 'in'
+_RANGE = 'range'
+_KIND_ORDER = [_EQUAL, _IN, _RANGE] # the order predicates are checked in, the most selective first
+
+# the names of the effect type attributes, by block offset, for settings of some types only
+_TYPE_FIELDS = dict( [(getattr( _Tone, name ).offset, name) for name in _Tone.FIELDS if getattr( _Tone, name ).names is not None and getattr( _Tone, name ).types is None] )
+
+_STATE_NAMES = {'on': True, 'true': True, 'yes': True, 'off': False, 'false': False, 'no': False}
+
+
+def _encode_value( name, field, value ):
+	""" Return value (as Tone attribute name would read it) as a column value: a names index, a boolean state, a number, or name bytes. """
+	if field.state:
+		if not isinstance( value, bool ):
+			value = _STATE_NAMES[str( value ).lower()]
+	elif field.size > 2:
+		value = bytearray( value.encode( 'ascii', 'ignore' ) )[:field.size]
+	elif field.names is not None:
+		if not isinstance( value, int ):
+			value = [other.lower() for other in field.names].index( value.lower() )
+		elif not 0 <= value < len( field.names ):
+			raise IndexError( '%s index %i out of range 0-%i' % (name, value, len( field.names ) - 1) )
+	else:
+		value = int( value )
+	return value
+
+
+def _match_name( block, offset, size, value ):
+	""" Check the name bytes of block at offset are value, up to the first '\0' (the stored bytes are compared, not the decoded text). """
+	return block[offset:offset + len( value )] == value and (len( value ) == size or block[offset + len( value )] == 0)
+
+
+def _parse_value( value ):
+	""" Return value (a string) as an int if it is a number, None if empty, or the string. """
+	retval = value.strip()
+	if not retval:
+		retval = None
+	else:
+		try:
+			retval = int( retval )
+		except ValueError:
+			pass
+	return retval
+
+
+class ToneQuery( object ):
+	""" Predicates on the settings of THR10 tones, e.g. ToneQuery( amp='Lead', gain=(61, None), reverb='Spring', reverb_on=True ).
+
+	Each predicate is a Tone attribute name (see Tone.FIELDS) given a value to equal: a name (in any case) or index for names settings,
+	a boolean (or 'on' and 'off') for states, a number for numbers, or text for the settings name.  A list of values matches any of them,
+	a (minimum, maximum) tuple matches numbers in that range, inclusive, either may be None for no limit.
+	Settings of effect types that aren't selected never match, as they read None from a Tone.
+
+	evaluate() checks every block of a tone archive at once, using NumPy, match() checks one Tone, without NumPy.
+	"""
+
+	__slots__ = ('predicates',)
+
+
+	def __init__( self, **predicates ):
+		""" The predicates arguments are Tone attribute names and values, see the class description. """
+		self.predicates = []
+		for (name, value) in sorted( predicates.items() ):
+			field = getattr( _Tone, name, None )
+			if name not in _Tone.FIELDS:
+				raise AttributeError( "Tone has no attribute '%s'" % (name) )
+			if isinstance( value, tuple ):
+				if field.low is None or len( value ) != 2:
+					raise ValueError( '%s is not a number, only numbers have ranges' % (name) )
+				predicate = (name, _RANGE, tuple( [None if limit is None else int( limit ) for limit in value] ))
+			elif isinstance( value, list ):
+				predicate = (name, _IN, [_encode_value( name, field, other ) for other in value])
+			else:
+				predicate = (name, _EQUAL, _encode_value( name, field, value ))
+			self.predicates.append( predicate )
+
+
+	def __repr__( self ):
+		""" Describe the query, by its predicates. """
+		return '<ToneQuery %s>' % (', '.join( ['%s %s %r' % predicate for predicate in self.predicates] ))
+
+
+	@classmethod
+	def parse( cls, text ):
+		""" Return a ToneQuery of text (a string, or a list of strings) of space separated name=value predicates, e.g. 'amp=lead gain=61: reverb=spring reverb_on=on'.
+
+		Values separated by commas (e.g. cab=1,3) are a list, minimum:maximum values (e.g. 10:20, 61:, or :40) are a range, numbers are numbers.
+		"""
+		if isinstance( text, str ):
+			text = text.split()
+		predicates = {}
+		for argument in text:
+			(name, value) = argument.split( '=', 1 )
+			field = getattr( _Tone, name, None )
+			if name == 'name': # settings names are text, even when they look like numbers
+				pass
+			elif ':' in value and field is not None and field.low is not None: # names like 1:8 aren't ranges
+				value = tuple( [_parse_value( limit ) for limit in value.split( ':', 1 )] )
+			elif ',' in value:
+				value = [_parse_value( other ) for other in value.split( ',' )]
+			else:
+				value = _parse_value( value )
+			predicates[name] = value
+		return cls( **predicates )
+
+
+	def get_names( self ):
+		""" Return a list of the Tone attribute names with predicates. """
+		return [predicate[0] for predicate in self.predicates]
+
+
+	def match( self, tone ):
+		""" Check if tone (a Tone) matches every predicate. """
+		for (name, kind, value) in self.predicates:
+			field = getattr( _Tone, name )
+			if field.size > 2:
+				values = value if kind == _IN else [value]
+				if not [other for other in values if _match_name( tone.block, field.offset, field.size, other )]:
+					return False
+				continue
+			found = getattr( tone, name )
+			if found is None:
+				return False
+			if field.names is not None: # compare indexes
+				found = [other.lower() for other in field.names].index( found.lower() )
+			if kind == _EQUAL:
+				if found != value:
+					return False
+			elif kind == _IN:
+				if found not in value:
+					return False
+			elif (value[0] is not None and found < value[0]) or (value[1] is not None and found > value[1]):
+				return False
+		return True
+
+
+	def evaluate( self, archive, indexes=None ):
+		""" Return a NumPy array of the indexes (in order) of the blocks of archive (a ToneArchive) matching every predicate.
+
+		The indexes argument is a dictionary of Tone attribute names mapped to ToneIndexes of archive, to use instead of scanning for their predicates.
+		Each predicate only reads its setting of the blocks every predicate before it matched, so the most selective predicates make the rest cheap.
+		"""
+		import numpy
+		array = archive.get_array()
+		retval = None
+		rest = []
+		for predicate in self.predicates:
+			index = (indexes or {}).get( predicate[0] )
+			if index is not None and predicate[1] != _RANGE and index.count == len( array ):
+				found = index.lookup( predicate[2] if predicate[1] == _IN else [predicate[2]] )
+				retval = found if retval is None else numpy.intersect1d( retval, found, assume_unique=True )
+			else:
+				rest.append( predicate )
+		rest.sort( key=lambda predicate: (getattr( _Tone, predicate[0] ).size > 2, _KIND_ORDER.index( predicate[1] )) ) # names last, they're the slowest to compare
+		for predicate in rest:
+			if retval is not None and not len( retval ):
+				break
+			mask = self._evaluate_predicate( array, predicate, retval )
+			retval = numpy.flatnonzero( mask ) if retval is None else retval[mask]
+		if retval is None:
+			retval = numpy.arange( len( array ) )
+		return retval
+
+
+	@staticmethod
+	def _evaluate_predicate( array, predicate, rows=None ):
+		""" Return a NumPy array of booleans, which records of array (a get_dtype() array), or which rows (an array of indexes) of them, match predicate. """
+		import numpy
+		(name, kind, value) = predicate
+		field = getattr( _Tone, name )
+		if field.size > 2:
+			column = array[name] if rows is None else array[name][rows]
+			column = numpy.frombuffer( column.tobytes(), numpy.uint8 ).reshape( len( column ), field.size )
+			retval = numpy.zeros( len( column ), dtype=bool )
+			for other in (value if kind == _IN else [value]):
+				found = numpy.all( column[:, :len( other )] == numpy.frombuffer( bytes( other ), numpy.uint8 ), axis=1 )
+				if len( other ) < field.size:
+					found &= column[:, len( other )] == 0
+				retval |= found
+			return retval
+		column = _decode_column( array, name, rows )
+		if kind == _EQUAL:
+			retval = column == value
+		elif kind == _IN:
+			retval = numpy.isin( column, value )
+		else:
+			retval = numpy.ones( len( column ), dtype=bool )
+			if value[0] is not None:
+				retval &= column >= value[0]
+			if value[1] is not None:
+				retval &= column <= value[1]
+		if field.types is not None:
+			types = array[_TYPE_FIELDS[field.typeoffset]]
+			retval &= numpy.isin( types if rows is None else types[rows], field.types )
+		return retval
+
+
+class ToneIndex( object ):
+	""" The blocks of a tone archive grouped by the value of one setting (a one byte Tone attribute, e.g. 'amp' or 'reverb_on'), found without scanning.
+
+	self.order is a NumPy array of block indexes, sorted by their setting's byte, self.offsets is where each byte value (0-255) starts in it,
+	self.count is the number of blocks indexed, archives only grow, so an index of fewer blocks than its archive has is out of date.
+	"""
+
+	__slots__ = ('name', 'count', 'order', 'offsets')
+
+
+	def __init__( self, name, count, order, offsets ):
+		""" See the class description for the arguments. """
+		self.name = name
+		self.count = count
+		self.order = order
+		self.offsets = offsets
+
+
+	def __repr__( self ):
+		""" Describe the index, without its data. """
+		return '<ToneIndex %s, %i blocks>' % (self.name, self.count)
+
+
+	@classmethod
+	def build( cls, archive, name ):
+		""" Index every block of archive (a ToneArchive) by Tone attribute name. """
+		import numpy
+		field = getattr( _Tone, name, None )
+		if name not in _Tone.FIELDS or field.size != 1 or field.types is not None:
+			raise ValueError( '%s is not a one byte setting of every tone, it can not be indexed' % (name) )
+		values = archive.get_array()[name]
+		order = numpy.argsort( values, kind='stable' ).astype( numpy.uint32 )
+		offsets = numpy.zeros( 257, dtype=numpy.uint32 )
+		numpy.cumsum( numpy.bincount( values, minlength=256 ), out=offsets[1:] )
+		return cls( name, len( values ), order, offsets )
+
+
+	@classmethod
+	def load( cls, filename ):
+		""" Return the ToneIndex saved in filename (see save()). """
+		import numpy
+		with numpy.load( filename, allow_pickle=False ) as arrays:
+			return cls( str( arrays['name'] ), int( arrays['count'] ), arrays['order'], arrays['offsets'] )
+
+
+	def save( self, filename ):
+		""" Save the index to filename, replacing it all at once. """
+		import numpy
+		temporaryfilename = filename + '.new'
+		with open( temporaryfilename, 'wb' ) as outfile:
+			numpy.savez( outfile, name=numpy.array( self.name ), count=numpy.array( self.count ), order=self.order, offsets=self.offsets )
+		_os.rename( temporaryfilename, filename )
+
+
+	def lookup( self, values ):
+		""" Return a sorted NumPy array of the indexes of blocks whose setting is any of values (column values, see ToneQuery, names as indexes, states as booleans). """
+		import numpy
+		field = getattr( _Tone, self.name )
+		raw = set()
+		for value in values:
+			if field.state:
+				raw.update( [0] if value else range( 1, 256 ) )
+			else:
+				raw.add( value )
+		found = [self.order[self.offsets[value]:self.offsets[value + 1]] for value in sorted( raw ) if self.offsets[value] < self.offsets[value + 1]]
+		if not found:
+			return numpy.zeros( 0, dtype=numpy.intp )
+		return numpy.sort( numpy.concatenate( found ) ).astype( numpy.intp )
+
@@ -0,0 +1,265 @@
+""" Public interface for storing THR10 settings once each, however often they are saved, keyed by a hash of their settings block. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os as _os
+import hashlib as _hashlib
+
+import sysex_tones as _sysex_tones
+
+from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
+
+from sysex_tones.THR10.Tone import Tone as _Tone
+
+
+STORE_ALIASES_FILENAME = 'aliases.txt' # key, count, and name of each alias, tab separated
+STORE_LOG_FILENAME = 'aliases.log' # key, count change, and name of each alias added or released since the aliases file was written, tab separated
+STORE_DUMP_EXTENSION = '.syx'
+STORE_IGNORE_NAMES = '# names ignored'
+STORE_KEEP_NAMES = '# names kept'
+STORE_LOG_SEQUENCE = '# log ' # then the sequence number of a log file, or in the aliases file, of the last log compacted into it
+
+
+def get_key( data, ignorename=False ):
+	""" Return the key (a hex string) of data (a Tone, or a settings block, dump, or ydl file contents), a hash of its normalized settings block.
+
+	Normalizing clears the bytes after the end of the name, which devices leave as they were, or the whole name if ignorename,
+	so settings that only differ by name have the same key.
+	"""
+	if isinstance( data, _Tone ):
+		block = data.block
+	else:
+		block = _sysex_tones.THR.get_settings_block( data )
+		if block is None:
+			raise ValueError( 'not a THR settings block, dump, or ydl file, %i bytes' % (len( data )) )
+	block = bytearray( block )
+	namesize = _THR_CONSTANTS.THR_SETTINGS_NAME_SIZE
+	end = 0
+	if not ignorename:
+		name = list( block[:namesize] )
+		end = name.index( 0 ) if 0 in name else namesize
+	block[end:namesize] = bytearray( namesize - end )
+	return _hashlib.sha1( bytes( block ) ).hexdigest()
+
+
+class ToneStore( object ):
+	""" A directory of THR10 settings dumps, one file for each key (see get_key()), named after it, with the names each was saved with.
+
+	self.aliases maps each key to a dictionary of names, mapped to the number of times the settings were added with that name (their reference count),
+	checking for a key is a dictionary lookup, so capture loops can skip settings already stored, see is_stored().
+	Dump files are written when their settings are first added, each alias added or released is appended to the log file (written out by flush()),
+	and close() compacts the log into the aliases file, so storing settings costs a line, however many are stored.
+	Each log is numbered (self.logsequence), and the aliases file records the last one it includes, so a log isn't counted twice
+	if the program is killed after the aliases file was written, but before the log was removed.
+	"""
+
+	directory = None
+	ignorename = False
+	aliases = None
+	logfile = None
+	logsequence = 1
+	changed = False
+
+
+	def __init__( self, directory, ignorename=False ):
+		""" Open the store in directory, creating it if it doesn't exist, ignorename keys settings without their names (a store is always opened the same way). """
+		self.directory = directory
+		self.ignorename = ignorename
+		self.aliases = {}
+		if not _os.path.isdir( directory ):
+			_os.makedirs( directory )
+		included = 0
+		aliasesfilename = _os.path.join( directory, STORE_ALIASES_FILENAME )
+		if _os.path.exists( aliasesfilename ):
+			included = self._load( aliasesfilename, -1 )
+		self.logsequence = included + 1
+		logfilename = _os.path.join( directory, STORE_LOG_FILENAME )
+		if _os.path.exists( logfilename ): # left by a program that was killed
+			sequence = self._load( logfilename, included )
+			if sequence > included:
+				self.logsequence = sequence
+				self.changed = True # still to compact
+			else: # compacted, but not removed
+				_os.remove( logfilename )
+
+
+	def __enter__( self ):
+		""" Use the store in a with statement, closing it after. """
+		return self
+
+
+	def __exit__( self, exctype, exception, traceback ):
+		""" Close the store, at the end of a with statement. """
+		self.close()
+
+
+	def __len__( self ):
+		""" Return the number of different settings stored. """
+		return len( self.aliases )
+
+
+	def __contains__( self, data ):
+		""" Check if the settings of data are stored, see is_stored(). """
+		return self.is_stored( data )
+
+
+	def get_header( self ):
+		""" Return the first line of the aliases and log files (without its newline), saying whether names are ignored. """
+		return _sysex_tones.ternary_operator( self.ignorename, STORE_IGNORE_NAMES, STORE_KEEP_NAMES )
+
+
+	def get_key( self, data ):
+		""" Return the key of data (a Tone, or a settings block, dump, or ydl file contents) in this store, see get_key(). """
+		return get_key( data, self.ignorename )
+
+
+	def is_stored( self, data ):
+		""" Check if the settings of data (a Tone, or a settings block, dump, or ydl file contents), or a key, have been added. """
+		if isinstance( data, str ):
+			return data in self.aliases
+		return self.get_key( data ) in self.aliases
+
+
+	def add( self, data, key=None ):
+		""" Add the settings of data (a Tone, or a settings block, dump, or ydl file contents), returning (key, True if the settings weren't stored before).
+
+		The dump file is only written for new settings, the name data has is counted as an alias either way.
+		Pass the key, if already known, to save hashing again.
+		"""
+		if key is None:
+			key = self.get_key( data )
+		block = data.block if isinstance( data, _Tone ) else _sysex_tones.THR.get_settings_block( data )
+		name = _sysex_tones.convert_from_midi_to_string( block[:_THR_CONSTANTS.THR_SETTINGS_NAME_SIZE] )
+		isnew = key not in self.aliases
+		if isnew:
+			with open( self.get_filename( key ), 'wb' ) as outfile:
+				outfile.write( bytes( bytearray( _sysex_tones.THR.convert_block_to_dump( block ) ) ) )
+		self._log( key, name, 1 )
+		return (key, isnew)
+
+
+	def release( self, key, name=None ):
+		""" Count one less alias name (or every alias, if None) of key, removing the settings when none are left, returning True if they were removed. """
+		names = self.aliases[key]
+		if name is None:
+			for (other, count) in sorted( names.items() ):
+				self._log( key, other, -count )
+		else:
+			if name not in names:
+				raise KeyError( name )
+			self._log( key, name, -1 )
+		if key in self.aliases:
+			return False
+		_os.remove( self.get_filename( key ) )
+		return True
+
+
+	def _load( self, filename, included ):
+		""" Count the aliases in filename (the aliases file, or a log file, skipped if its sequence number is included), returning its sequence number. """
+		retval = included + 1
+		with open( filename ) as infile:
+			header = infile.readline().rstrip( '\n' )
+			if header != self.get_header():
+				raise ValueError( '%s was stored with names %s' % (self.directory, _sysex_tones.ternary_operator( self.ignorename, 'kept', 'ignored' )) )
+			for line in infile:
+				line = line.rstrip( '\n' )
+				if line.startswith( STORE_LOG_SEQUENCE ):
+					retval = int( line[len( STORE_LOG_SEQUENCE ):] )
+				elif retval > included:
+					(key, count, name) = line.split( '\t', 2 )
+					self._count( key, name, int( count ) )
+		return retval
+
+
+	def _count( self, key, name, count ):
+		""" Change the number of times key was added with name by count, removing the name, and key, when none are left. """
+		names = self.aliases.setdefault( key, {} )
+		names[name] = names.get( name, 0 ) + count
+		if names[name] <= 0:
+			del names[name]
+			if not names:
+				del self.aliases[key]
+
+
+	def _log( self, key, name, count ):
+		""" Count an alias change (see _count()), and append it to the log file, opening (and starting) it if needed. """
+		self._count( key, name, count )
+		if self.logfile is None:
+			filename = _os.path.join( self.directory, STORE_LOG_FILENAME )
+			isnew = not _os.path.exists( filename )
+			self.logfile = open( filename, 'a' )
+			if isnew:
+				self.logfile.write( '%s\n%s%i\n' % (self.get_header(), STORE_LOG_SEQUENCE, self.logsequence) )
+		self.logfile.write( '%s\t%i\t%s\n' % (key, count, name) )
+		self.changed = True
+
+
+	def keys( self ):
+		""" Return a sorted list of the keys of the stored settings. """
+		return sorted( self.aliases )
+
+
+	def get_aliases( self, key ):
+		""" Return a dictionary of the names key was added with, mapped to the number of times. """
+		return dict( self.aliases[key] )
+
+
+	def get_count( self, key ):
+		""" Return the number of times key was added, and not released. """
+		return sum( self.aliases[key].values() )
+
+
+	def get_filename( self, key ):
+		""" Return the file name of the dump of key. """
+		return _os.path.join( self.directory, key + STORE_DUMP_EXTENSION )
+
+
+	def get_dump( self, key ):
+		""" Return the settings dump (bytes) of key, as first added. """
+		with open( self.get_filename( key ), 'rb' ) as infile:
+			return infile.read()
+
+
+	def get_tone( self, key, writable=True ):
+		""" Return a Tone of key, as first added. """
+		return _Tone( self.get_dump( key ), writable )
+
+
+	def flush( self ):
+		""" Write out the alias changes appended to the log file, so they are kept if the program is killed (cheap, the aliases file isn't rewritten). """
+		if self.logfile is not None:
+			self.logfile.flush()
+
+
+	def compact( self ):
+		""" Write the aliases file, if anything changed, replacing it all at once, and remove the log file it now includes. """
+		if self.logfile is not None:
+			self.logfile.close()
+			self.logfile = None
+		if self.changed:
+			filename = _os.path.join( self.directory, STORE_ALIASES_FILENAME )
+			with open( filename + '.new', 'w' ) as outfile:
+				outfile.write( '%s\n%s%i\n' % (self.get_header(), STORE_LOG_SEQUENCE, self.logsequence) )
+				for key in sorted( self.aliases ):
+					for (name, count) in sorted( self.aliases[key].items() ):
+						outfile.write( '%s\t%i\t%s\n' % (key, count, name) )
+			_os.rename( filename + '.new', filename )
+			_os.remove( _os.path.join( self.directory, STORE_LOG_FILENAME ) ) # being killed before this is safe, the aliases file includes the log
+			self.logsequence += 1
+			self.changed = False
+
+
+	def close( self ):
+		""" Compact the log file into the aliases file, see compact(). """
+		self.compact()
@@ -15,8 +15,6 @@
 
 from sysex_tones.THR10.THR10 import THR10
 
-import struct as _struct
-
 import sysex_tones as _sysex_tones
 
 from sysex_tones import CONSTANTS as _CONSTANTS
@@ -24,10 +22,66 @@ from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
 from sysex_tones.THR10 import convert_data as _convert_data
 
+from sysex_tones.lazy_exports import make_lazy as _make_lazy
+
+
+# classes only some apps need, loaded on first use
+_make_lazy( __name__, {
+	'THR10Emulator': 'sysex_tones.THR10.THR10Emulator',
+	'EncoderPlan': 'sysex_tones.THR10.EncoderPlan',
+	'THR10Mirror': 'sysex_tones.THR10.THR10Mirror',
+	'Tone': 'sysex_tones.THR10.Tone',
+	'ToneArchive': 'sysex_tones.THR10.ToneArchive',
+	'ToneQuery': 'sysex_tones.THR10.ToneQuery',
+	'ToneStore': 'sysex_tones.THR10.ToneStore',
+} )
+
+
+# value names of the settings with text values, lowercase, for matching text in any case
+_THR10_RATIO_NAMES = [name.lower() for name in _THR10_CONSTANTS.THR10_RATIO_NAMES]
+_THR10_KNEE_NAMES = [name.lower() for name in _THR10_CONSTANTS.THR10_KNEE_NAMES]
+
+
+def _build_block_addresses():
+	""" Return a sorted list of (address, list of (type address, type value, subcommand context or None) tuples, empty if always used) for every settings command address. """
+	types = {}
+	for control in _THR10_CONSTANTS.THR10_STREAM_COMMANDS:
+		for (name, command) in _THR10_CONSTANTS.THR10_STREAM_COMMANDS[control].items():
+			if name in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS: # a type select, e.g. Rack
+				types[name] = (command[0], command[2], name)
+	retval = {}
+	for control in _THR10_CONSTANTS.THR10_STREAM_COMMANDS:
+		for command in _THR10_CONSTANTS.THR10_STREAM_COMMANDS[control].values():
+			retval[command[0]] = []
+	for context in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS:
+		for command in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS[context].values():
+			if retval.get( command[0] ) != []: # a command address is always used
+				retval.setdefault( command[0], [] ).append( types[context] )
+	for (typeaddress, addresses) in _THR10_CONSTANTS.THR10_STREAM_TYPE_ADDRESSES.items(): # e.g. reverb settings, commands that mean the same for every type
+		for (value, typeaddresses) in addresses.items():
+			for address in typeaddresses:
+				retval[address].append( (typeaddress, value, None) )
+	return sorted( retval.items() )
+
+
+# settings command addresses, in order, so type selects come before their subcommands, and the types each subcommand address is used by
+_THR10_BLOCK_ADDRESSES = _build_block_addresses()
+_THR10_BLOCK_CONTEXTS = dict( [(address, types) for (address, types) in _THR10_BLOCK_ADDRESSES if types] )
+
 
 def convert_text_to_midi( string ):
 	""" Convert string into a list of MIDI commands. """
+	return convert_text_to_midi_slots( string )[0]
+
+
+def convert_text_to_midi_slots( string ):
+	""" Convert string into a list of MIDI commands, and a list of the value slots in them (see EncoderPlan).
+
+	Each slot is a tuple of (offset into the MIDI commands, size: 1 for a byte or 2 for a MIDI int, minimum, maximum,
+	a list of lowercase value names or None, setting, value name), e.g. (8, 2, 1, 9999, None, 'delay', 'time').
+	"""
 	retval = []
+	slots = []
 	(setting, valuelist, values) = _sysex_tones.extract_settings( string )
 	if setting in _THR_CONSTANTS.THR_STREAM_SYSTEM_COMMANDS:
 		valuelist = valuelist.lower()
@@ -46,21 +100,24 @@ def convert_text_to_midi( string ):
 						low = 0
 						high = len( _THR10_CONSTANTS.THR10_RATIO_NAMES ) - 1
 						val = _THR10_CONSTANTS.THR10_RATIO_NAMES.index( value.lower() )
+						slots.append( (len( retval ), 1, low, high, _THR10_RATIO_NAMES, setting, key) )
 						retval += [_sysex_tones.get_minmax( val, low, high )]
 					elif key == 'knee': # special case for text value
 						low = 0
 						high = len( _THR10_CONSTANTS.THR10_KNEE_NAMES ) - 1
 						val = _THR10_CONSTANTS.THR10_KNEE_NAMES.index( value.capitalize() )
+						slots.append( (len( retval ), 1, low, high, _THR10_KNEE_NAMES, setting, key) )
 						retval += [_sysex_tones.get_minmax( val, low, high )]
 					elif len( _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS[subkey][key] ) == 1: # MIDI int
 						low = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[subkey][key][0]
 						high = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[subkey][key][1]
 						val = _sysex_tones.get_minmax( value, low, high )
-						vab = _struct.pack( '!I', _sysex_tones.convert_to_midi_int( val ) )
-						retval += [vab[2], vab[3]]
+						slots.append( (len( retval ), 2, low, high, None, setting, key) )
+						retval += _sysex_tones.convert_to_midi_int_ints( val )
 					else: # MIDI byte, max 0x7f
 						low = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[subkey][key][0]
 						high = _THR10_CONSTANTS.THR10_STREAM_SUBLIMITS[subkey][key][1]
+						slots.append( (len( retval ), 1, low, high, None, setting, key) )
 						retval += [_sysex_tones.get_minmax( value, low, high )]
 					retval += _THR_CONSTANTS.THR_SYSEX_STOP
 			else:
@@ -76,34 +133,161 @@ def convert_text_to_midi( string ):
 						low = _THR10_CONSTANTS.THR10_STREAM_LIMITS[setting][key][0]
 						high = _THR10_CONSTANTS.THR10_STREAM_LIMITS[setting][key][1]
 						val = _sysex_tones.get_minmax( value, low, high )
-						vab = _struct.pack( '!I', _sysex_tones.convert_to_midi_int( val ) )
-						retval += [vab[2], vab[3]]
+						slots.append( (len( retval ), 2, low, high, None, setting, key) )
+						retval += _sysex_tones.convert_to_midi_int_ints( val )
 					else: # MIDI byte, max 0x7f
 						low = _THR10_CONSTANTS.THR10_STREAM_LIMITS[setting][key][0]
 						high = _THR10_CONSTANTS.THR10_STREAM_LIMITS[setting][key][1]
+						slots.append( (len( retval ), 1, low, high, None, setting, key) )
 						retval += [_sysex_tones.get_minmax( value, low, high )]
 					retval += _THR_CONSTANTS.THR_SYSEX_STOP
 			if key in _THR10_CONSTANTS.THR10_STREAM_SUBCOMMANDS:
 				subkey = key
+	return (retval, slots)
+
+
+def apply_command_to_block( block, payload ):
+	""" Apply a THR command payload (the 3 bytes following THR_COMMAND_PREFIX) to block (a writable 256 byte settings block), as the device does, returning True if the block changed. """
+	retval = False
+	if len( payload ) == 3:
+		offset = _THR10_CONSTANTS.THR10_BLOCK_OFFSET + payload[0]
+		values = [payload[2]] # MIDI byte, type, or on/off
+		if payload[0] in _THR10_CONSTANTS.THR10_BLOCK_MIDI_INTS:
+			depends = _THR10_CONSTANTS.THR10_BLOCK_MIDI_INTS[payload[0]]
+			if not depends or block[depends[0]] in depends[1]:
+				values = [payload[1], payload[2]]
+		if offset + len( values ) <= _THR_CONSTANTS.THR_SYSEX_SIZE:
+			for value in values:
+				if block[offset] != value:
+					block[offset] = value
+					retval = True
+				offset += 1
 	return retval
 
 
-def convert_midi_dump_to_text( data ):
-	""" Convert MIDI data into a list of settings strings. """
+def get_block_context( block, address ):
+	""" Return the subcommand context (e.g. 'rack') of the type selected in block (a 256 byte settings block) for address (a THR command address), or None. """
+	retval = None
+	for (typeaddress, value, context) in _THR10_BLOCK_CONTEXTS.get( address, [] ):
+		if block[_THR10_CONSTANTS.THR10_BLOCK_OFFSET + typeaddress] == value:
+			retval = context
+			break
+	return retval
+
+
+def is_midi_int_address( block, address ):
+	""" Check if the value at address (a THR command address) is a MIDI int, for the types selected in block (a 256 byte settings block). """
+	retval = False
+	if address in _THR10_CONSTANTS.THR10_BLOCK_MIDI_INTS:
+		depends = _THR10_CONSTANTS.THR10_BLOCK_MIDI_INTS[address]
+		retval = not depends or block[depends[0]] in depends[1]
+	return retval
+
+
+def convert_block_diff_to_midi( block, target ):
+	""" Convert the differences between block (the device settings block) and target (the wanted settings block) into a list of MIDI commands.
+
+	Only settings that differ are sent, settings of some types only (subcommands, and reverb settings) only for the type selected in target,
+	type selects before their settings, and every setting of a newly selected type (the device may not keep them between types).  Blocks are 256 byte settings blocks (lists of ints, or buffers).
+	"""
 	retval = []
-	comment = '# '
-	retval.append( _convert_data.name_data_to_string( data ) )
-	retval.append( _convert_data.amp_data_to_string( data, comment ) )
-	retval.append( _convert_data.control_data_to_string( data ) )
-	retval.append( _convert_data.cab_data_to_string( data, comment ) )
-	retval += _convert_data.compressor_data_to_strings( data, comment )
-	retval += _convert_data.modulation_data_to_strings( data, comment )
-	retval += _convert_data.delay_data_to_strings( data, comment )
-	retval += _convert_data.reverb_data_to_strings( data, comment )
-	retval += _convert_data.gate_data_to_strings( data, comment )
+	offset = _THR10_CONSTANTS.THR10_BLOCK_OFFSET
+	covered = -1 # the low byte of the last MIDI int
+	for (address, types) in _THR10_BLOCK_ADDRESSES:
+		if address == covered:
+			continue
+		changed = False
+		if types:
+			used = [(typeaddress, value) for (typeaddress, value, context) in types if target[offset + typeaddress] == value]
+			if not used:
+				continue
+			changed = block[offset + used[0][0]] != target[offset + used[0][0]]
+		if is_midi_int_address( target, address ):
+			values = [target[offset + address], target[offset + address + 1]]
+			changed = changed or [block[offset + address], block[offset + address + 1]] != values
+			covered = address + 1
+		else:
+			values = [0x00, target[offset + address]]
+			changed = changed or block[offset + address] != values[1]
+		if changed:
+			retval += _THR_CONSTANTS.THR_COMMAND_PREFIX
+			retval += [address] + values
+			retval += _THR_CONSTANTS.THR_SYSEX_STOP
 	return retval
 
 
+def create_default_block( name='THR10' ):
+	""" Return a settings block (a bytearray) named name, Clean amp, with every effect off. """
+	retval = bytearray( _THR_CONSTANTS.THR_SYSEX_SIZE )
+	retval[:len( name )] = bytearray( name[:_THR_CONSTANTS.THR_SETTINGS_NAME_SIZE].encode( 'ascii' ) )
+	for (control, command) in [('compressor', 'off'), ('modulation', 'off'), ('delay', 'off'), ('reverb', 'off'), ('gate', 'off')]:
+		apply_command_to_block( retval, _THR10_CONSTANTS.THR10_STREAM_COMMANDS[control][command] )
+	return retval
+
+
+def apply_text_to_block( block, text ):
+	""" Apply text (settings text, a string or a list of lines) to block (a writable 256 byte settings block), as the device applies the commands it converts to.
+
+	Returns a tuple of (the settings name, or None if text has no Name line, a list of the MIDI commands that are not part of a settings block, e.g. lamp and wide).
+	"""
+	name = None
+	retval = []
+	if isinstance( text, str ):
+		text = text.splitlines()
+	for line in text:
+		(setting, valuelist, values) = _sysex_tones.extract_settings( line )
+		if setting == 'name':
+			name = valuelist
+		for sysex in _sysex_tones.extract_midi_sysex( convert_text_to_midi( line ) ):
+			payload = _sysex_tones.extract_command_payload( sysex, _THR_CONSTANTS.THR_COMMAND_PREFIX )
+			if payload:
+				apply_command_to_block( block, payload )
+			else:
+				retval += sysex
+	return (name, retval)
+
+
+def convert_text_to_dump( text, block=None ):
+	""" Convert text (settings text, a string or a list of lines) into a complete settings dump (a list of ints, with a valid checksum), that loads the whole tone in one SysEx write.
+
+	Settings the text doesn't set are kept from block (a settings block or dump, e.g. from THR10.request_current_block() or a THR10Mirror), defaulting to create_default_block().
+	Returns a tuple of (the dump, a list of the MIDI commands that are not part of a dump, e.g. lamp and wide, to send with it).
+	"""
+	if block is None:
+		block = create_default_block()
+	elif len( block ) == _THR_CONSTANTS.THR_DUMP_SIZE:
+		block = block[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+	block = bytearray( block )
+	(name, retval) = apply_text_to_block( block, text )
+	dump = _sysex_tones.THR.convert_block_to_dump( block )
+	if name is not None:
+		dump = _sysex_tones.THR.change_name_of_settings( _sysex_tones.convert_from_stream( name ), dump )
+	return (dump, retval)
+
+
+def convert_text_to_midi_diff( text, block ):
+	""" Convert text (settings text, a string or a list of lines) into the MIDI commands that change block (the device settings block, or dump) to the settings, returning a tuple of (a list of MIDI commands, the changed settings block, a bytearray).
+
+	System commands (e.g. lamp, wide) are not part of the settings block, and are always sent, first.
+	"""
+	if len( block ) == _THR_CONSTANTS.THR_DUMP_SIZE:
+		block = block[_THR_CONSTANTS.THR_DUMP_OFFSET:-2]
+	target = bytearray( block )
+	(name, retval) = apply_text_to_block( target, text )
+	retval += convert_block_diff_to_midi( block, target )
+	return (retval, target)
+
+
+def convert_midi_dump_to_text( data ):
+	""" Convert MIDI data into a list of settings strings. """
+	return _convert_data.decode_block( data )[1]
+
+
+def convert_midi_dump_to_values( data ):
+	""" Convert MIDI data into an OrderedDict of settings values, see convert_data.decode_block(). """
+	return _convert_data.decode_block( data )[0]
+
+
 def convert_to_text( data ):
 	""" Convert data into text settings. """
 	retval = []
@@ -130,3 +314,27 @@ def convert_to_text( data ):
 					retval.append( 'THR10 request settings command' )
 	return retval
 
+
+
+def replay_capture( filename, callback, realtime=False, speed=1.0 ):
+	""" Replay the capture file filename (see sysex_tones.CaptureRecorder) through THR10 decoding, calling callback( timestamp, sysex, detected, command ) for each frame.
+
+	detected is the THR10.detect_midi_dump() result, command is the THR10.find_thr_command() result (with subcommand context tracked as the device sends it).
+	"""
+	state = {'context': None}
+
+	def decode( timestamp, sysex ):
+		""" Decode sysex, as monitor_thr.py would. """
+		detected = THR10.detect_midi_dump( sysex )
+		command = {}
+		if not detected:
+			command = THR10.find_thr_command( sysex, state['context'] )
+			if 'context' in command:
+				state['context'] = command['context']
+		callback( timestamp, sysex, detected, command )
+
+	replayer = _sysex_tones.CaptureReplayer( filename )
+	try:
+		replayer.replay( decode, realtime, speed )
+	finally:
+		replayer.close()
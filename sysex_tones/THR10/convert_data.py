@@ -13,302 +13,176 @@
 # GNU Affero General Public License for more details.
 
 
+import collections as _collections
+
 import sysex_tones as _sysex_tones
 
-from sysex_tones.THR import CONSTANTS as _THR_CONSTANTS
 from sysex_tones.THR10 import CONSTANTS as _THR10_CONSTANTS
 
-from sysex_tones import get_minmax as _get_minmax
-from sysex_tones.THR10.CONSTANTS import THR10_STREAM_LIMITS as _THR10_STREAM_LIMITS
-from sysex_tones.THR10.CONSTANTS import THR10_STREAM_SUBLIMITS as _THR10_STREAM_SUBLIMITS
 
+# section kinds, of compiled layout sections
+_TEXT = 0
+_SELECT = 1
+_SETTINGS = 2
 
-def _minmax_limits( val, key, keykey ):
-	""" Convenience function to save some typing, calls get_minmax() with THR10_STREAM_LIMITS minimum and maximum. """
-	minmax = _THR10_STREAM_LIMITS[key][keykey]
-	return _get_minmax( val, minmax[0], minmax[1] )
 
+def compile_block_layout( layout ):
+	""" Compile layout (e.g. THR10_BLOCK_LAYOUT) into a tuple of sections for decode_block(), with every offset, size, limit, and name looked up once.
 
-def _minmax_sublimits( val, key, keykey ):
-	""" Convenience function to save some typing, calls get_minmax() with THR10_STREAM_SUBLIMITS minimum and maximum. """
-	minmax = _THR10_STREAM_SUBLIMITS[key][keykey]
-	return _get_minmax( val, minmax[0], minmax[1] )
+	Each section is a tuple of (kind, label, values key, offset, text size, state offset or None, names, types or None, fields),
+	types map each type to a tuple of (type name, fields), and fields are tuples of (setting, values key, offset, size, minimum, maximum, names or None, the setting string format).
+	"""
+	retval = []
+	for section in layout:
+		label = section['label']
+		fields = tuple( [_compile_field( field ) for field in section.get( 'fields', [] )] )
+		types = None
+		if 'types' in section:
+			types = dict( [(index, (section['names'][index], tuple( [_compile_field( field ) for field in typefields] ))) for (index, typefields) in section['types'].items()] )
+		if 'size' in section:
+			kind = _TEXT
+		elif 'names' in section and types is None:
+			kind = _SELECT
+		else:
+			kind = _SETTINGS
+		retval.append( (kind, label, label.lower(), section.get( 'offset' ), section.get( 'size' ), section.get( 'state' ), section.get( 'names' ), types, fields) )
+	return tuple( retval )
+
+
+def _compile_field( field ):
+	""" Compile a layout field, see compile_block_layout(). """
+	names = None
+	(low, high) = (None, None)
+	if field[3] is None:
+		names = tuple( field[4] )
+	else:
+		(low, high) = field[3]
+	return (field[0], field[0].lower(), field[1], field[2], low, high, names, field[0].replace( '%', '%%' ) + ' %i')
+
+
+_SECTIONS = compile_block_layout( _THR10_CONSTANTS.THR10_BLOCK_LAYOUT )
+_SECTIONS_BY_LABEL = dict( [(section[1], section) for section in _SECTIONS] )
+
+
+def decode_block( data, comment='# ', sections=_SECTIONS ):
+	""" Decode data (a 256 byte settings block, a list of ints or a buffer) in one pass, returning a tuple of (an OrderedDict of values, a list of settings strings).
+
+	Values are keyed by lowercase section label (e.g. 'name', 'amp', 'reverb'), sections with settings are OrderedDicts,
+	with 'on' (True or False, if it can be switched off), 'type' (the type name, or None if unknown), and lowercase settings (e.g. 'high cut').
+	Bad indexes decode as None, settings strings for them begin with comment, as do settings strings of effects that are off.
+	"""
+	values = _collections.OrderedDict()
+	lines = []
+	for section in sections:
+		values[section[2]] = _decode_section( section, data, comment, lines, _collections.OrderedDict )
+	return (values, lines)
+
+
+def _decode_section( section, data, comment, lines, dictionary ):
+	""" Decode section (from compile_block_layout()) of data, appending its settings strings to lines, returning its values (settings in a new dictionary). """
+	(kind, label, key, offset, size, state, names, types, fields) = section
+	if kind == _TEXT:
+		retval = _sysex_tones.convert_from_midi_to_string( data[offset:offset + size] )
+		lines.append( '%s: %s' % (label, retval) )
+	elif kind == _SELECT:
+		index = data[offset]
+		if index < len( names ):
+			retval = names[index]
+			lines.append( '%s: %s' % (label, retval) )
+		else:
+			retval = None
+			lines.append( '%sBad %s index %i?' % (comment, label, index) )
+	else:
+		retval = dictionary()
+		prefix = ''
+		if state is not None:
+			retval['on'] = not data[state]
+			if retval['on']:
+				lines.append( '%s: On' % (label) )
+			else:
+				lines.append( '%s: Off' % (label) )
+				prefix = comment
+		parts = []
+		if types is not None:
+			index = data[offset]
+			if index not in types:
+				retval['type'] = None
+				lines.append( '%sUnknown %s type %i?' % (comment, label, index) )
+				return retval
+			(typename, fields) = types[index]
+			retval['type'] = typename
+			parts.append( typename )
+		for (setting, settingkey, fieldoffset, fieldsize, low, high, fieldnames, form) in fields:
+			if fieldsize == 2: # MIDI int
+				value = ((data[fieldoffset] & 0x7f) << 7) | (data[fieldoffset + 1] & 0x7f)
+			else:
+				value = data[fieldoffset]
+			if fieldnames is not None:
+				if value < len( fieldnames ):
+					value = fieldnames[value]
+					parts.append( '%s %s' % (setting, value) )
+				else:
+					lines.append( '%sBad %s index %i?' % (comment, settingkey, value) )
+					value = None
+					parts.append( '%s UNKNOWN' % (setting) )
+			else:
+				if value < low:
+					value = low
+				elif value > high:
+					value = high
+				parts.append( form % (value) )
+			retval[settingkey] = value
+		lines.append( '%s%s: %s' % (prefix, label, ', '.join( parts )) )
+	return retval
+
+
+def _decode_to_strings( label, data, comment='# ' ):
+	""" Decode the section labelled label of data, returning its settings strings. """
+	retval = []
+	_decode_section( _SECTIONS_BY_LABEL[label], data, comment, retval, dict )
+	return retval
 
 
 def name_data_to_string( data ):
 	""" Convert data into a Name: string. """
-	name = data[:_THR_CONSTANTS.THR_SETTINGS_NAME_SIZE]
-	name = _sysex_tones.convert_from_midi_to_string( name )
-	return 'Name: %s' % (name)
+	return _decode_to_strings( 'Name', data )[0]
 
 
 def amp_data_to_string( data, comment ):
 	""" Convert data into an Amp: string, or a commented error string. """
-	retval = ''
-	label = 'Amp'
-	try:
-		retval = '%s: %s' % (label, _THR10_CONSTANTS.THR10_AMP_NAMES[data[128]])
-	except IndexError:
-		retval = '%sBad %s index %i?' % (comment, label, data[128])
-	return retval
+	return _decode_to_strings( 'Amp', data, comment )[0]
 
 
 def control_data_to_string( data ):
 	""" Convert data into a Control: string. """
-	label = 'Control'
-	key = label.lower()
-	settings = [
-		'Gain',
-		'Master',
-		'Bass',
-		'Middle',
-		'Treble',
-	]
-	values = [
-		_minmax_limits( data[129], key, settings[0].lower() ),
-		_minmax_limits( data[130], key, settings[1].lower() ),
-		_minmax_limits( data[131], key, settings[2].lower() ),
-		_minmax_limits( data[132], key, settings[3].lower() ),
-		_minmax_limits( data[133], key, settings[4].lower() ),
-	]
-	return _sysex_tones.settings_to_string( '', label, settings, values )
+	return _decode_to_strings( 'Control', data )[0]
 
 
 def cab_data_to_string( data, comment ):
 	""" Convert data into a Cab: string, or a commented error string. """
-	retval = ''
-	label = 'Cab'
-	try:
-		retval = '%s: %s' % (label, _THR10_CONSTANTS.THR10_CAB_NAMES[data[134]])
-	except IndexError:
-		retval = '%sBad %s index %i?' % (comment, label, data[134])
-	return retval
+	return _decode_to_strings( 'Cab', data, comment )[0]
 
 
 def compressor_data_to_strings( data, comment ):
 	""" Convert data into Compressor: strings, commented strings, or commented error strings. """
-	retval = []
-	label = 'Compressor'
-	compressorstate = _sysex_tones.ternary_operator( data[159], 'Off', 'On' )
-	retval.append( '%s: %s' % (label, compressorstate) )
-	prefix = _sysex_tones.ternary_operator( compressorstate == 'On', '', comment )
-	compressortype = data[144]
-	if compressortype == 0:
-		key = 'stomp'
-		settings = [
-			'',
-			'Sustain',
-			'Output',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_COMPRESSOR_NAMES[compressortype],
-			_minmax_sublimits( data[145], key, settings[1].lower() ),
-			_minmax_sublimits( data[146], key, settings[2].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	elif compressortype == 1:
-		key = 'rack'
-		ratio = 'UNKNOWN'
-		knee = 'UNKNOWN'
-		try:
-			ratio = _THR10_CONSTANTS.THR10_RATIO_NAMES[data[149]]
-		except IndexError:
-			retval.append( '%sBad ratio index %i?' % (comment, data[149]) )
-		try:
-			knee = _THR10_CONSTANTS.THR10_KNEE_NAMES[data[150]]
-		except IndexError:
-			retval.append( '%sBad knee index %i?' % (comment, data[150]) )
-		settings = [
-			'',
-			'Threshold',
-			'Attack',
-			'Release',
-			'Ratio',
-			'Knee',
-			'Output',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_COMPRESSOR_NAMES[compressortype],
-			_minmax_sublimits( data[146], key, settings[1].lower() ),
-			_minmax_sublimits( data[147], key, settings[2].lower() ),
-			_minmax_sublimits( data[148], key, settings[3].lower() ),
-			ratio,
-			knee,
-			_minmax_sublimits( _sysex_tones.convert_from_midi_int_ints( data[151:153] ), key, settings[6].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	else:
-		retval.append( '%sUnknown %s type %i?' % (comment, label, compressortype) )
-	return retval
+	return _decode_to_strings( 'Compressor', data, comment )
 
 
 def modulation_data_to_strings( data, comment ):
 	""" Convert data into Modulation: strings, commented strings, or commented error strings. """
-	retval = []
-	label = 'Modulation'
-	modulationstate = _sysex_tones.ternary_operator( data[175], 'Off', 'On' )
-	retval.append( '%s: %s' % (label, modulationstate) )
-	prefix = _sysex_tones.ternary_operator( modulationstate == 'On', '', comment )
-	modulationtype = data[160]
-	if modulationtype == 0:
-		key = 'chorus'
-		settings = [
-			'',
-			'Speed',
-			'Depth',
-			'Mix',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_MODULATION_NAMES[modulationtype],
-			_minmax_sublimits( data[161], key, settings[1].lower() ),
-			_minmax_sublimits( data[162], key, settings[2].lower() ),
-			_minmax_sublimits( data[163], key, settings[3].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	elif modulationtype == 1:
-		key = 'flanger'
-		settings = [
-			'',
-			'Speed',
-			'Manual',
-			'Depth',
-			'Feedback',
-			'Spread',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_MODULATION_NAMES[modulationtype],
-			_minmax_sublimits( data[161], key, settings[1].lower() ),
-			_minmax_sublimits( data[162], key, settings[2].lower() ),
-			_minmax_sublimits( data[163], key, settings[3].lower() ),
-			_minmax_sublimits( data[164], key, settings[4].lower() ),
-			_minmax_sublimits( data[165], key, settings[5].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	elif modulationtype == 2:
-		key = 'tremelo'
-		settings = [
-			'',
-			'Freq',
-			'Depth',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_MODULATION_NAMES[modulationtype],
-			_minmax_sublimits( data[161], key, settings[1].lower() ),
-			_minmax_sublimits( data[162], key, settings[2].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	elif modulationtype == 3:
-		key = 'phaser'
-		settings = [
-			'',
-			'Speed',
-			'Manual',
-			'Depth',
-			'Feedback',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_MODULATION_NAMES[modulationtype],
-			_minmax_sublimits( data[161], key, settings[1].lower() ),
-			_minmax_sublimits( data[162], key, settings[2].lower() ),
-			_minmax_sublimits( data[163], key, settings[3].lower() ),
-			_minmax_sublimits( data[164], key, settings[4].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	else:
-		retval.append( '%sUnknown %s type %i?' % (comment, label, modulationtype) )
-	return retval
+	return _decode_to_strings( 'Modulation', data, comment )
 
 
 def delay_data_to_strings( data, comment ):
 	""" Convert data into Delay: strings, or commented strings. """
-	retval = []
-	label = 'Delay'
-	delaystate = _sysex_tones.ternary_operator( data[191], 'Off', 'On' )
-	retval.append( '%s: %s' % (label, delaystate) )
-	key = label.lower()
-	prefix = _sysex_tones.ternary_operator( delaystate == 'On', '', comment )
-	settings = [
-		'Time',
-		'Feedback',
-		'High Cut',
-		'Low Cut',
-		'Level',
-	]
-	values = [
-		_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[177:179] ), key, settings[0].lower() ),
-		_minmax_limits( data[179], key, settings[1].lower() ),
-		_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[180:182] ), key, settings[2].lower() ),
-		_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[182:184] ), key, settings[3].lower() ),
-		_minmax_limits( data[184], key, settings[4].lower() ),
-	]
-	retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	return retval
+	return _decode_to_strings( 'Delay', data, comment )
 
 
 def reverb_data_to_strings( data, comment ):
 	""" Convert data into Reverb: strings, commented strings, or commented error strings. """
-	retval = []
-	label = 'Reverb'
-	reverbstate = _sysex_tones.ternary_operator( data[207], 'Off', 'On' )
-	retval.append( '%s: %s' % (label, reverbstate) )
-	key = label.lower()
-	prefix = _sysex_tones.ternary_operator( reverbstate == 'On', '', comment )
-	reverbtype = data[192]
-	if reverbtype in [0, 1, 2]:
-		settings = [
-			'',
-			'Time',
-			'Pre',
-			'Low Cut',
-			'High Cut',
-			'High Ratio',
-			'Low Ratio',
-			'Level',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_REVERB_NAMES[reverbtype],
-			_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[193:195] ), key, settings[1].lower() ),
-			_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[195:197] ), key, settings[2].lower() ),
-			_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[197:199] ), key, settings[3].lower() ),
-			_minmax_limits( _sysex_tones.convert_from_midi_int_ints( data[199:201] ), key, settings[4].lower() ),
-			_minmax_limits( data[201], key, settings[5].lower() ),
-			_minmax_limits( data[202], key, settings[6].lower() ),
-			_minmax_limits( data[203], key, settings[7].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	elif reverbtype == 3:
-		settings = [
-			'',
-			'Reverb',
-			'Filter',
-		]
-		values = [
-			_THR10_CONSTANTS.THR10_REVERB_NAMES[reverbtype],
-			_minmax_limits( data[193], key, settings[1].lower() ),
-			_minmax_limits( data[194], key, settings[2].lower() ),
-		]
-		retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	else:
-		retval.append( '%sUnknown %s type %i?' % (comment, label, reverbtype) )
-	return retval
+	return _decode_to_strings( 'Reverb', data, comment )
 
 
 def gate_data_to_strings( data, comment ):
 	""" Convert data into Gate: strings, or commented strings. """
-	retval = []
-	label = 'Gate'
-	gatestate = _sysex_tones.ternary_operator( data[223], 'Off', 'On' )
-	retval.append( '%s: %s' % (label, gatestate) )
-	key = label.lower()
-	prefix = _sysex_tones.ternary_operator( gatestate == 'On', '', comment )
-	settings = [
-		'Threshold',
-		'Release',
-	]
-	values = [
-		_minmax_limits( data[209], key, settings[0].lower() ),
-		_minmax_limits( data[210], key, settings[1].lower() ),
-	]
-	retval.append( _sysex_tones.settings_to_string( prefix, label, settings, values ) )
-	return retval
-
+	return _decode_to_strings( 'Gate', data, comment )
@@ -17,15 +17,26 @@ __version__ = '0.0.2'
 
 
 from sysex_tones.BasicIO import BasicIO
+from sysex_tones.SysExFramer import SysExFramer
 
 import os as _os
-import time as _time
-import fcntl as _fcntl
-import select as _select
 import collections as _collections
 
 import sysex_tones.CONSTANTS as _CONSTANTS
 
+from sysex_tones.lazy_exports import make_lazy as _make_lazy
+
+
+# classes only some apps need, loaded on first use, e.g. sysex_tones.EventLoop()
+_make_lazy( __name__, {
+	'EventLoop': 'sysex_tones.EventLoop',
+	'HotplugWatcher': 'sysex_tones.HotplugWatcher',
+	'OutputScheduler': 'sysex_tones.OutputScheduler',
+	'CaptureRecorder': 'sysex_tones.CaptureRecorder',
+	'CaptureReplayer': 'sysex_tones.CaptureReplayer',
+	'MetricsRegistry': 'sysex_tones.Metrics',
+} )
+
 
 def ternary_operator( state, nonzero, zero ):
 	""" Returns nonzero if state is, otherwise zero if state is not. """
@@ -52,6 +63,11 @@ def convert_from_midi_int( midiint ):
 	return (((midiint & 0x7f00) >> 1) | (midiint & 0x007f))
 
 
+def convert_to_midi_int_ints( i ):
+	""" Convert i (max 0x3fff) into two bytes in MIDI int format. """
+	return [(i >> 7) & 0x007f, i & 0x007f]
+
+
 def convert_from_midi_int_ints( data ):
 	""" Convert data (two bytes in MIDI int format) into an int. """
 	return (((data[0] & 0x007f) << 7) | (data[1] & 0x007f))
@@ -61,6 +77,7 @@ def convert_from_midi_to_string( data ):
 	""" Convert data into a string, truncate on first '\0' (if present), ignore any ASCII values less than ord( ' ' ) and greater than ord( '~' ). """
 	low = ord( ' ' )
 	high = ord( '~' )
+	data = list( bytearray( data ) ) # accepts lists of ints and buffers alike (Python 2 bytearrays can't index ints), the name is short
 	if 0 in data:
 		data = data[:data.index( 0 )]
 	return ''.join( [chr( x ) for x in data if x >= low and x <= high] )
@@ -71,14 +88,38 @@ def convert_bytes_to_hex_string( data ):
 	return ' '.join( ['%02x' % (b) for b in data] )
 
 
+def is_buffer( data ):
+	""" Check if data is a buffer (bytes, bytearray, memoryview), rather than a list of ints. """
+	return isinstance( data, (bytes, bytearray, memoryview) )
+
+
+def convert_to_bytes( data ):
+	""" Convert data (a list of ints, or a buffer) into bytes. """
+	return bytes( bytearray( data ) )
+
+
+def startswith( data, prefix ):
+	""" Check if data begins with prefix, where data is a buffer and prefix is bytes, or both are lists of ints. """
+	return data[:len( prefix )] == prefix
+
+
 def convert_to_stream( data ):
-	""" Convert data into a bytearray, for .write() compatibility. """
-	return bytearray( data )
+	""" Convert data into a bytearray, for .write() compatibility, buffers (bytes, bytearray, memoryview) are returned without copying. """
+	retval = data
+	if not is_buffer( data ):
+		retval = bytearray( data )
+	return retval
 
 
 def convert_from_stream( string ):
 	""" Convert a string from a stream, via .read(), into a list of bytes. """
-	return [ord( c ) for c in string]
+	retval = []
+	if string: # a non-blocking read returns None when no data is available
+		if is_buffer( string ):
+			retval = list( bytearray( string ) )
+		else:
+			retval = [ord( c ) for c in string]
+	return retval
 
 
 def extract_settings( text ):
@@ -122,29 +163,16 @@ def extract_settings( text ):
 
 
 def extract_midi_sysex( data ):
-	""" Returns a list of individual SysEx commands found in data. """
-	retval = []
-	index = 0
-	count = len( data )
-	while index < count:
-		if data[index] == _CONSTANTS.SYSEX_START[0]:
-			start = index
-			index += 1
-			while index < count:
-				if data[index] == _CONSTANTS.SYSEX_STOP[0]:
-					retval.append( data[start:index + 1] )
-					break
-				index += 1
-		index += 1
-	return retval
+	""" Returns a list of individual SysEx commands found in data (incomplete commands are ignored). """
+	return SysExFramer( len( data ) ).feed( data )
 
 
 def extract_command_payload( data, commandprefix ):
-	""" If data is a sysex command, and has a commandprefix, return the contents of the command. """
+	""" If data is a sysex command, and has a commandprefix (bytes for buffers, a list of ints for lists), return the contents of the command. """
 	retval = []
 	if data[-1] == _CONSTANTS.SYSEX_STOP[0]:
 		count = len( commandprefix )
-		if data[:count] == commandprefix:
+		if startswith( data, commandprefix ):
 			retval = data[count:-1]
 	return retval
 
@@ -154,14 +182,20 @@ def read_from_stream( inputfile, maxsize=4096 ):
 	return convert_from_stream( inputfile.read( maxsize ) )
 
 
-def extract_sysex_from_stream( inputfile, maxsize=4096 ):
-	""" Return a list sysex commands extracted from inputfile, after reading at most maxsize bytes. """
-	return extract_midi_sysex( read_from_stream( inputfile, maxsize ) )
+def extract_sysex_from_stream( inputfile, maxsize=4096, framer=None ):
+	""" Return a list sysex commands extracted from inputfile, after reading at most maxsize bytes, using framer (if present) to keep partial commands between reads. """
+	retval = []
+	if framer:
+		retval = framer.feed( inputfile.read( maxsize ) ) # the framer scans the raw read, no list conversion needed
+	else:
+		retval = extract_midi_sysex( read_from_stream( inputfile, maxsize ) )
+	return retval
 
 
 def is_data_available( infile, timeout=0.3 ):
 	""" Check infile for available data, using timeout to wait for n.n seconds, returning an empty sequence if no data is available. """
-	return _select.select( [infile], [], [], timeout ) # check for available data
+	import select
+	return select.select( [infile], [], [], timeout ) # check for available data
 
 
 def open_output_stream( filename ):
@@ -171,21 +205,27 @@ def open_output_stream( filename ):
 
 def open_input_stream( filename ):
 	""" If possible, open the filename for unbuffered and non-blocking reading. """
+	import fcntl
 	retval = None
 	if _os.path.exists( filename ) and _os.access( filename, _os.R_OK ):
 		retval = open( filename, 'rb', 0 )
-		flags = _fcntl.fcntl( retval, _fcntl.F_GETFL ) | _os.O_NONBLOCK
-		_fcntl.fcntl( retval, _fcntl.F_SETFL, flags )
+		flags = fcntl.fcntl( retval, fcntl.F_GETFL ) | _os.O_NONBLOCK
+		fcntl.fcntl( retval, fcntl.F_SETFL, flags )
 	return retval
 
 
 def open_input_wait_indefinitely( filename, delay=0.3 ):
-	""" Attempt to open filename for unbuffered and unblocked reading, waiting for n.n delay seconds between attempts (to avoid CPU waste). """
-	retval = None
-	while not retval:
+	""" Attempt to open filename for unbuffered and unblocked reading, waking as soon as filename appears (where inotify is available), otherwise waiting for n.n delay seconds between attempts (to avoid CPU waste). """
+	retval = open_input_stream( filename )
+	if not retval:
+		from sysex_tones.HotplugWatcher import HotplugWatcher
+		watcher = HotplugWatcher( delay )
+		watcher.add_filename( filename ) # watch before trying again, so filename appearing can't be missed
 		retval = open_input_stream( filename )
-		if not retval:
-			_time.sleep( delay ) # wait before trying again
+		while not retval:
+			watcher.wait()
+			retval = open_input_stream( filename )
+		watcher.close()
 	return retval
 
 
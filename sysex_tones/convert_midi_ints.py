@@ -0,0 +1,139 @@
+""" Functions that convert whole arrays of values to and from MIDI ints (7 bit bytes) in one call.
+
+	NumPy is used when it is installed, and the arrays returned are then NumPy arrays.
+	Without NumPy the same conversions are done in Python, and the arrays returned are lists.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+_numpy = None
+
+
+def get_numpy():
+	""" Return the numpy module, or None if it is not installed (imported on first use, to keep imports fast). """
+	global _numpy
+	if _numpy is None:
+		try:
+			import numpy
+			_numpy = numpy
+		except ImportError:
+			_numpy = False
+	return _numpy or None
+
+
+def _as_uint16( numpy, data ):
+	""" Convert data (a buffer, a list of ints, or a NumPy array) into a NumPy uint16 array. """
+	if isinstance( data, (bytes, bytearray, memoryview) ):
+		data = numpy.frombuffer( data, dtype=numpy.uint8 )
+	return numpy.asarray( data ).astype( numpy.uint16 )
+
+
+def _as_blocks( blocks, size ):
+	""" Convert blocks (a list of blocks, or a NumPy array of blocks) into blocks of size bytes stored back to back in one buffer. """
+	if not isinstance( blocks, (bytes, bytearray, memoryview) ):
+		if hasattr( blocks, 'tobytes' ): # a NumPy array
+			blocks = blocks.astype( 'uint8' ).tobytes()
+		else:
+			blocks = b''.join( [bytes( bytearray( block[:size] ) ) for block in blocks] )
+	return blocks
+
+
+def convert_to_midi_int_array( values ):
+	""" Convert values (each max 0x3fff) into MIDI ints (7 bit bytes), see sysex_tones.convert_to_midi_int(). """
+	numpy = get_numpy()
+	if numpy:
+		values = _as_uint16( numpy, values )
+		retval = ((values & 0x3f80) << 1) | (values & 0x007f)
+	else:
+		retval = [((i & 0x3f80) << 1) | (i & 0x007f) for i in values]
+	return retval
+
+
+def convert_from_midi_int_array( midiints ):
+	""" Convert midiints, MIDI ints (7 bit bytes), into ints (each max 0x3fff), see sysex_tones.convert_from_midi_int(). """
+	numpy = get_numpy()
+	if numpy:
+		midiints = _as_uint16( numpy, midiints )
+		retval = ((midiints & 0x7f00) >> 1) | (midiints & 0x007f)
+	else:
+		retval = [((midiint & 0x7f00) >> 1) | (midiint & 0x007f) for midiint in midiints]
+	return retval
+
+
+def convert_to_midi_int_ints_array( values ):
+	""" Convert values (each max 0x3fff) into a flat array of MIDI bytes, two per value (high, low), as sent in SysEx. """
+	numpy = get_numpy()
+	if numpy:
+		values = _as_uint16( numpy, values )
+		retval = numpy.empty( (len( values ), 2), dtype=numpy.uint8 )
+		retval[:, 0] = (values >> 7) & 0x7f
+		retval[:, 1] = values & 0x7f
+		retval = retval.reshape( -1 )
+	else:
+		retval = []
+		for i in values:
+			retval += [(i >> 7) & 0x7f, i & 0x7f]
+	return retval
+
+
+def convert_from_midi_int_ints_array( data ):
+	""" Convert data, a flat array of MIDI bytes, two per value (high, low), into ints, see sysex_tones.convert_from_midi_int_ints(). """
+	numpy = get_numpy()
+	if numpy:
+		data = _as_uint16( numpy, data )
+		retval = ((data[0::2] & 0x7f) << 7) | (data[1::2] & 0x7f)
+	else:
+		retval = [((high & 0x7f) << 7) | (low & 0x7f) for (high, low) in zip( data[0::2], data[1::2] )]
+	return retval
+
+
+def convert_to_midi_byte_array( values ):
+	""" Convert values into MIDI bytes (each max 0x7f), masking any high bits. """
+	numpy = get_numpy()
+	if numpy:
+		retval = _as_uint16( numpy, values ).astype( numpy.uint8 ) & 0x7f
+	else:
+		retval = [value & 0x7f for value in values]
+	return retval
+
+
+def convert_from_midi_block_ints( blocks, offset, size=256 ):
+	""" Convert the two byte MIDI int at offset in each block into an int.
+
+	blocks is either a list of blocks (lists of ints or buffers), or blocks of size bytes stored back to back in one buffer.
+	"""
+	numpy = get_numpy()
+	blocks = _as_blocks( blocks, size )
+	if numpy:
+		columns = numpy.frombuffer( blocks, dtype=numpy.uint8 ).reshape( -1, size )
+		high = columns[:, offset].astype( numpy.uint16 )
+		low = columns[:, offset + 1].astype( numpy.uint16 )
+		retval = ((high & 0x7f) << 7) | (low & 0x7f)
+	else:
+		# strided slices pick one column out of all the blocks, without a Python loop
+		highs = bytearray( blocks[offset::size] )
+		lows = bytearray( blocks[offset + 1::size] )
+		retval = [((high & 0x7f) << 7) | (low & 0x7f) for (high, low) in zip( highs, lows )]
+	return retval
+
+
+def convert_from_midi_block_bytes( blocks, offset, size=256 ):
+	""" Return the MIDI byte at offset in each block, see convert_from_midi_block_ints() for the blocks argument. """
+	numpy = get_numpy()
+	blocks = _as_blocks( blocks, size )
+	if numpy:
+		retval = numpy.frombuffer( blocks, dtype=numpy.uint8 ).reshape( -1, size )[:, offset] & 0x7f
+	else:
+		retval = [value & 0x7f for value in bytearray( blocks[offset::size] )]
+	return retval
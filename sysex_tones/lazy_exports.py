@@ -0,0 +1,65 @@
+""" Functions that make a package load the classes it re-exports on first use, instead of at import. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sys as _sys
+
+
+_ModuleType = type( _sys ) # types.ModuleType, without importing types
+
+
+class LazyPackage( _ModuleType ):
+	""" A package whose re-exported classes (in self.__lazy_exports__, names mapped to module names) are imported on first use.
+
+	Each class is named after the module defining it, the import system binding that module to the package
+	(when something else imports it first) is ignored, so the package attribute is always the class, as with an eager
+	'from package.Name import Name'.
+	"""
+
+
+	def __getattr__( self, name ):
+		""" Import the module exporting name, and keep the class as a package attribute. """
+		exports = self.__dict__.get( '__lazy_exports__', {} )
+		if name not in exports:
+			raise AttributeError( "module '%s' has no attribute '%s'" % (self.__name__, name) )
+		__import__( exports[name] )
+		retval = getattr( _sys.modules[exports[name]], name )
+		_ModuleType.__setattr__( self, name, retval )
+		return retval
+
+
+	def __setattr__( self, name, value ):
+		""" Set the attribute, unless it is the import system binding the module of a re-exported class to the package. """
+		if not (isinstance( value, _ModuleType ) and name in self.__dict__.get( '__lazy_exports__', {} )):
+			_ModuleType.__setattr__( self, name, value )
+
+
+	def __dir__( self ):
+		""" List the re-exported classes, loaded or not. """
+		return sorted( set( list( self.__dict__ ) + list( self.__dict__.get( '__lazy_exports__', {} ) ) ) )
+
+
+def make_lazy( modulename, exports ):
+	""" Make the package modulename load exports (a dictionary of class names mapped to module names) on first use, call it from the package __init__.
+
+	Before Python 3.5 the class of a module can't be changed, so the classes are imported now instead.
+	"""
+	module = _sys.modules[modulename]
+	module.__lazy_exports__ = exports
+	if _sys.version_info >= (3, 5):
+		module.__class__ = LazyPackage
+	else:
+		for name in sorted( exports ):
+			__import__( exports[name] )
+			setattr( module, name, getattr( _sys.modules[exports[name]], name ) )
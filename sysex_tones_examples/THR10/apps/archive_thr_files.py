@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+""" Example app that appends THR settings files, or dump files, to a tone archive, one file holding many settings. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sys
+
+from sysex_tones.THR10 import ToneArchive
+
+
+def archive_files( archivefilename, infilenames ):
+	""" Append each infilenames to the archive archivefilename, creating it if needed. """
+	with ToneArchive( archivefilename ) as archive:
+		count = len( archive )
+		for infilename in archive.import_files( infilenames ):
+			print( 'No THR settings found in %s.' % (infilename) )
+		print( '%i settings archived, %i in %s.' % (len( archive ) - count, len( archive ), archivefilename) )
+
+
+if __name__ == '__main__':
+	if len( sys.argv ) >= 3:
+		archive_files( sys.argv[1], sys.argv[2:] )
+	else:
+		print( 'Usage: %s ARCHIVEFILENAME inputfilenames' % (sys.argv[0]) )
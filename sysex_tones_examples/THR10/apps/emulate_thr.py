@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+""" Example app that emulates a THR10 device on a pseudo-terminal, for running the other example apps without the hardware.
+
+	Press Ctrl-C when you want to exit the app.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sys
+
+from sysex_tones.THR10 import THR10Emulator
+
+
+def emulate( latency=0.0, jitter=0.0, corruption=0.0 ):
+	""" Emulate a THR10 until interrupted, printing the device filename to use with the other example apps. """
+	emulator = THR10Emulator( latency=latency, jitter=jitter, corruption=corruption )
+	print( 'THR10 emulated on %s' % (emulator.open_pty()) )
+	try:
+		emulator.run()
+	except KeyboardInterrupt:
+		pass
+	print( emulator.get_statistics() )
+	emulator.close()
+
+
+if __name__ == '__main__':
+	if len( sys.argv ) > 1 and sys.argv[1] in ['-h', '--help']:
+		print( 'Usage: %s [LATENCY [JITTER [CORRUPTION]]]' % (sys.argv[0]) )
+	else:
+		emulate( *[float( arg ) for arg in sys.argv[1:4]] )
@@ -18,48 +18,52 @@
 
 
 import sys
-import errno
 
 import sysex_tones
 import sysex_tones.THR
+import sysex_tones.THR10
 
 from sysex_tones.THR10 import THR10
+from sysex_tones.THR import CONSTANTS as THR_CONSTANTS
 
 
 def process_file( infilename ):
 	""" Listen to the THR device via the infilename, output any data sent by the device. """
-	thr = THR10()
+	thr = THR10( zerocopy=sysex_tones.CONSTANTS.SYSEX_ZEROCOPY )
 	thr.open_infile_wait_indefinitely( infilename )
 	recognized = [sysex_tones.THR.CONSTANTS.THR10_MODEL_NAME]
-	model = ''
-	context = ''
-	while thr:
-		try:
-			# break the stream up into SysEx commands and process each one
-			for sysex in thr.extract_sysex_from_infile():
-				heartbeat = thr.find_thr_heartbeat_model( sysex )
-				if heartbeat: # the heartbeat happens about twice a second, when device is connected
-					if not model: # only show model name once
-						model = heartbeat
-						print( 'Model %s' % (model) )
-						if model not in recognized:
-							print( '%s are not recognized.' % (model) )
-				else: # it isn't a device heartbeat, maybe it's settings data
-					detected = thr.detect_midi_dump( sysex )
-					if detected: # it's a dump of complete current settings
-						thr.print_sysex_data( sysex, detected['data'] )
-					else: # maybe it's a settings command (probably an on-amp change)
-						command = thr.find_thr_command( sysex, context )
-						if command:
-							print( 'THR command', command )
-							if 'context' in command: # used to track 'sub' commands, if possible
-								context = command['context']
-						else:
-							print( 'unrecognized', context, sysex_tones.convert_bytes_to_hex_string( sysex ) )
-		except IOError as error:
-			if error.errno != errno.EAGAIN: # device disconnected
-				thr.close_infile()
-				thr = None
+	state = {
+		'model': '',
+	}
+	mirror = sysex_tones.THR10.THR10Mirror() # the device settings, once it sends a dump, kept current from the commands that follow
+
+	def process_sysex( thr, sysex ):
+		""" Output each SysEx command as soon as the device sends it. """
+		frame = thr.classify_frame( sysex ) # one lookup, instead of trying each kind of frame in turn
+		command = mirror.process_frame( frame )
+		if frame.kind == THR_CONSTANTS.THR_FRAME_HEARTBEAT: # the heartbeat happens about twice a second, when device is connected
+			if not state['model']: # only show model name once
+				state['model'] = frame.model
+				print( 'Model %s' % (frame.model) )
+				if frame.model not in recognized:
+					print( '%s are not recognized.' % (frame.model) )
+		elif frame.kind == THR_CONSTANTS.THR_FRAME_DUMP: # it's a dump of complete current settings
+			thr.print_sysex_data( sysex, frame.data )
+		else: # maybe it's a settings command (probably an on-amp change)
+			if command: # the mirror tracks 'sub' command context, from the selected types once it has a dump
+				print( 'THR command', command )
+			else:
+				print( 'unrecognized', mirror.context, sysex_tones.convert_bytes_to_hex_string( sysex ) )
+
+	def process_error( thr, error ): # device disconnected
+		""" Stop listening when the device goes away. """
+		thr.close_infile()
+
+	# sleep until the device sends something, instead of polling it
+	loop = sysex_tones.EventLoop()
+	loop.register( thr, process_sysex, process_error )
+	loop.run()
+	loop.close()
 
 
 if __name__ == '__main__':
@@ -67,4 +71,3 @@ if __name__ == '__main__':
 		process_file( sys.argv[1] )
 	else:
 		print( 'Usage: %s MIDIINPUTDEVFILENAME' % (sys.argv[0]) )
-
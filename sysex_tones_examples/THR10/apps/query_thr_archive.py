@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+""" Example app that lists the settings in a tone archive matching name=value predicates, e.g. amp=lead gain=61: reverb=spring reverb_on=on
+
+	Values separated by commas are any of them, minimum:maximum values are ranges, see sysex_tones/THR10/ToneQuery.py for the names.
+	The --index option indexes the archive by a setting (e.g. amp, or cab) first, later queries of that setting use the saved index.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sys
+
+from sysex_tones.THR10 import ToneArchive
+from sysex_tones.THR10 import ToneQuery
+
+
+def query_archive( archivefilename, arguments, indexnames ):
+	""" Print the index, name, and amp of each setting in the archive archivefilename matching arguments. """
+	with ToneArchive( archivefilename, writable=bool( indexnames ) ) as archive:
+		for indexname in indexnames:
+			archive.build_index( indexname )
+		found = archive.find( ToneQuery.parse( arguments ) )
+		for index in found:
+			tone = archive[index]
+			print( '%i: %s (%s)' % (index, tone.name, tone.amp) )
+		print( '%i of %i settings found.' % (len( found ), len( archive )) )
+
+
+if __name__ == '__main__':
+	arguments = sys.argv[2:]
+	indexnames = []
+	while len( arguments ) >= 2 and arguments[0] == '--index':
+		indexnames.append( arguments[1] )
+		arguments = arguments[2:]
+	if len( sys.argv ) >= 2:
+		query_archive( sys.argv[1], arguments, indexnames )
+	else:
+		print( 'Usage: %s ARCHIVEFILENAME [--index NAME] name=value ...' % (sys.argv[0]) )
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+""" Example app that records all MIDI from the THR device, with timestamps, into a capture file, or replays a capture file as settings text.
+
+	Turn the device off when you want to stop recording.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import sys
+
+import sysex_tones
+import sysex_tones.THR10
+
+from sysex_tones.THR10 import THR10
+
+
+def record_file( infilename, capturefilename ):
+	""" Listen to the THR device via the infilename, recording everything it sends into capturefilename. """
+	thr = THR10( zerocopy=sysex_tones.CONSTANTS.SYSEX_ZEROCOPY )
+	thr.open_infile_wait_indefinitely( infilename )
+	recorder = sysex_tones.CaptureRecorder( capturefilename )
+
+	def process_error( thr, error ): # device disconnected
+		""" Stop listening when the device goes away. """
+		thr.close_infile()
+
+	loop = sysex_tones.EventLoop()
+	loop.register( thr, recorder.record_sysex, process_error )
+	loop.run()
+	loop.close()
+	print( recorder.get_statistics() )
+	recorder.close()
+
+
+def replay_file( capturefilename ):
+	""" Output everything recorded in capturefilename, as it was timed when recorded. """
+
+	def process_sysex( timestamp, sysex, detected, command ):
+		""" Output each recorded SysEx command. """
+		if detected:
+			THR10().print_sysex_data( sysex, detected['data'] )
+		elif command:
+			print( '%.3f THR command %s' % (timestamp / 1000000000.0, command) )
+
+	sysex_tones.THR10.replay_capture( capturefilename, process_sysex, realtime=True )
+
+
+if __name__ == '__main__':
+	if len( sys.argv ) > 2:
+		record_file( sys.argv[1], sys.argv[2] )
+	elif len( sys.argv ) > 1:
+		replay_file( sys.argv[1] )
+	else:
+		print( 'Usage: %s [MIDIINPUTDEVFILENAME] CAPTUREFILENAME' % (sys.argv[0]) )
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 """ Example app that waits indefinitely, listening to the THR device, and saves any settings dumps to files with numbered prefixes.
 
+	With the --store option, settings are saved once each to a tone store directory instead, however often they are dumped,
+	the --ignore-names option stores settings that only differ by name once.
 	Turn the device off when you want to exit the app.
 """
 
@@ -18,41 +20,62 @@
 
 
 import sys
-import errno
+
+import sysex_tones
 
 from sysex_tones.THR10 import THR10
+from sysex_tones.THR10 import ToneStore
 
 
-def save_settings_dumps( infilename, outfilename, savefilenamepostfix ):
-	""" Save settings dumps to N_savefilenamepostfix. """
-	thr = THR10( infilename, outfilename )
+def save_settings_dumps( infilename, outfilename, savefilenamepostfix, storedirectory=None, ignorenames=False ):
+	""" Save settings dumps to N_savefilenamepostfix, or to a tone store in storedirectory. """
+	store = None
+	if storedirectory:
+		store = ToneStore( storedirectory, ignorenames )
+	thr = THR10( infilename, outfilename, zerocopy=sysex_tones.CONSTANTS.SYSEX_ZEROCOPY )
 	thr.open_infile_wait_indefinitely()
 	thr.request_current_settings()
-	count = 0
-	while thr:
+	counter = [0]
+
+	def save_dump( thr, sysex ):
+		""" Save each settings dump as soon as the device sends it. """
 		# read settings dumps
 		# first the inital requested dump
 		# then any dumps occuring when pressing preset buttons on the THR device
-		try:
-			attempt = thr.extract_dump()
-			# only save settings dumps
-			if attempt:
-				# output settings into a numbered file
-				savefilename = '%i_%s' % (count, savefilenamepostfix)
-				savefile = open( savefilename, 'wb' )
-				savefile.write( bytearray( attempt['dump'] ) )
-				savefile.close()
-				savefile = None
-				count += 1
-		except IOError as error:
-			if error.errno == errno.ENODEV: # device disconnected
-				thr.close_infile()
-				thr = None
+		detected = thr.detect_midi_dump( sysex )
+		# only save settings dumps
+		if detected and store is not None:
+			# settings already stored only count another alias, and aren't written again
+			(key, isnew) = store.add( detected['data'] )
+			store.flush() # the app is stopped by turning the device off, or killed, this only writes out the alias log line, close() rewrites the aliases file
+			print( '%s %s' % (key, sysex_tones.ternary_operator( isnew, 'stored', 'already stored' )) )
+		elif detected:
+			# output settings into a numbered file
+			savefilename = '%i_%s' % (counter[0], savefilenamepostfix)
+			savefile = open( savefilename, 'wb' )
+			savefile.write( detected['data'] ) # a slice of the received SysEx
+			savefile.close()
+			savefile = None
+			counter[0] += 1
+
+	def stop_saving( thr, error ): # device disconnected
+		""" Stop listening when the device goes away. """
+		thr.close_infile()
+
+	loop = sysex_tones.EventLoop()
+	loop.register( thr, save_dump, stop_saving )
+	loop.run()
+	loop.close()
+	if store is not None:
+		store.close()
 
 
 if __name__ == '__main__':
 	if len( sys.argv ) == 4:
 		save_settings_dumps( sys.argv[1], sys.argv[2], sys.argv[3] )
+	elif len( sys.argv ) in [5, 6] and sys.argv[3] == '--store' and sys.argv[5:] in [[], ['--ignore-names']]:
+		save_settings_dumps( sys.argv[1], sys.argv[2], None, sys.argv[4], len( sys.argv ) == 6 )
 	else:
 		print( 'Usage: %s MIDIINPUTDEVFILENAME MIDIOUTPUTDEVFILENAME OUTPUTFILENAMEPOSTFIX' % (sys.argv[0]) )
+		print( '       %s MIDIINPUTDEVFILENAME MIDIOUTPUTDEVFILENAME --store STOREDIRECTORY [--ignore-names]' % (sys.argv[0]) )
 
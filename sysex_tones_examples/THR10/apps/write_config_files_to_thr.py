@@ -16,21 +16,53 @@
 
 import sys
 
+import sysex_tones
+
 from sysex_tones.THR10 import THR10
 
 
-def write_to_midi( outfilename, infilenames ):
-	""" Send converted settings text from infilenames to outfilename as MIDI. """
+def write_to_midi( outfilename, infilenames, midiinfilename=None, dumps=False ):
+	""" Send converted settings text from infilenames to outfilename as MIDI, paced to the MIDI byte rate.
+
+	With midiinfilename, the device's current settings are requested first, and only settings that differ are sent,
+	with dumps, each file is sent as one settings dump instead (settings a file doesn't set are kept from the device, if requested).
+	"""
 	thr = THR10()
 	thr.open_outfile( outfilename )
+	scheduler = sysex_tones.OutputScheduler( thr.outfile )
+	block = None
+	if midiinfilename:
+		thr.open_infile( midiinfilename )
+		block = thr.request_current_block()
+		thr.close_infile()
+		if block is None:
+			print( 'No settings dump from %s, sending every setting.' % (midiinfilename) )
+	reader = THR10() # reads the settings text files, thr.infile is the device
 	for infilename in infilenames:
-		thr.write_text_to_midi( infilename )
+		if dumps: # the whole tone in one SysEx, without the intermediate settings of individual commands
+			(dump, midi) = reader.convert_infile_to_dump( block, infilename )
+			scheduler.queue_data( dump + midi )
+		elif block is None:
+			scheduler.queue_data( reader.convert_infile_to_midi( infilename ) )
+		else: # each file is diffed against the settings the last one left
+			(midi, block) = reader.convert_infile_to_midi_diff( block, infilename )
+			scheduler.queue_data( midi )
+	scheduler.flush()
 	thr.close_outfile()
 
 
 if __name__ == '__main__':
-	if len( sys.argv ) >= 3:
-		write_to_midi( sys.argv[1], sys.argv[2:] )
+	arguments = sys.argv[2:]
+	midiinfilename = None
+	dumps = False
+	while len( arguments ) > 1 and arguments[0] in ['--diff', '--dump']:
+		if arguments[0] == '--dump':
+			dumps = True
+			arguments = arguments[1:]
+		else:
+			midiinfilename = arguments[1]
+			arguments = arguments[2:]
+	if len( sys.argv ) >= 3 and arguments:
+		write_to_midi( sys.argv[1], arguments, midiinfilename, dumps )
 	else:
-		print( 'Usage: %s MIDIOUTPUTDEVFILENAME configfilenames' % (sys.argv[0]) )
-
+		print( 'Usage: %s MIDIOUTPUTDEVFILENAME [--diff MIDIINPUTDEVFILENAME] [--dump] configfilenames' % (sys.argv[0]) )
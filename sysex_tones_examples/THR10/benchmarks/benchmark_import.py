@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+""" Import time budget check, for the command line tools that import sysex_tones on every invocation.
+
+	Times 'import sysex_tones.THR10' in fresh interpreters, and checks that the modules only some apps need are not loaded by it,
+	exiting non-zero if the import takes longer than the budget, or loads anything it shouldn't.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os
+import sys
+import json
+import subprocess
+
+
+IMPORT_BUDGET = 0.010
+RUNS = 7
+
+# modules loaded on first use, that importing sysex_tones.THR10 must not load
+LAZY_MODULES = [
+	'sysex_tones.EventLoop',
+	'sysex_tones.HotplugWatcher',
+	'sysex_tones.OutputScheduler',
+	'sysex_tones.CaptureRecorder',
+	'sysex_tones.CaptureReplayer',
+	'sysex_tones.THR.THRManager',
+	'sysex_tones.THR10.THR10Emulator',
+	'sysex_tones.THR10.EncoderPlan',
+	'sysex_tones.THR10.THR10Mirror',
+	'sysex_tones.THR10.Tone',
+	'sysex_tones.THR10.ToneArchive',
+	'sysex_tones.THR10.ToneQuery',
+	'sysex_tones.THR10.ToneStore',
+	'hashlib',
+	'mmap',
+	'selectors',
+	'threading',
+	'random',
+	'mmap',
+	'zlib',
+	'struct',
+	'fcntl',
+	'select',
+]
+
+# json is only imported after looking at sys.modules, it loads modules of its own
+MEASURE = '''
+import sys, time
+started = time.perf_counter()
+import sysex_tones.THR10
+elapsed = time.perf_counter() - started
+loaded = [name for name in %r if name in sys.modules]
+import json
+print( json.dumps( [elapsed, loaded] ) )
+''' % (LAZY_MODULES,)
+
+
+def measure_import( runs=RUNS ):
+	""" Import sysex_tones.THR10 in runs fresh interpreters, returning the fastest import time in n.n seconds, and any lazy modules it loaded. """
+	environment = dict( os.environ )
+	package = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', '..', '..' )
+	environment['PYTHONPATH'] = os.pathsep.join( [os.path.abspath( package )] + [path for path in [environment.get( 'PYTHONPATH' )] if path] )
+	times = []
+	loaded = []
+	for count in range( runs ):
+		output = subprocess.check_output( [sys.executable, '-c', MEASURE], env=environment )
+		(elapsed, loaded) = json.loads( output.decode( 'ascii' ) )
+		times.append( elapsed )
+	return (min( times ), loaded)
+
+
+def main( budget=IMPORT_BUDGET ):
+	""" Check the import time against budget n.n seconds, returning the number of failures. """
+	retval = 0
+	(elapsed, loaded) = measure_import()
+	print( 'import sysex_tones.THR10: %.2f ms (budget %.2f ms)' % (elapsed * 1000, budget * 1000) )
+	if elapsed > budget:
+		print( 'over budget' )
+		retval += 1
+	if loaded:
+		print( 'loaded at import: %s' % (', '.join( loaded )) )
+		retval += 1
+	return retval
+
+
+if __name__ == '__main__':
+	if len( sys.argv ) > 1 and sys.argv[1] in ['-h', '--help']:
+		print( 'Usage: %s [BUDGETMILLISECONDS]' % (sys.argv[0]) )
+	elif len( sys.argv ) > 1:
+		sys.exit( main( float( sys.argv[1] ) / 1000 ) )
+	else:
+		sys.exit( main() )
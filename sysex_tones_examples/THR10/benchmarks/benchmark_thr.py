@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+""" Benchmarks for the parsing, decoding, and encoding hot paths, using corpora generated from the tones directory.
+
+	Reports frames/s and bytes/s (of the fastest of several rounds), and allocations (tracemalloc peak and retained bytes, for one pass over a corpus),
+	optionally saving the results as JSON, and comparing them with previously saved results.
+"""
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import platform
+import tempfile
+import tracemalloc
+
+import sysex_tones
+import sysex_tones.THR
+import sysex_tones.THR10
+import sysex_tones.convert_midi_ints
+
+from sysex_tones.THR import CONSTANTS as THR_CONSTANTS
+from sysex_tones.THR10 import THR10
+
+
+TONES_DIRECTORY = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'tones' )
+STREAM_SIZE = 1024 * 1024
+MINIMUM_TIME = 0.2
+ROUNDS = 5
+REGRESSION_RATIO = 0.9
+MIDI_INT_OFFSETS = sorted( set( [getattr( sysex_tones.THR10.Tone, name ).offset for name in sysex_tones.THR10.Tone.FIELDS if getattr( sysex_tones.THR10.Tone, name ).size == 2] ) ) # block offsets of the two byte settings
+
+
+def read_tone_lines( directory=TONES_DIRECTORY ):
+	""" Return every settings line, commented settings uncommented, from the tones files in directory. """
+	retval = []
+	for filename in sorted( glob.glob( os.path.join( directory, '*.txt' ) ) + glob.glob( os.path.join( directory, '*', '*.txt' ) ) ):
+		with open( filename ) as infile:
+			for line in infile:
+				line = line.strip().lstrip( '# ' )
+				if ':' in line:
+					retval.append( line )
+	return retval
+
+
+def build_corpora( directory=TONES_DIRECTORY, streamsize=STREAM_SIZE, seed=0 ):
+	""" Build the benchmark corpora from the tones files in directory, a stream of about streamsize bytes is built from them. """
+	lines = read_tone_lines( directory )
+	commands = []
+	dumps = []
+	for line in lines:
+		midi = sysex_tones.THR10.convert_text_to_midi( line )
+		commands += sysex_tones.extract_midi_sysex( midi )
+	# one dump per tones file setting applied in turn, as a device would dump them
+	block = sysex_tones.THR10.THR10Emulator().block
+	for command in commands:
+		payload = sysex_tones.extract_command_payload( command, THR_CONSTANTS.THR_COMMAND_PREFIX )
+		if sysex_tones.THR10.apply_command_to_block( block, payload ):
+			dumps.append( sysex_tones.THR.convert_block_to_dump( block ) )
+	# a device stream: commands, with heartbeats and dumps mixed in
+	generator = random.Random( seed )
+	frames = []
+	size = 0
+	while size < streamsize:
+		choice = generator.random()
+		if choice < 0.1:
+			frame = THR_CONSTANTS.THR10_HEARTBEAT
+		elif choice < 0.15:
+			frame = generator.choice( dumps )
+		else:
+			frame = generator.choice( commands )
+		frames.append( frame )
+		size += len( frame )
+	stream = bytes( bytearray( [byte for frame in frames for byte in frame] ) )
+	archive = sysex_tones.THR10.ToneArchive( os.path.join( tempfile.mkdtemp(), 'benchmark.thrtones' ) )
+	archive.extend( dumps )
+	return {
+		'lines': lines,
+		'plans': list( sysex_tones.THR10.EncoderPlan.compile_directory( directory ).values() ),
+		'commands': commands,
+		'commandbytes': [bytes( bytearray( command ) ) for command in commands],
+		'dumps': dumps,
+		'dumpbytes': [bytes( bytearray( dump ) ) for dump in dumps],
+		'blocks': [dump[THR_CONSTANTS.THR_DUMP_OFFSET:-2] for dump in dumps],
+		'blockbytes': b''.join( [bytes( bytearray( dump[THR_CONSTANTS.THR_DUMP_OFFSET:-2] ) ) for dump in dumps] ), # back to back, as archived
+		'frames': frames,
+		'framebytes': [bytes( bytearray( frame ) ) for frame in frames],
+		'stream': stream,
+		'streamlist': list( bytearray( stream ) ),
+		'archive': archive,
+	}
+
+
+def extract_stream( stream ):
+	""" Frame a whole stream at once. """
+	return len( sysex_tones.extract_midi_sysex( stream ) )
+
+
+def extract_stream_reads( stream, readsize=4096, zerocopy=False ):
+	""" Frame a stream read by read, as BasicIO does. """
+	retval = 0
+	framer = sysex_tones.SysExFramer( zerocopy=zerocopy )
+	for offset in range( 0, len( stream ), readsize ):
+		retval += len( framer.feed( stream[offset:offset + readsize] ) )
+	return retval
+
+
+def extract_stream_reads_zerocopy( stream ):
+	""" Frame a stream read by read, into memoryview frames. """
+	return extract_stream_reads( stream, zerocopy=True )
+
+
+def detect_dumps( frames ):
+	""" Look for dumps in every frame. """
+	for frame in frames:
+		THR10.detect_midi_dump( frame )
+	return len( frames )
+
+
+def classify_frames( frames ):
+	""" Classify every frame in one lookup each. """
+	for frame in frames:
+		THR10.classify_frame( frame )
+	return len( frames )
+
+
+def identify_frames( frames ):
+	""" Identify every frame by trying each kind in turn, heartbeat, dump, then command, as monitor_thr.py used to. """
+	for frame in frames:
+		if not THR10.find_thr_heartbeat_model( frame ) and not THR10.detect_midi_dump( frame ):
+			THR10.find_thr_command( frame )
+	return len( frames )
+
+
+def find_commands( commands ):
+	""" Decode every command, tracking subcommand context as monitor_thr.py does. """
+	context = None
+	for command in commands:
+		found = THR10.find_thr_command( command, context )
+		if 'context' in found:
+			context = found['context']
+	return len( commands )
+
+
+def convert_dumps_to_text( blocks ):
+	""" Convert every settings block to text. """
+	for block in blocks:
+		sysex_tones.THR10.convert_midi_dump_to_text( block )
+	return len( blocks )
+
+
+def convert_lines_to_midi( lines ):
+	""" Convert every settings line to MIDI commands. """
+	for line in lines:
+		sysex_tones.THR10.convert_text_to_midi( line )
+	return len( lines )
+
+
+def encode_plan_variants( plans ):
+	""" Re-encode every compiled tones file with new values, as sending tone variants does. """
+	for plan in plans:
+		values = dict( [(name, count) for (count, name) in enumerate( plan.get_names() ) if 'ratio' not in name and 'knee' not in name] )
+		plan.encode( values )
+	return len( plans )
+
+
+def decode_block_midi_ints( blocks ):
+	""" Decode every two byte setting of every block, one value at a time. """
+	for block in blocks:
+		for offset in MIDI_INT_OFFSETS:
+			sysex_tones.convert_from_midi_int_ints( block[offset:offset + 2] )
+	return len( blocks )
+
+
+def decode_block_midi_ints_batch( blockbytes ):
+	""" Decode every two byte setting of every block, one setting of all the blocks at a time. """
+	for offset in MIDI_INT_OFFSETS:
+		sysex_tones.convert_midi_ints.convert_from_midi_block_ints( blockbytes, offset, THR_CONSTANTS.THR_SYSEX_SIZE )
+	return len( blockbytes ) // THR_CONSTANTS.THR_SYSEX_SIZE
+
+
+def scan_archive_columns( archive ):
+	""" Decode the amp, gain, and reverb state of every archived block at once, as a query does. """
+	array = archive.get_array()
+	for name in ['amp', 'gain', 'reverb_on']:
+		archive.get_column( name, array )
+	return len( archive )
+
+
+def query_archive( archive ):
+	""" Find the archived blocks of a Lead amp, with gain over 60, and spring reverb on. """
+	archive.find( amp='Lead', gain=(61, None), reverb='Spring', reverb_on=True )
+	return len( archive )
+
+
+def extract_line_settings( lines ):
+	""" Parse every settings line. """
+	for line in lines:
+		sysex_tones.extract_settings( line )
+	return len( lines )
+
+
+def get_benchmarks( corpora ):
+	""" Return a list of (name, function, corpus, size in bytes) benchmarks. """
+	linesize = sum( [len( line ) for line in corpora['lines']] )
+	retval = [
+		('extract_midi_sysex_list', extract_stream, corpora['streamlist'], len( corpora['stream'] )),
+		('extract_midi_sysex_bytes', extract_stream, corpora['stream'], len( corpora['stream'] )),
+		('framer_reads', extract_stream_reads, corpora['stream'], len( corpora['stream'] )),
+		('framer_reads_zerocopy', extract_stream_reads_zerocopy, corpora['stream'], len( corpora['stream'] )),
+		('detect_midi_dump_list', detect_dumps, corpora['frames'], len( corpora['stream'] )),
+		('detect_midi_dump_bytes', detect_dumps, corpora['framebytes'], len( corpora['stream'] )),
+		('classify_frame_list', classify_frames, corpora['frames'], len( corpora['stream'] )),
+		('classify_frame_bytes', classify_frames, corpora['framebytes'], len( corpora['stream'] )),
+		('identify_frames_chain_list', identify_frames, corpora['frames'], len( corpora['stream'] )),
+		('find_thr_command_list', find_commands, corpora['commands'], sum( [len( command ) for command in corpora['commands']] )),
+		('find_thr_command_bytes', find_commands, corpora['commandbytes'], sum( [len( command ) for command in corpora['commands']] )),
+		('convert_midi_dump_to_text', convert_dumps_to_text, corpora['blocks'], sum( [len( block ) for block in corpora['blocks']] )),
+		('midi_block_ints', decode_block_midi_ints, corpora['blocks'], len( corpora['blockbytes'] )),
+		('midi_block_ints_batch', decode_block_midi_ints_batch, corpora['blockbytes'], len( corpora['blockbytes'] )),
+		('convert_text_to_midi', convert_lines_to_midi, corpora['lines'], linesize),
+		('encoder_plan_encode', encode_plan_variants, corpora['plans'], sum( [len( plan.template ) for plan in corpora['plans']] )),
+		('extract_settings', extract_line_settings, corpora['lines'], linesize),
+	]
+	try:
+		import numpy # archive scans need NumPy, an optional dependency
+		retval.append( ('tone_archive_scan', scan_archive_columns, corpora['archive'], len( corpora['archive'] ) * THR_CONSTANTS.THR_SYSEX_SIZE) )
+		retval.append( ('tone_archive_query', query_archive, corpora['archive'], len( corpora['archive'] ) * THR_CONSTANTS.THR_SYSEX_SIZE) )
+	except ImportError:
+		pass
+	return retval
+
+
+def run_benchmark( function, corpus, size, minimumtime=MINIMUM_TIME, rounds=ROUNDS ):
+	""" Run function( corpus ) for rounds of at least minimumtime n.n seconds, returning a dictionary of results from the fastest round. """
+	# allocations, from one pass, traced separately so tracing doesn't slow the timed passes
+	tracemalloc.start()
+	function( corpus )
+	(retained, peak) = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	best = None
+	for count in range( rounds ):
+		passes = 0
+		frames = 0
+		started = time.perf_counter()
+		elapsed = 0.0
+		while elapsed < minimumtime:
+			frames += function( corpus )
+			passes += 1
+			elapsed = time.perf_counter() - started
+		if not best or frames / elapsed > best[1] / best[2]: # the fastest round is the least disturbed by the rest of the machine
+			best = (passes, frames, elapsed)
+	(passes, frames, elapsed) = best
+	return {
+		'passes': passes,
+		'seconds': elapsed,
+		'frames_per_second': frames / elapsed,
+		'bytes_per_second': size * passes / elapsed,
+		'peak_allocated_bytes': peak,
+		'retained_bytes': retained,
+	}
+
+
+def run_benchmarks( corpora, minimumtime=MINIMUM_TIME, rounds=ROUNDS, names=None ):
+	""" Run all benchmarks (or those in names), printing and returning the results. """
+	retval = {
+		'python': platform.python_version(),
+		'implementation': platform.python_implementation(),
+		'machine': platform.machine(),
+		'time': time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+		'results': {},
+	}
+	print( '%-28s %14s %14s %14s' % ('benchmark', 'frames/s', 'bytes/s', 'peak bytes') )
+	for (name, function, corpus, size) in get_benchmarks( corpora ):
+		if not names or name in names:
+			result = run_benchmark( function, corpus, size, minimumtime, rounds )
+			retval['results'][name] = result
+			print( '%-28s %14.0f %14.0f %14i' % (name, result['frames_per_second'], result['bytes_per_second'], result['peak_allocated_bytes']) )
+	return retval
+
+
+def compare_results( results, previous ):
+	""" Print the speed of results relative to previous results, returning the names of benchmarks that regressed. """
+	retval = []
+	print( '%-28s %14s %14s %8s' % ('benchmark', 'frames/s', 'previous', 'ratio') )
+	for name in results['results']:
+		if name in previous['results']:
+			now = results['results'][name]['frames_per_second']
+			then = previous['results'][name]['frames_per_second']
+			ratio = now / then
+			flag = ''
+			if ratio < REGRESSION_RATIO:
+				flag = ' slower'
+				retval.append( name )
+			print( '%-28s %14.0f %14.0f %8.2f%s' % (name, now, then, ratio, flag) )
+	return retval
+
+
+def main( resultsfilename=None, previousfilename=None ):
+	""" Run the benchmarks, saving the results to resultsfilename and comparing them with previousfilename, if present. """
+	results = run_benchmarks( build_corpora() )
+	if resultsfilename:
+		with open( resultsfilename, 'w' ) as outfile:
+			json.dump( results, outfile, indent=1, sort_keys=True )
+	regressed = []
+	if previousfilename:
+		with open( previousfilename ) as infile:
+			regressed = compare_results( results, json.load( infile ) )
+	return len( regressed )
+
+
+if __name__ == '__main__':
+	if len( sys.argv ) > 1 and sys.argv[1] in ['-h', '--help']:
+		print( 'Usage: %s [RESULTSFILENAME.json [PREVIOUSRESULTSFILENAME.json]]' % (sys.argv[0]) )
+	else:
+		sys.exit( main( *sys.argv[1:3] ) )
@@ -0,0 +1,95 @@
+""" Tests for recording SysEx into, and replaying it from, a capture ring buffer file. """
+
+# Copyright (c) 2016
+#
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from sysex_tones.CaptureRecorder import CaptureRecorder, CAPTURE_RECORD
+from sysex_tones.CaptureReplayer import CaptureReplayer
+
+
+class CaptureRecorderTest( unittest.TestCase ):
+	""" Record frames into small rings, checking the ring keeps the newest frames, whatever their sizes. """
+
+	def setUp( self ):
+		""" Make a directory for the capture file. """
+		self.directory = tempfile.mkdtemp()
+		self.filename = os.path.join( self.directory, 'capture.sxtcapt' )
+
+
+	def tearDown( self ):
+		""" Remove the capture file, and its directory. """
+		shutil.rmtree( self.directory )
+
+
+	def check_ring( self, recorder, recorded ):
+		""" Check the index of recorder is consistent, and replays the newest of recorded (a list of (timestamp, sysex) pairs). """
+		self.assertTrue( 0 <= recorder.head - recorder.tail <= recorder.size )
+		self.assertTrue( 0 <= recorder.frames <= len( recorded ) )
+		self.assertEqual( recorder.frames + recorder.dropped, len( recorded ) )
+		replayer = CaptureReplayer( self.filename )
+		try:
+			found = [(timestamp, bytes( sysex )) for (timestamp, sysex) in replayer.frames()]
+		finally:
+			replayer.close()
+		self.assertEqual( found, recorded[len( recorded ) - recorder.frames:] )
+
+
+	def test_wrap_larger_than_the_start_of_the_ring( self ):
+		""" A frame that wraps, and needs more room than the records before its position, only drops what it overwrites. """
+		recorder = CaptureRecorder( self.filename, 1000 )
+		recorded = [(1, b'\xf0' + b'\x01' * 286 + b'\xf7'), (2, b'\xf0' + b'\x02' * 786 + b'\xf7')]
+		for (timestamp, sysex) in recorded:
+			recorder.record( sysex, timestamp )
+		self.check_ring( recorder, recorded )
+		self.assertEqual( (recorder.frames, recorder.dropped), (1, 1) )
+		recorder.close()
+
+
+	def test_mixed_sizes_across_wraps( self ):
+		""" Frames of random sizes, up to the whole ring, wrap many times, and survive reopening the file. """
+		size = 1000
+		generator = random.Random( 0 )
+		recorder = CaptureRecorder( self.filename, size )
+		recorded = []
+		for count in range( 2000 ):
+			length = generator.choice( [2, 9, 40, 276, 500, size - CAPTURE_RECORD.size] )
+			sysex = b'\xf0' + bytes( bytearray( [count % 0x80] * (length - 2) ) ) + b'\xf7'
+			recorder.record( sysex, count )
+			recorded.append( (count, sysex) )
+			if count % 97 == 0:
+				self.check_ring( recorder, recorded )
+			if count % 500 == 499:
+				recorder.close()
+				recorder = CaptureRecorder( self.filename )
+		self.assertTrue( recorder.head > 10 * size )
+		self.check_ring( recorder, recorded )
+		recorder.close()
+
+
+	def test_too_large( self ):
+		""" A frame larger than the ring is refused, leaving the ring as it was. """
+		recorder = CaptureRecorder( self.filename, 100 )
+		recorder.record( b'\xf0\x01\xf7', 1 )
+		self.assertRaises( ValueError, recorder.record, b'\xf0' + b'\x01' * 100 + b'\xf7', 2 )
+		self.check_ring( recorder, [(1, b'\xf0\x01\xf7')] )
+		recorder.close()
+
+
+if __name__ == '__main__':
+	unittest.main()